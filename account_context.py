@@ -0,0 +1,85 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from query_cache import table_versions
+
+# Every table the account context reads; a write to any of them makes it stale
+CONTEXT_TABLES = ('patients', 'billing', 'payments', 'treatment_history', 'appointments', 'payment_methods',
+                  'dental_services', 'dentists')
+
+
+class AccountContexts:
+    """Per-session snapshots of a verified caller's account for SWAIG follow-ups.
+
+    prefetch() runs at MFA verification and stores load(db, patient_id) (plain,
+    picklable data, or None for an unknown patient) under the challenge token
+    in a shared-cache namespace, so whichever worker serves the next question
+    has it. The versions of CONTEXT_TABLES are read before loading and kept
+    with it; get() serves the snapshot while they are unchanged and reloads it
+    otherwise, so writes from the web portal or another call are seen at once.
+    Writes made through the session itself drop it with invalidate().
+
+    A hit reads the versions through a long-lived connection per thread to
+    database rather than the request's: a new connection parses the whole
+    schema before its first query, which costs more than the rest of a hit.
+    """
+
+    def __init__(self, store, load, database):
+        self.store = store
+        self.load = load
+        self.database = database
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {'prefetches': 0, 'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _current_versions(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # Never reuse a connection inherited across a fork
+            conn = self._local.conn = sqlite3.connect(self.database)
+            self._local.pid = os.getpid()
+        return table_versions(conn, CONTEXT_TABLES)
+
+    def _refresh(self, db, token, patient_id):
+        versions = table_versions(db, CONTEXT_TABLES)
+        context = self.load(db, patient_id)
+        if context is not None:
+            self.store.set(token, {'patient_id': patient_id, 'versions': versions, 'context': context})
+        return context
+
+    def prefetch(self, db, token, patient_id):
+        self._count('prefetches')
+        return self._refresh(db, token, patient_id)
+
+    def get(self, db, token, patient_id):
+        """The caller's account context, reloaded first when missing or when a table it read has changed"""
+        if db.in_transaction:
+            # Uncommitted rows would be cached under versions that don't include them
+            return self.load(db, patient_id)
+        entry = self.store.get(token)
+        if entry is None or entry['patient_id'] != patient_id:
+            self._count('misses')
+        elif entry['versions'] != self._current_versions():
+            self._count('stale')
+        else:
+            self._count('hits')
+            return entry['context']
+        return self._refresh(db, token, patient_id)
+
+    def invalidate(self, token):
+        if token and self.store.delete(token):
+            self._count('invalidations')
+            logging.info(f"[CACHE] Dropped account context for challenge token {token[:8]}... after a write")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        reads = counters['hits'] + counters['misses'] + counters['stale']
+        counters['hit_rate'] = round(counters['hits'] / reads, 4) if reads else None
+        return counters
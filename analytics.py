@@ -0,0 +1,281 @@
+import logging
+import sqlite3
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
+
+# numpy is optional (the pure-Python aggregation gives the same results) and
+# imported on first use: it costs about as much as the rest of app.py's imports
+_numpy = None
+_numpy_loaded = False
+
+PERIODS = ('day', 'week', 'month', 'year')
+# Report dimensions and their rollup columns
+DIMENSIONS = {'dentist': 'dentist_id', 'service': 'service_id', 'status': 'status'}
+
+# Bill statuses that still have a balance to collect
+OPEN_STATUSES = ('pending', 'partial', 'overdue')
+
+# (label, first day overdue, last day overdue); None is open-ended
+AGING_BUCKETS = (
+    ('current', None, 0),
+    ('1-30', 1, 30),
+    ('31-60', 31, 60),
+    ('61-90', 61, 90),
+    ('90+', 91, None),
+)
+
+# Below this many rollup rows the Python loop beats numpy's setup cost
+NUMPY_MIN_ROWS = 1000
+
+# (day, dentist, service) keys use 0 for bills without a dentist
+BILLING_ROLLUP_SQL = '''
+    INSERT INTO billing_daily (day, dentist_id, service_id, status, bills, billed, insurance, outstanding)
+    SELECT COALESCE(date(due_date), ''), COALESCE(dentist_id, 0), service_id, status,
+           COUNT(*), SUM(amount), SUM(COALESCE(insurance_coverage, 0)), SUM(patient_portion)
+    FROM billing
+    GROUP BY 1, 2, 3, 4
+'''
+
+PAYMENT_ROLLUP_SQL = '''
+    INSERT INTO payment_daily (day, dentist_id, service_id, status, payments, amount)
+    SELECT COALESCE(date(p.payment_date), ''), COALESCE(b.dentist_id, 0), b.service_id, p.status,
+           COUNT(*), SUM(p.amount)
+    FROM payments p
+    JOIN billing b ON p.billing_id = b.id
+    GROUP BY 1, 2, 3, 4
+'''
+
+
+def rebuild_rollups(db):
+    """Recompute billing_daily and payment_daily from billing and payments in one transaction.
+
+    Triggers keep the rollups current on every write, so this is only needed
+    after writes that bypassed them (e.g. a restored backup) or to check for
+    drift: python analytics.py [dental_office.db]. Returns (billing rows, payment rows).
+    """
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM billing_daily')
+        db.execute('DELETE FROM payment_daily')
+        db.execute(BILLING_ROLLUP_SQL)
+        db.execute(PAYMENT_ROLLUP_SQL)
+        counts = (db.execute('SELECT COUNT(*) FROM billing_daily').fetchone()[0],
+                  db.execute('SELECT COUNT(*) FROM payment_daily').fetchone()[0])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logging.info(f"[ANALYTICS] Rebuilt rollups: {counts[0]} billing rows, {counts[1]} payment rows")
+    return counts
+
+
+def monthly_revenue(db, dentist_id):
+    """Billed this calendar month (by due date, every status) for the dentist dashboard"""
+    return db.execute('''
+        SELECT COALESCE(SUM(billed), 0) FROM billing_daily
+        WHERE dentist_id = ? AND day >= date('now', 'start of month') AND day < date('now', 'start of month', '+1 month')
+    ''', (dentist_id,)).fetchone()[0]
+
+
+def get_numpy():
+    """The numpy module, or None when it isn't installed"""
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy, _numpy_loaded = numpy, True
+    return _numpy
+
+
+@lru_cache(maxsize=4096)
+def _week_start(day):
+    value = date.fromisoformat(day)
+    return (value - timedelta(days=value.weekday())).isoformat()
+
+
+def _period_label(day, period):
+    if period == 'day':
+        return day
+    if period == 'month':
+        return day[:7]
+    if period == 'year':
+        return day[:4]
+    return _week_start(day)
+
+
+def _group_sum_python(days, groups, columns, period):
+    totals = {}
+    width = len(columns)
+    for i, day in enumerate(days):
+        key = (_period_label(day, period), groups[i] if groups is not None else None)
+        sums = totals.get(key)
+        if sums is None:
+            sums = totals[key] = [0] * width
+        for c in range(width):
+            sums[c] += columns[c][i]
+    # Labels are unique per period when there are no groups, so None is never compared
+    return [(label, group, *sums) for (label, group), sums in sorted(totals.items())]
+
+
+def _group_sum_numpy(days, groups, columns, period):
+    numpy = get_numpy()
+    day_values = numpy.array(days, dtype='datetime64[D]')
+    if period == 'week':
+        # 1970-01-01 was a Thursday; step back to Monday
+        day_values = day_values - (day_values.astype('int64') + 3) % 7
+        unit = 'D'
+    else:
+        unit = {'day': 'D', 'month': 'M', 'year': 'Y'}[period]
+        day_values = day_values.astype(f'datetime64[{unit}]')
+    codes = day_values.astype('int64')
+    width = 1
+    if groups is not None:
+        group_array = numpy.asarray(groups)
+        if group_array.dtype.kind not in 'iu':
+            group_array = group_array.astype(str)
+        group_values, group_codes = numpy.unique(group_array, return_inverse=True)
+        width = len(group_values)
+        codes = codes * width + group_codes
+    # Sorted codes order the result by period, then group
+    keys, inverse = numpy.unique(codes, return_inverse=True)
+    sums = [numpy.bincount(inverse, weights=numpy.asarray(column, dtype='float64'), minlength=len(keys)).tolist()
+            for column in columns]
+    periods, group_index = numpy.divmod(keys, width)
+    labels = numpy.datetime_as_string(periods.astype(f'datetime64[{unit}]'), unit=unit).tolist()
+    group_labels = group_values[group_index].tolist() if groups is not None else [None] * len(keys)
+    return list(zip(labels, group_labels, *sums))
+
+
+def group_sum(days, groups, columns, period='month', use_numpy=None):
+    """Sum columns per (period, group) for rollup rows.
+
+    days are 'YYYY-MM-DD' strings, groups a parallel list of dimension values
+    (or None for period totals only) and columns parallel lists of numbers.
+    Returns [(period label, group, sum, ...)] sorted by period then group.
+    Weeks are labelled by their Monday. numpy is used when installed and the
+    input is large enough to pay for it; both paths give the same result.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if not days:
+        return []
+    if use_numpy is None:
+        use_numpy = len(days) >= NUMPY_MIN_ROWS and get_numpy() is not None
+    if use_numpy:
+        return _group_sum_numpy(days, groups, columns, period)
+    return _group_sum_python(days, groups, columns, period)
+
+
+def daily_sums(db, table, sums, start_date, end_date, by=None, dentist_id=None, where=''):
+    """[(day, group, sum, ...)] from a rollup table, summed in SQL over the dimensions not asked for.
+
+    sums are column names, by a key of DIMENSIONS (group is None without it).
+    Reads a day range of the primary key, or idx_*_dentist for one dentist.
+    """
+    group = DIMENSIONS[by] if by else 'NULL'
+    sql = (f"SELECT day, {group}, {', '.join(f'SUM({column})' for column in sums)} FROM {table} "
+           f"WHERE day >= ? AND day <= ?")
+    params = [start_date.isoformat(), end_date.isoformat()]
+    if dentist_id is not None:
+        sql += ' AND dentist_id = ?'
+        params.append(dentist_id)
+    return db.execute(f"{sql}{where} GROUP BY day{', 2' if by else ''}", params).fetchall()
+
+
+def _group_rows(rows, period):
+    """group_sum over daily_sums rows"""
+    width = len(rows[0]) - 2 if rows else 0
+    return group_sum([row[0] for row in rows], [row[1] for row in rows] if rows and rows[0][1] is not None else None,
+                     [[row[c] for row in rows] for c in range(2, 2 + width)], period)
+
+
+def _names(db, dimension):
+    if dimension == 'dentist':
+        return {row[0]: f'Dr. {row[1]} {row[2]}' for row in db.execute('SELECT id, first_name, last_name FROM dentists')}
+    if dimension == 'service':
+        return {row[0]: row[1] for row in db.execute('SELECT id, name FROM dental_services')}
+    return {}
+
+
+def revenue_report(db, start_date, end_date, period='month', by=None, dentist_id=None):
+    """Bills, billed, insurance and outstanding per period, optionally split by dentist, service or status"""
+    if by is not None and by not in DIMENSIONS:
+        raise ValueError(f"by must be one of {', '.join(DIMENSIONS)}")
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    grouped = _group_rows(daily_sums(db, 'billing_daily', ('bills', 'billed', 'insurance', 'outstanding'),
+                                     start_date, end_date, by, dentist_id), period)
+    names = _names(db, by)
+    report = []
+    for label, group, bills, billed, insurance, outstanding in grouped:
+        entry = {'period': label}
+        if by:
+            entry[by] = group
+            if group in names:
+                entry[f'{by}_name'] = names[group]
+        entry.update(bills=int(bills), billed=round(billed, 2), insurance=round(insurance, 2),
+                     outstanding=round(outstanding, 2))
+        report.append(entry)
+    return report
+
+
+def collections_report(db, start_date, end_date, period='month', dentist_id=None):
+    """Billed (by due date, excluding cancelled bills) against collected (completed payments, by payment date)"""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    billed = _group_rows(daily_sums(db, 'billing_daily', ('billed',), start_date, end_date, dentist_id=dentist_id,
+                                    where=" AND status != 'cancelled'"), period)
+    collected = _group_rows(daily_sums(db, 'payment_daily', ('amount',), start_date, end_date, dentist_id=dentist_id,
+                                       where=" AND status = 'completed'"), period)
+    totals = OrderedDict()
+    for label, _, amount in billed:
+        totals.setdefault(label, [0.0, 0.0])[0] = amount
+    for label, _, amount in collected:
+        totals.setdefault(label, [0.0, 0.0])[1] = amount
+    return [{
+        'period': label,
+        'billed': round(amounts[0], 2),
+        'collected': round(amounts[1], 2),
+        'collection_rate': round(amounts[1] / amounts[0], 4) if amounts[0] else None,
+    } for label, amounts in sorted(totals.items())]
+
+
+def aging_report(db, as_of=None, dentist_id=None):
+    """Open receivables (patient_portion of unpaid bills) in days-past-due buckets as of a date"""
+    as_of = as_of or date.today()
+    sql = f'''
+        SELECT day, SUM(bills), SUM(outstanding) FROM billing_daily
+        WHERE status IN ({', '.join('?' for _ in OPEN_STATUSES)}) AND day != ''
+    '''
+    params = list(OPEN_STATUSES)
+    if dentist_id is not None:
+        sql += ' AND dentist_id = ?'
+        params.append(dentist_id)
+    buckets = OrderedDict((label, {'bucket': label, 'bills': 0, 'outstanding': 0.0}) for label, _, _ in AGING_BUCKETS)
+    for day, bills, outstanding in db.execute(sql + ' GROUP BY day', params):
+        overdue = (as_of - date.fromisoformat(day)).days
+        for label, low, high in AGING_BUCKETS:
+            if (low is None or overdue >= low) and (high is None or overdue <= high):
+                buckets[label]['bills'] += bills
+                buckets[label]['outstanding'] += outstanding or 0
+                break
+    for bucket in buckets.values():
+        bucket['outstanding'] = round(bucket['outstanding'], 2)
+    return {
+        'as_of': as_of.isoformat(),
+        'buckets': list(buckets.values()),
+        'total_outstanding': round(sum(b['outstanding'] for b in buckets.values()), 2),
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else 'dental_office.db')
+    billing_rows, payment_rows = rebuild_rollups(conn)
+    print(f'Rebuilt rollups: {billing_rows} billing_daily rows, {payment_rows} payment_daily rows')
+    conn.close()
@@ -1,18 +1,45 @@
 from flask import Flask, render_template, jsonify, request, session, redirect, url_for, flash, Response, g, send_from_directory, abort, send_file
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 from dotenv import load_dotenv
 import json
 import hashlib
 import secrets
-from functools import wraps
+from functools import wraps, lru_cache
 import logging
 from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
 from werkzeug.security import generate_password_hash, check_password_hash
+from jinja2 import FileSystemBytecodeCache
 from signalwire_swaig.swaig import SWAIG, SWAIGArgument, SWAIGFunctionProperties
 from signalwire_swaig.response import SWAIGResponse
 from mfa_util import SignalWireMFA
+from outbound import Outbound, OutboundUnavailable, ENDPOINT_CLASSES
+from settings import load_settings
+from shared_cache import open_cache
+from query_cache import QueryCache, parse_ttls
+from account_context import AccountContexts
+from single_flight import SingleFlight
+from swaig_response import VoiceResponse, clip, compact
+from db_migrate import migrate
+from payments import post_payment, PaymentError
+from bill_numbers import BillNumberAllocator
+from search import search, find_patients_by_name, find_bill_ids
+from phone_lookup import format_to_e164, lookup_patient_by_phone, sync_patient_phone_e164, caller_id_cache
+from assets import AssetManifest, negotiate_encoding, ENCODING_SUFFIXES, IMMUTABLE_MAX_AGE
+from template_cache import FragmentCacheExtension
+from streaming import stream_json
+from json_encoding import RowJSONProvider, dump_rows
+from identity import current_user, forget_current_user
+from dentist_schedule import dentist_schedule, multi_dentist_schedule, MAX_SCHEDULE_DAYS
+from working_hours import (get_working_hours, parse_weekly_hours, sync_dentist_working_hours, add_schedule_exception,
+                           delete_schedule_exception, parse_hhmm, format_minute, minute_mask, MINUTES_PER_DAY,
+                           working_hours_cache)
+from booking import (book, book_in_window, slot_window, window_duration, alternatives_json, describe_alternatives,
+                     BookingError, BookingConflict)
+from bulk_appointments import bulk_update, summarize, notification_messages, dispatch_notifications
+from background_jobs import BackgroundJobs
+import analytics
 import time
 import traceback
 import random
@@ -22,44 +49,34 @@ import uuid
 import threading
 
 app = Flask(__name__, static_folder=None)
+app.json = RowJSONProvider(app)
 
 # Load environment variables
 load_dotenv(override=True)
 
-# Debug CSRF environment variable loading
-import sys
-csrf_raw = os.getenv('ENABLE_CSRF')
-csrf_default = os.getenv('ENABLE_CSRF', 'false')
-csrf_lower = csrf_default.lower()
-csrf_result = csrf_lower == 'true'
-print(f"[DEBUG] CSRF Raw value: {repr(csrf_raw)}", file=sys.stderr)
-print(f"[DEBUG] CSRF Default: {repr(csrf_default)}", file=sys.stderr)
-print(f"[DEBUG] CSRF Lower: {repr(csrf_lower)}", file=sys.stderr)
-print(f"[DEBUG] CSRF Result: {csrf_result}", file=sys.stderr)
-
-SIGNALWIRE_PROJECT_ID = os.getenv('SIGNALWIRE_PROJECT_ID')
-SIGNALWIRE_TOKEN = os.getenv('SIGNALWIRE_TOKEN')
-SIGNALWIRE_AUTH_TOKEN = os.getenv('SIGNALWIRE_TOKEN')  # Same as SIGNALWIRE_TOKEN for consistency
-SIGNALWIRE_SPACE = os.getenv('SIGNALWIRE_SPACE')
-
-# Construct full SignalWire space URL from subdomain
-if SIGNALWIRE_SPACE:
-    SIGNALWIRE_SPACE = f"https://{SIGNALWIRE_SPACE}.signalwire.com"
-
-SIGNALWIRE_PHONE_NUMBER = os.getenv('FROM_NUMBER')  # Same as FROM_NUMBER for consistency
-PROJECT_URL = os.getenv('PROJECT_URL', 'http://localhost:8080')  # Default to localhost for development
-HTTP_USERNAME = os.getenv('HTTP_USERNAME')
-HTTP_PASSWORD = os.getenv('HTTP_PASSWORD')
-C2C_API_KEY = os.getenv('C2C_API_KEY')
-C2C_ADDRESS = os.getenv('C2C_ADDRESS')
+# Parsed once; everything below reads from this frozen object
+settings = load_settings()
+
+SIGNALWIRE_PROJECT_ID = settings.signalwire_project_id
+SIGNALWIRE_TOKEN = settings.signalwire_token
+SIGNALWIRE_AUTH_TOKEN = settings.signalwire_token  # Same as SIGNALWIRE_TOKEN for consistency
+SIGNALWIRE_SPACE = settings.space_url  # Full SignalWire space URL built from the subdomain
+SIGNALWIRE_API_URL = settings.api_base_url  # REST calls; the space unless SIGNALWIRE_BASE_URL points elsewhere
+SIGNALWIRE_PHONE_NUMBER = settings.from_number  # Same as FROM_NUMBER for consistency
+PROJECT_URL = settings.project_url  # Default to localhost for development
+HTTP_USERNAME = settings.http_username
+HTTP_PASSWORD = settings.http_password
+SWAIG_RESPONSE_BUDGET = settings.swaig_response_budget  # characters of text per SWAIG reply (see swaig_response.py)
+C2C_API_KEY = settings.c2c_api_key
+C2C_ADDRESS = settings.c2c_address
 
 # Initialize SWAIG before any @swaig.endpoint decorators
 swaig = SWAIG(app, auth=(HTTP_USERNAME, HTTP_PASSWORD))
 
 # Configuration - Use persistent SECRET_KEY from environment
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
+app.config['SECRET_KEY'] = settings.secret_key
 app.secret_key = app.config['SECRET_KEY']  # Set Flask's secret_key to the same persistent value
-app.config['ENABLE_CSRF'] = os.getenv('ENABLE_CSRF', 'false').lower() == 'true'
+app.config['ENABLE_CSRF'] = settings.enable_csrf
 
 # Configure MIME types
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
@@ -122,14 +139,54 @@ def close_db(error):
     if db is not None:
         db.close()
 
+# Every SignalWire call (MFA, SMS, MMS) gets a deadline within the request's budget
+# and a per-class circuit breaker, so an unreachable carrier fails fast
+outbound = Outbound(
+    timeouts={endpoint: settings.outbound_timeout for endpoint in ENDPOINT_CLASSES},
+    request_budget=settings.request_budget,
+    failure_threshold=settings.circuit_failures,
+    reset_timeout=settings.circuit_reset,
+)
+
+@app.before_request
+def start_outbound_deadline():
+    outbound.start_request()
+
+@app.teardown_request
+def end_outbound_deadline(error):
+    outbound.end_request()
+
+_signalwire = None
+_signalwire_lock = threading.Lock()
+
+def get_signalwire():
+    """The process's SignalWireMFA (REST client, MFA and messaging), built on first use.
+
+    signalwire.rest is only imported here, so starting the app or running a CLI
+    that never sends a message doesn't pay for it. A failed build isn't cached.
+    """
+    global _signalwire
+    if _signalwire is None:
+        with _signalwire_lock:
+            if _signalwire is None:
+                _signalwire = SignalWireMFA(settings.signalwire_project_id, settings.signalwire_token,
+                                            settings.space_url, settings.from_number, outbound=outbound,
+                                            base_url=settings.signalwire_base_url)
+    return _signalwire
+
 def init_db_if_needed():
-    if not os.path.exists('dental_office.db'):
-        with app.app_context():
-            db = get_db()
+    is_new_db = not os.path.exists('dental_office.db')
+    with app.app_context():
+        db = get_db()
+        if is_new_db:
             with app.open_resource('schema.sql') as f:
                 db.executescript(f.read().decode('utf8'))
             db.commit()
             app.logger.info('Database initialized')
+        # Bring existing and freshly created databases up to the latest schema version
+        applied = migrate(db)
+        if applied:
+            app.logger.info(f'Applied database migrations: {applied}')
 
 def login_required(f):
     @wraps(f)
@@ -139,24 +196,14 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+bill_number_allocator = BillNumberAllocator('dental_office.db')
+
+# Periodic jobs (registered further down) run in one process per deployment
+background_jobs = BackgroundJobs(settings.background_jobs_lock)
+
 def generate_unique_bill_number():
-    """Generate a unique 6-digit bill number"""
-    import random
-    max_attempts = 100
-    
-    db = get_db()
-    
-    for _ in range(max_attempts):
-        # Generate random 6-digit number (100000 to 999999)
-        bill_number = str(random.randint(100000, 999999))
-        
-        # Check if this number already exists
-        existing = db.execute('SELECT id FROM billing WHERE bill_number = ?', (bill_number,)).fetchone()
-        if not existing:
-            return bill_number
-    
-    # Fallback: if we can't find a unique number, raise an error
-    raise Exception("Unable to generate unique bill number after 100 attempts")
+    """Allocate a unique 6-digit bill number (call before starting the billing insert)"""
+    return bill_number_allocator.allocate(get_db())
 
 def hash_password(password):
     salt = secrets.token_hex(16)
@@ -167,8 +214,57 @@ def verify_password(password, stored_hash, salt):
     hash_obj = hashlib.sha256((password + salt).encode())
     return hash_obj.hexdigest() == stored_hash
 
+# Fingerprinted assets built by `python assets.py`; picks up rebuilds without a restart
+asset_manifest = AssetManifest(auto_reload=True)
+
+# Compiled templates are kept on disk so a fresh worker doesn't recompile them all
+JINJA_CACHE_DIR = settings.jinja_cache_dir or os.path.join(app.root_path, '.jinja_cache')
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+# {% cache %} fragments embed static URLs, so a new asset build invalidates them all
+app.jinja_env.add_extension(FragmentCacheExtension)
+app.jinja_env.fragment_cache_version = lambda: asset_manifest.version
+
+# Shared by all worker processes (shared_cache.py): SWAIG sessions and fragment versions,
+# so a verification or a fragment bump in one worker is seen by every other. Version
+# counters are pinned: evicting one would reset it to 0 and revive fragments cached before
+shared_cache = open_cache(settings.cache_backend, settings.cache_path)
+app.jinja_env.fragment_cache.versions = shared_cache.namespace('fragment-versions', ttl=0, pinned=True)
+
+# Repeated reads (dashboards, SWAIG lookups within a call); each process keeps its own
+# results, invalidated everywhere through the table versions that writes bump
+query_cache = QueryCache(
+    max_entries=settings.query_cache_max_entries,
+    max_bytes=settings.query_cache_max_mb * 1024 * 1024,
+    default_ttl=settings.query_cache_ttl,
+    ttls=parse_ttls(settings.query_cache_ttls),
+)
+
+# Identical requests arriving together (PDF renders, MMS images, dashboard refreshes)
+# wait for one computation in this process instead of each doing it
+single_flight = SingleFlight()
+
+@app.template_global()
+def static_url(filename):
+    """URL of a static file, using its fingerprinted build output when one exists"""
+    return url_for('serve_static', filename=asset_manifest.resolve(filename))
+
 @app.route('/static/<path:filename>')
 def serve_static(filename):
+    asset = asset_manifest.fingerprinted(filename)
+    if asset:
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), asset['encodings'])
+        served = f"{filename}.{ENCODING_SUFFIXES[encoding]}" if encoding else filename
+        response = send_from_directory('static', served, mimetype=asset['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
     response = send_from_directory('static', filename)
     if filename.endswith('.js') or filename.endswith('.min.js'):
         response.headers['Content-Type'] = 'application/javascript'
@@ -296,13 +392,9 @@ def patient_dashboard():
         flash('An error occurred while loading the dashboard', 'error')
         return redirect(url_for('index'))
 
-@app.route('/dentist/dashboard')
-@login_required
-def dentist_dashboard():
-    if session['user_type'] != 'dentist':
-        return redirect(url_for('patient_dashboard'))
-    db = get_db()
-    
+@query_cache.cached('dentist_dashboard', tables=('appointments', 'patients', 'dental_services', 'treatment_history', 'billing'))
+def dentist_dashboard_data(db, dentist_id, today):
+    """Everything on the dentist dashboard; today (UTC, like SQLite's date('now')) is part of the cache key"""
     # Get all appointments for this dentist
     appointments = db.execute('''
         SELECT a.*, p.first_name as patient_first_name, p.last_name as patient_last_name,
@@ -312,7 +404,7 @@ def dentist_dashboard():
         JOIN dental_services s ON a.service_id = s.id
         WHERE a.dentist_id = ?
         ORDER BY a.start_time DESC
-    ''', (session['user_id'],)).fetchall()
+    ''', (dentist_id,)).fetchall()
     
     # Get today's appointments
     today_appointments = db.execute('''
@@ -321,9 +413,9 @@ def dentist_dashboard():
         FROM appointments a
         JOIN patients p ON a.patient_id = p.id
         JOIN dental_services s ON a.service_id = s.id
-        WHERE a.dentist_id = ? AND date(a.start_time) = date('now')
+        WHERE a.dentist_id = ? AND date(a.start_time) = ?
         ORDER BY a.start_time ASC
-    ''', (session['user_id'],)).fetchall()
+    ''', (dentist_id, today)).fetchall()
     
     # Get total patients count for this dentist
     total_patients = db.execute('''
@@ -331,7 +423,7 @@ def dentist_dashboard():
         FROM patients p
         JOIN appointments a ON p.id = a.patient_id
         WHERE a.dentist_id = ?
-    ''', (session['user_id'],)).fetchone()['count']
+    ''', (dentist_id,)).fetchone()['count']
     
     # Get pending treatments (scheduled appointments that haven't been completed)
     pending_treatments = db.execute('''
@@ -342,7 +434,7 @@ def dentist_dashboard():
         JOIN dental_services s ON a.service_id = s.id
         WHERE a.dentist_id = ? AND a.status IN ('scheduled', 'in_progress')
         ORDER BY a.start_time ASC
-    ''', (session['user_id'],)).fetchall()
+    ''', (dentist_id,)).fetchall()
     
     # Get recent patients (patients with recent appointments)
     recent_patients = db.execute('''
@@ -353,7 +445,7 @@ def dentist_dashboard():
         GROUP BY p.id
         ORDER BY last_appointment DESC
         LIMIT 6
-    ''', (session['user_id'],)).fetchall()
+    ''', (dentist_id,)).fetchall()
     
     # Get recent treatments
     recent_treatments = db.execute('''
@@ -365,25 +457,31 @@ def dentist_dashboard():
         WHERE th.dentist_id = ?
         ORDER BY th.treatment_date DESC
         LIMIT 6
-    ''', (session['user_id'],)).fetchall()
-    
-    # Calculate monthly_revenue for this dentist using direct dentist_id
-    monthly_revenue = db.execute('''
-        SELECT COALESCE(SUM(b.amount), 0)
-        FROM billing b
-        WHERE b.dentist_id = ? AND strftime('%Y-%m', b.due_date) = strftime('%Y-%m', 'now')
-    ''', (session['user_id'],)).fetchone()[0]
-    
-    return render_template(
-        'dentist_dashboard.html',
-        appointments=appointments,
-        today_appointments=today_appointments,
-        total_patients=total_patients,
-        pending_treatments=pending_treatments,
-        recent_patients=recent_patients,
-        recent_treatments=recent_treatments,
-        monthly_revenue=monthly_revenue
-    )
+    ''', (dentist_id,)).fetchall()
+    
+    # This month's billed total for this dentist, from the daily rollups
+    monthly_revenue = analytics.monthly_revenue(db, dentist_id)
+    
+    return {
+        'appointments': appointments,
+        'today_appointments': today_appointments,
+        'total_patients': total_patients,
+        'pending_treatments': pending_treatments,
+        'recent_patients': recent_patients,
+        'recent_treatments': recent_treatments,
+        'monthly_revenue': monthly_revenue,
+    }
+
+@app.route('/dentist/dashboard')
+@login_required
+def dentist_dashboard():
+    if session['user_type'] != 'dentist':
+        return redirect(url_for('patient_dashboard'))
+    dentist_id = session['user_id']
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    data = single_flight.do('dentist-dashboard', (dentist_id, today),
+                            lambda: dentist_dashboard_data(get_db(), dentist_id, today))
+    return render_template('dentist_dashboard.html', **data)
 
 @app.route('/patient/appointments')
 @login_required
@@ -512,7 +610,7 @@ def patient_treatment_history():
     
     db = get_db()
     # Get patient information
-    patient = db.execute('SELECT * FROM patients WHERE id = ?', (session['user_id'],)).fetchone()
+    patient = get_current_user()
     
     # Get appointments
     appointments = db.execute('''
@@ -586,18 +684,20 @@ def not_found_error(error):
 def internal_error(error):
     return render_template('500.html'), 500
 
+STATUS_COLORS = {
+    'scheduled': 'success',
+    'completed': 'primary',
+    'cancelled': 'danger',
+    'in_progress': 'warning',
+    'pending': 'warning',
+    'paid': 'success',
+    'overdue': 'danger'
+}
+
 @app.template_filter('status_color')
+@lru_cache(maxsize=256)
 def status_color(status):
-    colors = {
-        'scheduled': 'success',
-        'completed': 'primary',
-        'cancelled': 'danger',
-        'in_progress': 'warning',
-        'pending': 'warning',
-        'paid': 'success',
-        'overdue': 'danger'
-    }
-    return colors.get(status, 'secondary')
+    return STATUS_COLORS.get(status, 'secondary')
 
 @app.template_filter('format_date')
 def format_date(date_str, format_type='short'):
@@ -631,6 +731,39 @@ def format_date(date_str, format_type='short'):
         # If parsing fails, return the first 10 characters (date part)
         return str(date_str)[:10] if date_str else 'N/A'
 
+# Direct type mappings
+SERVICE_TYPE_CLASSES = {
+    'cleaning': 'cleaning',
+    'filling': 'filling',
+    'whitening': 'whitening',
+    'root_canal': 'root_canal',
+    'extraction': 'extraction',
+    'orthodontics': 'orthodontics',
+    'checkup': 'checkup',
+    'other': 'other'
+}
+
+# Name-based mappings for when service name is passed instead of type
+SERVICE_NAME_CLASSES = {
+    'regular cleaning': 'cleaning',
+    'deep cleaning': 'cleaning',
+    'dental cleaning': 'cleaning',
+    'cavity filling': 'filling',
+    'composite filling': 'filling',
+    'teeth whitening': 'whitening',
+    'professional whitening': 'whitening',
+    'tooth whitening': 'whitening',
+    'root canal': 'root_canal',
+    'root canal treatment': 'root_canal',
+    'tooth extraction': 'extraction',
+    'dental extraction': 'extraction',
+    'braces': 'orthodontics',
+    'orthodontic': 'orthodontics',
+    'dental checkup': 'checkup',
+    'regular checkup': 'checkup',
+    'examination': 'checkup'
+}
+
 @app.template_filter('service_class')
 def service_class(service_type_or_name):
     """
@@ -639,51 +772,19 @@ def service_class(service_type_or_name):
     """
     if not service_type_or_name:
         return 'other'
-    
-    service_input = str(service_type_or_name).lower()
-    
-    # Direct type mappings
-    type_mappings = {
-        'cleaning': 'cleaning',
-        'filling': 'filling', 
-        'whitening': 'whitening',
-        'root_canal': 'root_canal',
-        'extraction': 'extraction',
-        'orthodontics': 'orthodontics',
-        'checkup': 'checkup',
-        'other': 'other'
-    }
-    
+    return _service_class(str(service_type_or_name).lower())
+
+@lru_cache(maxsize=1024)
+def _service_class(service_input):
     # Check direct type match first
-    if service_input in type_mappings:
-        return type_mappings[service_input]
-    
-    # Name-based mappings for when service name is passed instead of type
-    name_mappings = {
-        'regular cleaning': 'cleaning',
-        'deep cleaning': 'cleaning',
-        'dental cleaning': 'cleaning',
-        'cavity filling': 'filling',
-        'composite filling': 'filling',
-        'teeth whitening': 'whitening',
-        'professional whitening': 'whitening',
-        'tooth whitening': 'whitening',
-        'root canal': 'root_canal',
-        'root canal treatment': 'root_canal',
-        'tooth extraction': 'extraction',
-        'dental extraction': 'extraction',
-        'braces': 'orthodontics',
-        'orthodontic': 'orthodontics',
-        'dental checkup': 'checkup',
-        'regular checkup': 'checkup',
-        'examination': 'checkup'
-    }
-    
+    if service_input in SERVICE_TYPE_CLASSES:
+        return SERVICE_TYPE_CLASSES[service_input]
+
     # Check name-based mappings
-    for name_pattern, service_type in name_mappings.items():
+    for name_pattern, service_type in SERVICE_NAME_CLASSES.items():
         if name_pattern in service_input:
             return service_type
-    
+
     # Default to 'other' if no match found
     return 'other'
 
@@ -691,15 +792,15 @@ def service_class(service_type_or_name):
 @login_required
 def get_services():
     db = get_db()
-    services = db.execute('SELECT * FROM dental_services ORDER BY name').fetchall()
-    return jsonify([dict(service) for service in services])
+    services = db.execute('SELECT * FROM dental_services ORDER BY name')
+    return Response(dump_rows(services), mimetype='application/json')
 
 @app.route('/api/dentists', methods=['GET'])
 @login_required
 def get_dentists():
     db = get_db()
-    dentists = db.execute('SELECT id, first_name, last_name FROM dentists ORDER BY last_name').fetchall()
-    return jsonify([dict(dentist) for dentist in dentists])
+    dentists = db.execute('SELECT id, first_name, last_name FROM dentists ORDER BY last_name')
+    return Response(dump_rows(dentists), mimetype='application/json')
 
 @app.route('/api/appointments', methods=['GET'])
 @login_required
@@ -707,7 +808,7 @@ def get_appointments():
     db = get_db()
     app.logger.info(f"API: Fetching appointments for user_id={session['user_id']} user_type={session['user_type']}")
     if session['user_type'] == 'patient':
-        appointments = db.execute('''
+        cursor = db.execute('''
             SELECT a.*, d.first_name as dentist_first_name, d.last_name as dentist_last_name,
                    s.name as service_name
             FROM appointments a
@@ -715,13 +816,9 @@ def get_appointments():
             JOIN dental_services s ON a.service_id = s.id
             WHERE a.patient_id = ?
             ORDER BY a.start_time DESC
-        ''', (session['user_id'],)).fetchall()
-        app.logger.info(f"API: Raw appointments fetched: {appointments}")
-        appointments = [dict(appt) for appt in appointments]
-        for appt in appointments:
-            appt['dentist_name'] = f"{appt.get('dentist_first_name', '')} {appt.get('dentist_last_name', '')}".strip()
+        ''', (session['user_id'],))
     else:
-        appointments = db.execute('''
+        cursor = db.execute('''
             SELECT a.*, p.first_name as patient_first_name, p.last_name as patient_last_name,
                    s.name as service_name
             FROM appointments a
@@ -729,19 +826,19 @@ def get_appointments():
             JOIN dental_services s ON a.service_id = s.id
             WHERE a.dentist_id = ?
             ORDER BY a.start_time DESC
-        ''', (session['user_id'],)).fetchall()
-        app.logger.info(f"API: Raw appointments fetched: {appointments}")
-        appointments = [dict(appt) for appt in appointments]
-        for appt in appointments:
-            appt['dentist_name'] = user['first_name'] + ' ' + user['last_name'] if 'user' in locals() else ''
-    result = []
-    for appt in appointments:
-        appt_dict = dict(appt)
-        appt_dict['appointment_id'] = appt_dict.get('id', None)
-        appt_dict['sms_reminder'] = appt_dict.get('sms_reminder', True)
-        result.append(appt_dict)
-    app.logger.info(f"API: Returning appointments JSON: {result}")
-    return jsonify(result)
+        ''', (session['user_id'],))
+    is_patient = session['user_type'] == 'patient'
+
+    def to_json(appt):
+        if is_patient:
+            appt['dentist_name'] = f"{appt.get('dentist_first_name', '')} {appt.get('dentist_last_name', '')}".strip()
+        else:
+            appt['dentist_name'] = ''
+        appt['appointment_id'] = appt.get('id', None)
+        appt['sms_reminder'] = appt.get('sms_reminder', True)
+        return appt
+
+    return stream_json(cursor, to_json)
 
 @app.route('/api/appointments/<int:appointment_id>', methods=['GET'])
 @login_required
@@ -801,25 +898,16 @@ def create_appointment():
             patient_id = data.get('patient_id')
             if not patient_id:
                 return jsonify({'error': 'Patient ID is required'}), 400
-        
-        cursor = db.execute('''
-            INSERT INTO appointments (
-                patient_id, dentist_id, service_id, type, status, start_time, end_time,
-                notes, sms_reminder
-            ) VALUES (?, ?, ?, ?, 'scheduled', ?, ?, ?, ?)
-        ''', (
-            patient_id,
-            dentist_id,
-            data['service_id'],
-            data.get('type', 'checkup'),
-            data['start_time'],
-            data['end_time'],
-            data.get('notes', ''),
-            int(data.get('sms_reminder', True))
-        ))
-        db.commit()
-        
-        appointment_id = cursor.lastrowid
+
+        # Patients can only book inside the dentist's working hours; dentists may book extra time
+        appointment_id = book(
+            db, patient_id, dentist_id, data['start_time'], data['end_time'],
+            service_id=data['service_id'],
+            appointment_type=data.get('type', 'checkup'),
+            notes=data.get('notes', ''),
+            sms_reminder=int(data.get('sms_reminder', True)),
+            enforce_hours=session['user_type'] == 'patient'
+        )
         appointment = db.execute('''
             SELECT a.*, d.first_name as dentist_first_name, d.last_name as dentist_last_name,
                    s.name as service_name
@@ -837,24 +925,21 @@ def create_appointment():
             service = db.execute('SELECT * FROM dental_services WHERE id = ?', (data['service_id'],)).fetchone()
             if patient and dentist and service:
                 try:
-                    mfa = SignalWireMFA(
-                        SIGNALWIRE_PROJECT_ID,
-                        SIGNALWIRE_TOKEN,
-                        SIGNALWIRE_SPACE,
-                        os.getenv('FROM_NUMBER')
-                    )
-                    appt_date = data['start_time'][:10]
-                    appt_time = data['start_time'][11:16]
+                    mfa = get_signalwire()
+                    appt_date = appointment['start_time'][:10]
+                    appt_time = appointment['start_time'][11:16]
                     sms_body = f"Your appointment for {service['name']} with Dr. {dentist['first_name']} {dentist['last_name']} is scheduled for {appt_date} at {appt_time}."
                     mfa.client.messages.create(
-                        from_=os.getenv('FROM_NUMBER'),
+                        from_=settings.from_number,
                         to=patient['phone'],
                         body=sms_body
                     )
                 except Exception as e:
                     app.logger.error(f"Failed to send SMS reminder: {e}")
-        
+
         return jsonify(dict(appointment)), 201
+    except BookingError as e:
+        return booking_error_response(e)
     except sqlite3.Error as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
@@ -903,17 +988,12 @@ def update_appointment(appointment_id):
             service = db.execute('SELECT * FROM dental_services WHERE id = ?', (appointment['service_id'],)).fetchone()
             if patient and dentist and service:
                 try:
-                    mfa = SignalWireMFA(
-                        SIGNALWIRE_PROJECT_ID,
-                        SIGNALWIRE_TOKEN,
-                        SIGNALWIRE_SPACE,
-                        os.getenv('FROM_NUMBER')
-                    )
+                    mfa = get_signalwire()
                     appt_date = appointment['start_time'][:10]
                     appt_time = appointment['start_time'][11:16]
                     sms_body = f"Your appointment for {service['name']} with Dr. {dentist['first_name']} {dentist['last_name']} has been rescheduled to {appt_date} at {appt_time}."
                     mfa.client.messages.create(
-                        from_=os.getenv('FROM_NUMBER'),
+                        from_=settings.from_number,
                         to=patient['phone'],
                         body=sms_body
                     )
@@ -981,12 +1061,7 @@ def cancel_appointment_api(appointment_id):
             try:
                 patient = db.execute('SELECT * FROM patients WHERE id = ?', (appointment['patient_id'],)).fetchone()
                 if patient and patient['phone']:
-                    mfa = SignalWireMFA(
-                        SIGNALWIRE_PROJECT_ID,
-                        SIGNALWIRE_TOKEN,
-                        SIGNALWIRE_SPACE,
-                        os.getenv('FROM_NUMBER')
-                    )
+                    mfa = get_signalwire()
                     
                     # Format the appointment time for SMS
                     appt_date = datetime.fromisoformat(appointment['start_time']).strftime('%A, %B %d, %Y')
@@ -995,7 +1070,7 @@ def cancel_appointment_api(appointment_id):
                     sms_body = f"Your appointment for {updated_appointment['service_name']} with Dr. {updated_appointment['dentist_first_name']} {updated_appointment['dentist_last_name']} scheduled for {appt_date} at {appt_time} has been cancelled."
                     
                     mfa.client.messages.create(
-                        from_=os.getenv('FROM_NUMBER'),
+                        from_=settings.from_number,
                         to=patient['phone'],
                         body=sms_body
                     )
@@ -1047,33 +1122,15 @@ def reschedule_appointment(appointment_id):
         if not new_date or not time_slot:
             return jsonify({'error': 'Date and time slot are required'}), 400
         
-        # Convert time slot to actual times
-        start_time = None
-        end_time = None
-        if time_slot == 'morning':
-            start_time = f"{new_date}T08:00:00"
-            end_time = f"{new_date}T11:00:00"
-        elif time_slot == 'afternoon':
-            start_time = f"{new_date}T14:00:00"
-            end_time = f"{new_date}T16:00:00"
-        elif time_slot == 'evening':
-            start_time = f"{new_date}T18:00:00"
-            end_time = f"{new_date}T20:00:00"
-        elif time_slot == 'all_day':
-            start_time = f"{new_date}T08:00:00"
-            end_time = f"{new_date}T20:00:00"
-        else:
-            logging.warning(f"[SWAIG] Invalid time slot: {time_slot}")
-            return SWAIGResponse("Invalid time slot", status=400)
-        
-        # Update the appointment
-        db.execute('''
-            UPDATE appointments 
-            SET start_time = ?, end_time = ?, notes = ?
-            WHERE id = ?
-        ''', (start_time, end_time, notes, appointment_id))
-        db.commit()
-        
+        window_start, window_end = slot_window(new_date, time_slot)
+        _, start, _ = book_in_window(
+            db, appointment['patient_id'], appointment['dentist_id'], window_start, window_end,
+            duration=window_duration(appointment, window_start, window_end),
+            notes=notes, appointment_id=appointment_id,
+            enforce_hours=session['user_type'] == 'patient'
+        )
+        start_time = start.strftime('%Y-%m-%d %H:%M:%S')
+
         # Get the updated appointment
         updated_appointment = db.execute('''
             SELECT a.*, d.first_name as dentist_first_name, d.last_name as dentist_last_name,
@@ -1089,22 +1146,19 @@ def reschedule_appointment(appointment_id):
             try:
                 patient = db.execute('SELECT * FROM patients WHERE id = ?', (appointment['patient_id'],)).fetchone()
                 if patient:
-                    mfa = SignalWireMFA(
-                        SIGNALWIRE_PROJECT_ID,
-                        SIGNALWIRE_TOKEN,
-                        SIGNALWIRE_SPACE,
-                        os.getenv('FROM_NUMBER')
-                    )
+                    mfa = get_signalwire()
                     sms_body = f"Your appointment for {updated_appointment['service_name']} with Dr. {updated_appointment['dentist_first_name']} {updated_appointment['dentist_last_name']} has been rescheduled to {new_date} at {start_time[11:16]}."
                     mfa.client.messages.create(
-                        from_=os.getenv('FROM_NUMBER'),
+                        from_=settings.from_number,
                         to=patient['phone'],
                         body=sms_body
                     )
             except Exception as e:
                 app.logger.error(f"Failed to send SMS reminder: {e}")
-        
+
         return jsonify(dict(updated_appointment))
+    except BookingError as e:
+        return booking_error_response(e)
     except sqlite3.Error as e:
         db.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1122,7 +1176,7 @@ def get_treatment_history():
             JOIN dental_services s ON th.service_id = s.id
             WHERE th.patient_id = ?
             ORDER BY th.treatment_date DESC
-        ''', (session['user_id'],)).fetchall()
+        ''', (session['user_id'],))
     else:
         history = db.execute('''
             SELECT th.*, p.first_name as patient_first_name, p.last_name as patient_last_name,
@@ -1132,8 +1186,8 @@ def get_treatment_history():
             JOIN dental_services s ON th.service_id = s.id
             WHERE th.dentist_id = ?
             ORDER BY th.treatment_date DESC
-        ''', (session['user_id'],)).fetchall()
-    return jsonify([dict(record) for record in history])
+        ''', (session['user_id'],))
+    return stream_json(history)
 
 @app.route('/api/billing', methods=['GET'])
 @login_required
@@ -1147,7 +1201,7 @@ def get_billing():
             JOIN dental_services s ON b.service_id = s.id
             WHERE b.patient_id = ?
             ORDER BY b.due_date DESC
-        ''', (session['user_id'],)).fetchall()
+        ''', (session['user_id'],))
     else:
         bills = db.execute('''
             SELECT b.*, t.diagnosis, t.treatment_notes, t.treatment_date, s.name as service_name
@@ -1156,8 +1210,8 @@ def get_billing():
             JOIN dental_services s ON b.service_id = s.id
             WHERE b.dentist_id = ?
             ORDER BY b.due_date DESC
-        ''', (session['user_id'],)).fetchall()
-    return jsonify([dict(record) for record in bills])
+        ''', (session['user_id'],))
+    return stream_json(bills)
 
 @app.route('/api/insurance-claims', methods=['GET'])
 @login_required
@@ -1191,48 +1245,39 @@ def get_available_slots():
     
     db = get_db()
     
-    # Get dentist's working hours
-    dentist = db.execute('SELECT working_hours FROM dentists WHERE id = ?', (dentist_id,)).fetchone()
-    if not dentist:
+    hours = get_working_hours(db, dentist_id)
+    if hours is None:
         return jsonify({'error': 'Dentist not found'}), 404
-    
-    working_hours = json.loads(dentist['working_hours'])
-    day_of_week = date_obj.strftime('%A').lower()
-    
-    if day_of_week not in working_hours:
+    if not hours.day_mask(date_obj):
         return jsonify({'error': 'Dentist not available on this day'}), 400
     
-    # Get booked appointments for the day
-    booked_slots = db.execute('''
-        SELECT start_time
+    # Minutes taken by the day's appointments (range scan over dentist_id, start_time)
+    next_day = (date_obj + timedelta(days=1)).strftime('%Y-%m-%d')
+    booked = db.execute('''
+        SELECT start_time, end_time
         FROM appointments
-        WHERE dentist_id = ? AND date(start_time) = ? AND status != 'cancelled'
-    ''', (dentist_id, date)).fetchall()
-    booked_times = [datetime.fromisoformat(slot['start_time']).strftime('%H:%M') for slot in booked_slots]
-    
-    # Generate available slots
-    available_slots = []
-    start_time = datetime.strptime(working_hours[day_of_week]['start'], '%H:%M')
-    end_time = datetime.strptime(working_hours[day_of_week]['end'], '%H:%M')
-    slot_duration = timedelta(minutes=30)  # 30-minute slots
-    
-    current_time = start_time
-    while current_time + slot_duration <= end_time:
-        slot_time = current_time.strftime('%H:%M')
-        if slot_time not in booked_times:
-            available_slots.append(slot_time)
-        current_time += slot_duration
-    
+        WHERE dentist_id = ? AND start_time >= ? AND start_time < ? AND status != 'cancelled'
+    ''', (dentist_id, date, next_day)).fetchall()
+    busy = 0
+    for slot in booked:
+        start = parse_hhmm(str(slot['start_time'])[11:16])
+        end = parse_hhmm(str(slot['end_time'])[11:16]) if str(slot['end_time'])[:10] == date else MINUTES_PER_DAY
+        busy |= minute_mask(start, max(end, start + 1))
+    
+    # 30-minute slots inside the working hours that don't overlap a booking
+    available_slots = [format_minute(minute) for minute in hours.free_slots(date_obj, 30, busy)]
     return jsonify(available_slots)
 
 @app.route('/api/calendar/dentist-schedule', methods=['GET'])
 @login_required
 def get_dentist_schedule():
+    """Working days with appointments for one dentist (dentist_id) or several (dentist_ids=1,2 or all)"""
     dentist_id = request.args.get('dentist_id')
+    dentist_ids = request.args.get('dentist_ids')
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
-    if not all([dentist_id, start_date, end_date]):
+    if not all([dentist_id or dentist_ids, start_date, end_date]):
         return jsonify({'error': 'Missing required parameters'}), 400
     
     try:
@@ -1240,51 +1285,228 @@ def get_dentist_schedule():
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
     except ValueError:
         return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if end_date_obj < start_date_obj:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
+    if (end_date_obj - start_date_obj).days >= MAX_SCHEDULE_DAYS:
+        return jsonify({'error': f'Date range is limited to {MAX_SCHEDULE_DAYS} days'}), 400
     
     db = get_db()
     
-    # Get dentist's working hours
-    dentist = db.execute('SELECT working_hours FROM dentists WHERE id = ?', (dentist_id,)).fetchone()
-    if not dentist:
-        return jsonify({'error': 'Dentist not found'}), 404
-    
-    working_hours = json.loads(dentist['working_hours'])
+    if dentist_ids:
+        if dentist_ids == 'all':
+            ids = None
+        else:
+            try:
+                ids = [int(i) for i in dentist_ids.split(',') if i.strip()]
+            except ValueError:
+                return jsonify({'error': 'dentist_ids must be a comma-separated list of ids or "all"'}), 400
+        return jsonify(multi_dentist_schedule(db, ids, start_date_obj, end_date_obj))
     
-    # Get appointments for the date range
-    appointments = db.execute('''
-        SELECT a.*, p.first_name as patient_first_name, p.last_name as patient_last_name,
-               s.name as service_name
-        FROM appointments a
-        JOIN patients p ON a.patient_id = p.id
-        JOIN dental_services s ON a.service_id = s.id
-        WHERE a.dentist_id = ? AND a.appointment_date BETWEEN ? AND ?
-        ORDER BY a.appointment_date, a.appointment_time
-    ''', (dentist_id, start_date, end_date)).fetchall()
-    
-    schedule = []
-    current_date = start_date_obj
-    while current_date <= end_date_obj:
-        day_of_week = current_date.strftime('%A').lower()
-        date_str = current_date.strftime('%Y-%m-%d')
-        
-        if day_of_week in working_hours:
-            day_schedule = {
-                'date': date_str,
-                'working_hours': working_hours[day_of_week],
-                'appointments': []
-            }
-            
-            # Add appointments for this day
-            for appointment in appointments:
-                if appointment['appointment_date'] == date_str:
-                    day_schedule['appointments'].append(dict(appointment))
-            
-            schedule.append(day_schedule)
-        
-        current_date += timedelta(days=1)
+    schedule = dentist_schedule(db, dentist_id, start_date_obj, end_date_obj)
+    if schedule is None:
+        return jsonify({'error': 'Dentist not found'}), 404
     
     return jsonify(schedule)
 
+@app.route('/api/schedule-exceptions', methods=['GET'])
+@login_required
+def list_schedule_exceptions():
+    """Days off, partial closures, extra hours and clinic holidays, optionally for one dentist and date range"""
+    sql = 'SELECT * FROM schedule_exceptions WHERE 1'
+    params = []
+    dentist_id = request.args.get('dentist_id')
+    if dentist_id:
+        sql += ' AND (dentist_id = ? OR dentist_id IS NULL)'
+        params.append(dentist_id)
+    if request.args.get('start_date'):
+        sql += ' AND date >= ?'
+        params.append(request.args['start_date'])
+    if request.args.get('end_date'):
+        sql += ' AND date <= ?'
+        params.append(request.args['end_date'])
+    rows = get_db().execute(sql + ' ORDER BY date, start_minute', params).fetchall()
+    return jsonify([dict(row,
+                         start=format_minute(row['start_minute']) if row['start_minute'] is not None else None,
+                         end=format_minute(row['end_minute']) if row['end_minute'] is not None else None,
+                         available=bool(row['available']))
+                    for row in rows])
+
+@app.route('/api/schedule-exceptions', methods=['POST'])
+@login_required
+def create_schedule_exception():
+    """Add a day off or extra hours for the signed-in dentist, or a clinic-wide holiday (clinic_wide: true)"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    data = request.get_json() or {}
+    try:
+        day = datetime.strptime(data.get('date', ''), '%Y-%m-%d').strftime('%Y-%m-%d')
+        start = parse_hhmm(data['start']) if data.get('start') else None
+        end = parse_hhmm(data['end']) if data.get('end') else None
+        db = get_db()
+        exception_id = add_schedule_exception(
+            db, day,
+            dentist_id=None if data.get('clinic_wide') else session['user_id'],
+            start_minute=start, end_minute=end,
+            available=bool(data.get('available')), reason=data.get('reason', '')
+        )
+        db.commit()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    logging.info(f"[HOURS] Dentist {session['user_id']} added schedule exception {exception_id} on {day}")
+    return jsonify({'success': True, 'id': exception_id}), 201
+
+@app.route('/api/schedule-exceptions/<int:exception_id>', methods=['DELETE'])
+@login_required
+def remove_schedule_exception(exception_id):
+    if session['user_type'] != 'dentist':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    db = get_db()
+    row = db.execute('SELECT dentist_id FROM schedule_exceptions WHERE id = ?', (exception_id,)).fetchone()
+    if not row:
+        return jsonify({'success': False, 'message': 'Exception not found'}), 404
+    if row['dentist_id'] is not None and row['dentist_id'] != session['user_id']:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    delete_schedule_exception(db, exception_id)
+    db.commit()
+    return jsonify({'success': True})
+
+@app.route('/api/appointments/bulk', methods=['POST'])
+@login_required
+def bulk_appointments():
+    """Cancel, move or reassign all of a dentist's scheduled appointments in a date range.
+
+    Body: action (cancel, move or reassign), start_date, end_date
+    (YYYY-MM-DD), target_dentist_id for reassign, optional move_after for
+    move, reason, notify (default true), atomic and dry_run. Only the
+    signed-in dentist's own appointments are changed; a dentist_id for anyone
+    else is refused. Returns a per-appointment report; patients get one SMS
+    each, sent in the background.
+    """
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    data = request.get_json() or {}
+    if data.get('dentist_id') not in (None, '') and str(data['dentist_id']) != str(session['user_id']):
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        start_date = datetime.strptime(data.get('start_date', ''), '%Y-%m-%d').date()
+        end_date = datetime.strptime(data.get('end_date') or data.get('start_date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    dry_run = bool(data.get('dry_run'))
+    db = get_db()
+    try:
+        results, committed = bulk_update(
+            db, data.get('action'), session['user_id'], start_date, end_date,
+            target_dentist_id=data.get('target_dentist_id'), move_after=data.get('move_after'),
+            atomic=bool(data.get('atomic')), dry_run=dry_run
+        )
+    except BookingError as e:
+        return booking_error_response(e)
+    except sqlite3.Error as e:
+        return jsonify({'error': str(e)}), 500
+
+    notified = 0
+    if committed and data.get('notify', True):
+        messages = notification_messages(db, results, data.get('reason', ''))
+        if messages:
+            try:
+                client = get_signalwire().client
+                from_number = settings.from_number
+                dispatch_notifications(messages, lambda to, body: client.messages.create(
+                    from_=from_number, to=to, body=body))
+                notified = len(messages)
+            except Exception as e:
+                app.logger.error(f"Failed to send bulk appointment notifications: {e}")
+    return jsonify({
+        'action': data.get('action'),
+        'dry_run': dry_run,
+        'committed': committed,
+        'summary': summarize(results),
+        'patients_notified': notified,
+        'results': [result.as_dict() for result in results],
+    })
+
+def _report_range():
+    """(start_date, end_date) from the query string; the last year by default"""
+    end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') \
+        else datetime.now().date()
+    start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') \
+        else end_date - timedelta(days=365)
+    if end_date < start_date:
+        raise ValueError('end_date must not be before start_date')
+    return start_date, end_date
+
+def _report_dentist_id():
+    dentist_id = request.args.get('dentist_id')
+    return int(dentist_id) if dentist_id else None
+
+@app.route('/api/reports/revenue', methods=['GET'])
+@login_required
+def revenue_report():
+    """Billed, insurance and outstanding per period (period=day|week|month|year), optionally by=dentist|service|status"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        start_date, end_date = _report_range()
+        report = analytics.revenue_report(get_db(), start_date, end_date, period=request.args.get('period', 'month'),
+                                          by=request.args.get('by') or None, dentist_id=_report_dentist_id())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), 'rows': report})
+
+@app.route('/api/reports/collections', methods=['GET'])
+@login_required
+def collections_report():
+    """Billed against collected per period, with the collection rate"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        start_date, end_date = _report_range()
+        report = analytics.collections_report(get_db(), start_date, end_date,
+                                              period=request.args.get('period', 'month'),
+                                              dentist_id=_report_dentist_id())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), 'rows': report})
+
+@app.route('/api/reports/aging', methods=['GET'])
+@login_required
+def aging_report():
+    """Accounts receivable by days past due (current, 1-30, 31-60, 61-90, 90+) as of a date (default today)"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d').date() if request.args.get('as_of') else None
+        report = analytics.aging_report(get_db(), as_of, dentist_id=_report_dentist_id())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report)
+
+@app.route('/api/cache/stats', methods=['GET'])
+@login_required
+def cache_stats():
+    """Shared cache counters (this worker's hits/misses, shared entry count), the fragment cache's, and this worker's query cache, coalesced requests and SWAIG account contexts"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    fragments = app.jinja_env.fragment_cache
+    return jsonify({
+        'pid': os.getpid(),
+        'shared': shared_cache.stats(),
+        'fragments': {'hits': fragments.hits, 'misses': fragments.misses},
+        'caller_id': {'hits': caller_id_cache.hits, 'misses': caller_id_cache.misses},
+        'queries': query_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'account_contexts': account_contexts.stats(),
+    })
+
+@app.route('/api/outbound/stats', methods=['GET'])
+@login_required
+def outbound_stats():
+    """This worker's SignalWire circuit states, call outcomes and timeout rates per endpoint class"""
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized'}), 403
+    return jsonify(dict(outbound.stats(), pid=os.getpid()))
+
 @app.route('/forgot_password', methods=['GET', 'POST'])
 def forgot_password():
     return render_template('forgot_password.html')
@@ -1365,12 +1587,7 @@ def api_password_reset_initiate():
             
         # Use SignalWire MFA system (same as test-mfa)
         try:
-            mfa = SignalWireMFA(
-                SIGNALWIRE_PROJECT_ID,
-                SIGNALWIRE_TOKEN,
-                SIGNALWIRE_SPACE,
-                os.getenv('FROM_NUMBER')
-            )
+            mfa = get_signalwire()
             response = mfa.send_mfa(user['phone'])
             mfa_id = response.get('id')
             
@@ -1396,6 +1613,9 @@ def api_password_reset_initiate():
                 'message': f'Verification code sent to {user["phone"]}'
             })
             
+        except OutboundUnavailable as e:
+            app.logger.warning(f'[OUTBOUND] Password reset code not sent: {e}')
+            return jsonify({'success': False, 'error': 'Verification codes are temporarily unavailable. Please try again in a few minutes.'}), 503
         except Exception as e:
             app.logger.error(f'Failed to send MFA for password reset: {e}')
             return jsonify({'success': False, 'error': 'Failed to send verification code'}), 500
@@ -1491,12 +1711,7 @@ def api_password_reset_complete():
         
         # Verify the MFA code using SignalWire (only once!)
         try:
-            mfa = SignalWireMFA(
-                SIGNALWIRE_PROJECT_ID,
-                SIGNALWIRE_TOKEN,
-                SIGNALWIRE_SPACE,
-                os.getenv('FROM_NUMBER')
-            )
+            mfa = get_signalwire()
             result = mfa.verify_mfa(mfa_id, code)
             
             if not result.get('success'):
@@ -1765,127 +1980,108 @@ def update_dentist_profile():
     phone = request.form.get('phone')
     specialization = request.form.get('specialization')
     working_hours = request.form.get('working_hours')
+    try:
+        parse_weekly_hours(working_hours)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid working hours: {e}'}), 400
     try:
         db.execute('''
             UPDATE dentists SET first_name=?, last_name=?, email=?, phone=?, specialization=?, working_hours=?
             WHERE id=?
         ''', (first_name, last_name, email, phone, specialization, working_hours, user_id))
+        sync_dentist_working_hours(db, user_id)
         db.commit()
+        forget_current_user()
         session['name'] = f"{first_name} {last_name}"
+        app.jinja_env.fragment_cache.bump('dentist-options')
         return jsonify({'success': True, 'message': 'Profile updated successfully'})
     except Exception as e:
         db.rollback()
         return jsonify({'success': False, 'message': str(e)})
 
 def get_current_user():
-    if 'user_id' not in session or 'user_type' not in session:
-        return None
-    db = get_db()
-    if session['user_type'] == 'patient':
-        return db.execute('SELECT * FROM patients WHERE id = ?', (session['user_id'],)).fetchone()
-    elif session['user_type'] == 'dentist':
-        return db.execute('SELECT * FROM dentists WHERE id = ?', (session['user_id'],)).fetchone()
-    return None
+    """The signed-in patient or dentist (an identity.CurrentUser), queried once per request"""
+    return current_user(get_db())
+
+def booking_error_response(e):
+    """JSON error for a rejected booking; conflicts (409) include the nearest free alternatives"""
+    body = {'error': e.message}
+    if isinstance(e, BookingConflict):
+        body['alternatives'] = alternatives_json(e.alternatives)
+    return jsonify(body), e.status
+
+def send_payment_confirmation_sms(db, payment):
+    """Text the patient a confirmation for a posted payment; failures are logged, never raised"""
+    try:
+        details = db.execute('''
+            SELECT s.name as service_name, p.phone
+            FROM billing b
+            JOIN dental_services s ON b.service_id = s.id
+            JOIN patients p ON b.patient_id = p.id
+            WHERE b.id = ?
+        ''', (payment['billing_id'],)).fetchone()
+        if not details or not details['phone']:
+            return
+
+        mfa = get_signalwire()
+
+        sms_body = f"Payment confirmation: ${payment['amount']:.2f} payment received for {details['service_name']}. "
+        if payment['remaining_balance'] > 0:
+            sms_body += f"Remaining balance: ${payment['remaining_balance']:.2f}."
+        else:
+            sms_body += "Bill is now fully paid."
+
+        sms_body += f" Payment Ref: {payment['transaction_id']}"
+        if payment['reference_number']:
+            sms_body += f" | Bill Ref: {payment['reference_number']}"
+
+        mfa.client.messages.create(
+            from_=settings.from_number,
+            to=details['phone'],
+            body=sms_body
+        )
+        print(f"[SWAIG][CONSOLE] SMS payment confirmation sent to {details['phone']}")
+        logging.info(f"[SWAIG] SMS payment confirmation sent to {details['phone']}")
+    except Exception as sms_error:
+        print(f"[SWAIG][CONSOLE] Failed to send SMS payment confirmation: {sms_error}")
+        logging.error(f"[SWAIG] Failed to send SMS payment confirmation: {sms_error}")
+        # Don't fail the payment if SMS fails
 
 @app.route('/api/make-payment', methods=['POST'])
 @login_required
 def make_payment():
+    if session['user_type'] != 'patient':
+        return jsonify({'error': 'Only patients can make payments'}), 403
+
     data = request.get_json()
     billing_id = data.get('billing_id')
     payment_method_id = data.get('payment_method_id')
     amount = data.get('amount')
     notes = data.get('notes', '')
+    # Clients send the same key when retrying so a payment is never posted twice
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
 
     if not all([billing_id, payment_method_id, amount]):
         return jsonify({'error': 'Missing required fields'}), 400
 
     db = get_db()
     try:
-        # Fetch payment method type
-        method = db.execute('SELECT method_type FROM payment_methods WHERE id = ?', (payment_method_id,)).fetchone()
-        if not method:
-            return jsonify({'error': 'Invalid payment method'}), 400
-        payment_method_type = method['method_type']
-
-        # Fetch current patient_portion and status
-        bill = db.execute('SELECT patient_portion, status FROM billing WHERE id = ?', (billing_id,)).fetchone()
-        if not bill:
-            return jsonify({'error': 'Invalid bill'}), 400
-
-        new_portion = bill['patient_portion'] - amount
-        if new_portion > 0:
-            new_status = 'partial'
-        else:
-            new_status = 'paid'
-            new_portion = 0
-
-        # Insert payment record
-        cursor = db.execute('''
-            INSERT INTO payments (billing_id, patient_id, amount, payment_date, payment_method_id, payment_method_type, status, transaction_id, notes)
-            VALUES (?, ?, ?, datetime('now'), ?, ?, 'completed', ?, ?)
-        ''', (billing_id, session['user_id'], amount, payment_method_id, payment_method_type, secrets.token_hex(8), notes))
-        db.commit()
-
-        # Update billing record
-        db.execute('UPDATE billing SET patient_portion = ?, status = ? WHERE id = ?', (new_portion, new_status, billing_id))
-        db.commit()
-
-        # Send SMS confirmation for payment
-        try:
-            # Get payment and bill details for SMS
-            payment_details = db.execute('''
-                SELECT b.*, s.name as service_name, p.phone, pm.method_type,
-                       CASE 
-                           WHEN pm.method_type = 'credit_card' THEN '**** **** **** ' || substr(pm.card_number, -4)
-                           WHEN pm.method_type = 'banking' THEN pm.bank_name || ' - ****' || substr(pm.account_number, -4)
-                       END as payment_method_details
-                FROM billing b
-                JOIN dental_services s ON b.service_id = s.id
-                JOIN patients p ON b.patient_id = p.id
-                JOIN payment_methods pm ON pm.id = ?
-                WHERE b.id = ?
-            ''', (payment_method_id, billing_id)).fetchone()
-            
-            if payment_details and payment_details['phone']:
-                # Convert to dict for easier access
-                payment_details_dict = dict(payment_details)
-                
-                mfa = SignalWireMFA(
-                    SIGNALWIRE_PROJECT_ID,
-                    SIGNALWIRE_TOKEN,
-                    SIGNALWIRE_SPACE,
-                    os.getenv('FROM_NUMBER')
-                )
-                
-                sms_body = f"Payment confirmation: ${amount:.2f} payment received for {payment_details_dict['service_name']}. "
-                if new_portion > 0:
-                    sms_body += f"Remaining balance: ${new_portion:.2f}."
-                else:
-                    sms_body += "Bill is now fully paid."
-                
-                sms_body += f" Payment Ref: {secrets.token_hex(4).upper()}"
-                if payment_details_dict['reference_number']:
-                    sms_body += f" | Bill Ref: {payment_details_dict['reference_number']}"
-                
-                mfa.client.messages.create(
-                    from_=os.getenv('FROM_NUMBER'),
-                    to=payment_details_dict['phone'],
-                    body=sms_body
-                )
-                print(f"[SWAIG][CONSOLE] SMS payment confirmation sent to {payment_details_dict['phone']}")
-                logging.info(f"[SWAIG] SMS payment confirmation sent to {payment_details_dict['phone']}")
-        except Exception as sms_error:
-            print(f"[SWAIG][CONSOLE] Failed to send SMS payment confirmation: {sms_error}")
-            logging.error(f"[SWAIG] Failed to send SMS payment confirmation: {sms_error}")
-            # Don't fail the payment if SMS fails
-        
-        print(f"[SWAIG][CONSOLE] Payment successful for bill {billing_id}, patient {session['user_id']}, amount ${amount}")
-        logging.info(f"[SWAIG] Payment successful for bill {billing_id}, patient {session['user_id']}, amount ${amount}")
-        return jsonify({'success': True, 'message': f"Payment of ${amount:.2f} processed successfully. Remaining balance: ${new_portion:.2f}", 'patient_id': session['user_id'], 'amount_paid': amount, 'remaining_balance': new_portion})
+        payment = post_payment(db, session['user_id'], billing_id, payment_method_id, amount,
+                               idempotency_key=idempotency_key, notes=notes)
+    except PaymentError as e:
+        return jsonify({'error': e.message}), e.status
     except sqlite3.Error as e:
-        db.rollback()
         return jsonify({'error': str(e)}), 500
 
+    if not payment['replayed']:
+        send_payment_confirmation_sms(db, payment)
+
+    amount_paid = payment['amount']
+    new_portion = payment['remaining_balance']
+    print(f"[SWAIG][CONSOLE] Payment successful for bill {billing_id}, patient {session['user_id']}, amount ${amount_paid}")
+    logging.info(f"[SWAIG] Payment successful for bill {billing_id}, patient {session['user_id']}, amount ${amount_paid}")
+    return jsonify({'success': True, 'message': f"Payment of ${amount_paid:.2f} processed successfully. Remaining balance: ${new_portion:.2f}", 'patient_id': session['user_id'], 'amount_paid': amount_paid, 'remaining_balance': new_portion, 'transaction_id': payment['transaction_id'], 'replayed': payment['replayed']})
+
 @app.route('/api/add-payment-method', methods=['POST'])
 @login_required
 def add_payment_method():
@@ -2065,10 +2261,8 @@ def get_bill_details(bill_id):
     
     return jsonify(bill_dict)
 
-@app.route('/api/bill-pdf/<int:bill_id>', methods=['GET'])
-@login_required
-def download_bill_pdf(bill_id):
-    """Generate and download a PDF for a specific bill"""
+def render_bill_pdf(db, bill_id, user_type, user_id):
+    """A bill as PDF bytes, or None when it isn't the user's bill"""
     from reportlab.lib.pagesizes import letter
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
     from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -2077,10 +2271,8 @@ def download_bill_pdf(bill_id):
     from io import BytesIO
     import os
     
-    db = get_db()
-    
     # Get bill details (same query as above)
-    if session['user_type'] == 'patient':
+    if user_type == 'patient':
         bill = db.execute('''
             SELECT b.*, t.diagnosis, t.treatment_notes, t.treatment_date, 
                    s.name as service_name, d.first_name as dentist_first_name, 
@@ -2096,7 +2288,7 @@ def download_bill_pdf(bill_id):
             LEFT JOIN dentists d ON b.dentist_id = d.id
             JOIN patients p ON b.patient_id = p.id
             WHERE b.id = ? AND b.patient_id = ?
-        ''', (bill_id, session['user_id'])).fetchone()
+        ''', (bill_id, user_id)).fetchone()
     else:
         bill = db.execute('''
             SELECT b.*, t.diagnosis, t.treatment_notes, t.treatment_date, 
@@ -2113,10 +2305,10 @@ def download_bill_pdf(bill_id):
             LEFT JOIN dentists d ON b.dentist_id = d.id
             JOIN patients p ON b.patient_id = p.id
             WHERE b.id = ? AND b.dentist_id = ?
-        ''', (bill_id, session['user_id'])).fetchone()
+        ''', (bill_id, user_id)).fetchone()
     
     if not bill:
-        return jsonify({'error': 'Bill not found'}), 404
+        return None
     
     # Create PDF in memory
     buffer = BytesIO()
@@ -2236,11 +2428,23 @@ def download_bill_pdf(bill_id):
     
     # Build PDF
     doc.build(story)
+    return buffer.getvalue()
+
+@app.route('/api/bill-pdf/<int:bill_id>', methods=['GET'])
+@login_required
+def download_bill_pdf(bill_id):
+    """Generate and download a PDF for a specific bill"""
+    from io import BytesIO
+    user_type, user_id = session['user_type'], session['user_id']
+    # A bill link opened several times at once (shared, double-clicked) is rendered once
+    pdf = single_flight.do('bill-pdf', (bill_id, user_type, user_id),
+                           lambda: render_bill_pdf(get_db(), bill_id, user_type, user_id))
+    if pdf is None:
+        return jsonify({'error': 'Bill not found'}), 404
     
     # Return PDF
-    buffer.seek(0)
     return send_file(
-        buffer,
+        BytesIO(pdf),
         as_attachment=True,
         download_name=f'bill_{bill_id}.pdf',
         mimetype='application/pdf'
@@ -2265,7 +2469,9 @@ def update_patient_profile():
             UPDATE patients SET first_name=?, last_name=?, email=?, phone=?, date_of_birth=?, address=?
             WHERE id=?
         ''', (first_name, last_name, email, phone, date_of_birth, address, user_id))
+        sync_patient_phone_e164(db, user_id)
         db.commit()
+        forget_current_user()
         session['name'] = f"{first_name} {last_name}"
         return jsonify({'success': True, 'message': 'Profile updated successfully'})
     except Exception as e:
@@ -2288,91 +2494,80 @@ def call_popup():
                          c2c_api_key=C2C_API_KEY or 'your-c2c-api-key',
                          c2c_address=C2C_ADDRESS or 'your-c2c-address')
 
-# --- MFA State Management (demo only, not for production) ---
-VERIFIED_PATIENTS = {}
-VERIFIED_PATIENT_DATA = {}  # Maintain backward compatibility
-ACTIVE_MFA_SESSIONS = {}
-CHALLENGE_TOKENS = {}  # New: Store challenge token -> patient data mappings
-LAST_MFA_ID = None
+# --- MFA State Management ---
+# Kept in the shared cache so a caller verified through one worker is recognized by all;
+# sessions, challenge tokens and pending lookups expire after SWAIG_SESSION_TTL seconds
+# and are pinned, so bulk cache entries never evict them mid-call
+VERIFIED_PATIENTS = shared_cache.namespace('swaig-verified-patients', ttl=settings.swaig_session_ttl, pinned=True)
+ACTIVE_MFA_SESSIONS = shared_cache.namespace('swaig-mfa-sessions', ttl=settings.swaig_session_ttl, pinned=True)
+CHALLENGE_TOKENS = shared_cache.namespace('swaig-challenge-tokens', ttl=settings.swaig_session_ttl, pinned=True)
+PENDING_PATIENT_DATA = shared_cache.namespace('swaig-pending-patients', ttl=settings.swaig_session_ttl, pinned=True)
+MFA_STATE = shared_cache.namespace('swaig-mfa', ttl=settings.swaig_session_ttl, pinned=True)
+
+def load_account_context(db, patient_id):
+    """What the read-only SWAIG follow-ups tell a caller, as plain data for the shared cache; None if unknown"""
+    patient = db.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,)).fetchone()
+    if not patient:
+        return None
+    bills = swaig_bill_rows.uncached(db, SWAIG_BILLS_QUERY + ' ORDER BY b.due_date DESC', (patient['id'],))
+    appointments, cancelled_count = swaig_appointment_rows.uncached(
+        db, SWAIG_APPOINTMENTS_QUERY + ' ORDER BY a.start_time ASC', (patient['id'],))
+    return {
+        'patient': swaig_session_record(dict(patient)),
+        'balance': db.execute('SELECT COALESCE(SUM(patient_portion), 0) as total FROM billing WHERE patient_id = ? AND status != "paid"',
+                              (patient['id'],)).fetchone()['total'],
+        'bills': [(dict(bill), [dict(payment) for payment in payments]) for bill, payments in bills],
+        'appointments': [dict(appointment) for appointment in appointments],
+        'cancelled_appointments': cancelled_count,
+        'payment_methods': [dict(method) for method in db.execute(SWAIG_PAYMENT_METHODS_QUERY, (patient['id'],))],
+    }
+
+# Balance, bills, appointments and payment methods per challenge token, prefetched at verification
+account_contexts = AccountContexts(shared_cache.namespace('swaig-account-context', ttl=settings.swaig_session_ttl),
+                                   load_account_context, 'dental_office.db')
+
+def get_last_mfa_id():
+    """The most recently sent MFA request (verify_mfa_code checks the code against it)"""
+    return MFA_STATE.get('last_mfa_id')
 
 def clear_mfa_session(mfa_id):
     """Clear MFA session data"""
-    global VERIFIED_PATIENTS, ACTIVE_MFA_SESSIONS
-    if mfa_id in VERIFIED_PATIENTS:
-        del VERIFIED_PATIENTS[mfa_id]
-    if mfa_id in ACTIVE_MFA_SESSIONS:
-        del ACTIVE_MFA_SESSIONS[mfa_id]
+    VERIFIED_PATIENTS.delete(mfa_id)
+    ACTIVE_MFA_SESSIONS.delete(mfa_id)
     print(f"[SWAIG][CONSOLE] Cleared MFA session: {mfa_id}")
     logging.info(f"[SWAIG] Cleared MFA session: {mfa_id}")
 
 def get_verified_patient(mfa_id):
     """Get verified patient data for MFA session"""
-    return VERIFIED_PATIENTS.get(mfa_id) or VERIFIED_PATIENT_DATA.get(mfa_id)
+    return VERIFIED_PATIENTS.get(mfa_id) if mfa_id else None
 
 def is_patient_verified(mfa_id):
     """Check if patient is verified for this MFA session"""
-    is_verified = mfa_id and (mfa_id in VERIFIED_PATIENTS or mfa_id in VERIFIED_PATIENT_DATA)
+    is_verified = bool(mfa_id) and mfa_id in VERIFIED_PATIENTS
     print(f"[SWAIG][CONSOLE] is_patient_verified({mfa_id}): {is_verified}")
-    print(f"[SWAIG][CONSOLE] VERIFIED_PATIENTS keys: {list(VERIFIED_PATIENTS.keys())}")
-    print(f"[SWAIG][CONSOLE] VERIFIED_PATIENT_DATA keys: {list(VERIFIED_PATIENT_DATA.keys())}")
     logging.info(f"[SWAIG] is_patient_verified({mfa_id}): {is_verified}")
     return is_verified
 
+# All the SWAIG functions need to know about a caller between calls; the session
+# namespaces can live on disk, so credentials and medical fields stay out of them
+SWAIG_SESSION_FIELDS = ('id', 'patient_id', 'first_name', 'last_name', 'phone')
+
+def swaig_session_record(patient_data):
+    """The SWAIG_SESSION_FIELDS of a patient row or dict, for the session namespaces"""
+    return {field: patient_data.get(field) for field in SWAIG_SESSION_FIELDS}
+
 def store_verified_patient(mfa_id, patient_data):
     """Store verified patient data for MFA session"""
-    global VERIFIED_PATIENTS, VERIFIED_PATIENT_DATA, ACTIVE_MFA_SESSIONS
-    VERIFIED_PATIENTS[mfa_id] = patient_data
-    VERIFIED_PATIENT_DATA[mfa_id] = patient_data  # Maintain backward compatibility
-    ACTIVE_MFA_SESSIONS[mfa_id] = {
+    patient_data = swaig_session_record(patient_data)
+    VERIFIED_PATIENTS.set(mfa_id, patient_data)
+    ACTIVE_MFA_SESSIONS.set(mfa_id, {
         'patient_id': patient_data.get('patient_id'),
         'verified_at': datetime.now().isoformat(),
         'phone': patient_data.get('phone')
-    }
+    })
     print(f"[SWAIG][CONSOLE] Stored verified patient data for session {mfa_id}: Patient {patient_data.get('patient_id', 'Unknown')}")
     logging.info(f"[SWAIG] Stored verified patient data for session {mfa_id}: Patient {patient_data.get('patient_id', 'Unknown')}")
 
-def validate_phone(phone):
-    """Validate phone number is in E.164 format: +[country code][number]"""
-    import re
-    if not phone:
-        return False
-    # E.164 format: + followed by 1-3 digit country code, then 4-14 digits
-    # Total length should be 8-18 characters (+ plus 7-17 digits)
-    pattern = r'^\+[1-9]\d{6,14}$'
-    return bool(re.match(pattern, str(phone).strip()))
-
-def format_to_e164(phone, default_country_code='1'):
-    """Format phone number to E.164 format"""
-    if not phone:
-        return None
-    
-    # Clean the phone number - remove all non-digit characters except +
-    cleaned = ''.join(char for char in str(phone) if char.isdigit() or char == '+')
-    
-    # If already starts with +, validate and return if valid
-    if cleaned.startswith('+'):
-        if validate_phone(cleaned):
-            return cleaned
-        else:
-            return None
-    
-    # If it's a 10-digit number (US format), add +1
-    if len(cleaned) == 10 and cleaned.isdigit():
-        formatted = f'+{default_country_code}{cleaned}'
-        return formatted if validate_phone(formatted) else None
-    
-    # If it's an 11-digit number starting with 1 (US format with country code)
-    if len(cleaned) == 11 and cleaned.startswith('1'):
-        formatted = f'+{cleaned}'
-        return formatted if validate_phone(formatted) else None
-    
-    # If it's just digits and reasonable length, try adding default country code
-    if cleaned.isdigit() and 7 <= len(cleaned) <= 14:
-        formatted = f'+{default_country_code}{cleaned}'
-        return formatted if validate_phone(formatted) else None
-    
-    return None
-
 def is_valid_uuid(val):
     import uuid
     try:
@@ -2383,20 +2578,19 @@ def is_valid_uuid(val):
 
 def store_challenge_token(challenge_token, patient_data):
     """Store challenge token with associated patient data"""
-    global CHALLENGE_TOKENS
-    CHALLENGE_TOKENS[challenge_token] = patient_data
+    patient_data = swaig_session_record(patient_data)
+    CHALLENGE_TOKENS.set(challenge_token, patient_data)
     print(f"[SWAIG][CONSOLE] Stored challenge token {challenge_token[:20]}... for patient {patient_data.get('patient_id', 'Unknown')}")
     logging.info(f"[SWAIG] Stored challenge token {challenge_token[:20]}... for patient {patient_data.get('patient_id', 'Unknown')}")
 
 def get_patient_by_challenge_token(challenge_token):
     """Get patient data by challenge token"""
-    return CHALLENGE_TOKENS.get(challenge_token)
+    return CHALLENGE_TOKENS.get(challenge_token) if challenge_token else None
 
 def is_challenge_token_valid(challenge_token):
     """Check if challenge token is valid and has associated patient data"""
-    is_valid = challenge_token and challenge_token in CHALLENGE_TOKENS
+    is_valid = bool(challenge_token) and challenge_token in CHALLENGE_TOKENS
     print(f"[SWAIG][CONSOLE] is_challenge_token_valid({challenge_token}): {is_valid}")
-    print(f"[SWAIG][CONSOLE] CHALLENGE_TOKENS keys: {list(CHALLENGE_TOKENS.keys())}")
     logging.info(f"[SWAIG] is_challenge_token_valid({challenge_token}): {is_valid}")
     return is_valid
 
@@ -2428,16 +2622,98 @@ def swaig_check_balance(challenge_token=None, meta_data_token=None, **kwargs):
         return "Patient information not found. Please verify your identity again.", {}
     
     db = get_db()
-    patient = db.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,)).fetchone()
-    if not patient:
+    context = account_contexts.get(db, challenge_token, patient_id)
+    if not context:
         print(f"[SWAIG][CONSOLE] Patient not found: {patient_id}")
         logging.warning(f"[SWAIG] Patient not found: {patient_id}")
         return "Patient account not found", {}
     
-    balance = db.execute('SELECT COALESCE(SUM(patient_portion), 0) as total FROM billing WHERE patient_id = ? AND status != "paid"', (patient['id'],)).fetchone()
-    print(f"[SWAIG][CONSOLE] Returning balance for patient {patient_id}: ${balance['total']}")
-    logging.info(f"[SWAIG] Returning balance for patient {patient_id}: ${balance['total']}")
-    return f"Your current outstanding balance is ${balance['total']:.2f}", {'balance': balance['total'], 'patient_id': patient_id}
+    balance = context['balance']
+    print(f"[SWAIG][CONSOLE] Returning balance for patient {patient_id}: ${balance}")
+    logging.info(f"[SWAIG] Returning balance for patient {patient_id}: ${balance}")
+    return f"Your current outstanding balance is ${balance:.2f}", {'balance': balance, 'patient_id': patient_id}
+
+SWAIG_BILLS_QUERY = '''
+    SELECT b.*, 
+           s.name as service_name, s.description as service_description, s.price as service_price,
+           CASE 
+               WHEN d.first_name LIKE 'Dr.%' THEN d.first_name || ' ' || d.last_name
+               ELSE 'Dr. ' || d.first_name || ' ' || d.last_name
+           END as dentist_name,
+           th.diagnosis, th.treatment_notes, th.treatment_date,
+           (b.amount - COALESCE(b.insurance_coverage, 0)) as calculated_patient_portion
+    FROM billing b
+    JOIN dental_services s ON b.service_id = s.id
+    LEFT JOIN dentists d ON b.dentist_id = d.id
+    LEFT JOIN treatment_history th ON b.reference_number = th.reference_number
+    WHERE b.patient_id = ?
+'''
+
+@query_cache.cached('swaig_bills', tables=('billing', 'dental_services', 'dentists', 'treatment_history', 'payments'))
+def swaig_bill_rows(db, query, params):
+    """[(bill, its payments newest first)] for the query swaig_get_bills built"""
+    bills = db.execute(query, params).fetchall()
+    ids = [bill['id'] for bill in bills]
+    payments = {}
+    for payment in db.execute(f'''
+        SELECT billing_id, payment_date, amount, payment_method_type, transaction_id
+        FROM payments
+        WHERE billing_id IN ({', '.join('?' for _ in ids)})
+        ORDER BY payment_date DESC
+    ''', ids):
+        payments.setdefault(payment['billing_id'], []).append(payment)
+    return [(bill, payments.get(bill['id'], [])) for bill in bills]
+
+# What SWAIG bill replies hand back as data; the prose is built from the full rows
+SWAIG_BILL_FIELDS = ('id', 'bill_number', 'reference_number', 'service_name', 'dentist_name', 'status', 'amount',
+                     'insurance_coverage', 'patient_portion', 'total_paid', 'remaining_balance', 'payment_count', 'due_date')
+
+SWAIG_BILL_REFERENCE_FIELDS = ('id', 'bill_number', 'reference_number', 'service_name', 'dentist_name', 'amount',
+                               'patient_portion', 'display_status', 'due_date', 'created_at')
+
+def swaig_bill_with_payments(bill, payments):
+    """A swaig_bill_rows bill as a dict with its payment history, amount paid and remaining balance"""
+    total_paid = sum(float(p['amount']) for p in payments) if payments else 0
+    patient_portion = float(bill['patient_portion']) if bill['patient_portion'] else float(bill['calculated_patient_portion'])
+    remaining_balance = max(0, patient_portion - total_paid)
+    return dict(bill, **{
+        'payment_history': [dict(p) for p in payments],
+        'total_paid': total_paid,
+        'remaining_balance': remaining_balance,
+        'payment_count': len(payments),
+        'is_fully_paid': remaining_balance == 0,
+        'patient_portion_calculated': patient_portion
+    })
+
+def swaig_bill_lines(number, bill):
+    """(headline, detail lines) for one bill in swaig_get_bills' reply, most useful details first"""
+    payments = bill['payment_history']
+    if bill['status'] == 'paid':
+        headline = f"{number}. Bill #{bill['bill_number']} - {bill['service_name']}: ${bill['patient_portion_calculated']:.2f} (Paid)"
+        last = f"Last Payment: ${float(payments[0]['amount']):.2f} on {payments[0]['payment_date']}" if payments else None
+        return headline, [f"Reference: {bill['reference_number']}", f"Total Paid: ${bill['total_paid']:.2f}", last]
+
+    due_text = f", due {bill['due_date']}" if bill['due_date'] else ""
+    status_text = f" ({bill['status'].title()})" if bill['status'] != 'pending' else ""
+    headline = (f"{number}. Bill #{bill['bill_number']} - {bill['service_name']}: "
+                f"${bill['remaining_balance']:.2f} remaining{due_text}{status_text}")
+    if payments:
+        made = [f"${float(p['amount']):.2f} on {p['payment_date']} via {p['payment_method_type']}" for p in payments[:2]]
+        if len(payments) > 2:
+            made.append(f"and {len(payments) - 2} more")
+        payment_line = f"Payments ({len(payments)}): {'; '.join(made)}"
+    else:
+        payment_line = "Payments: none yet"
+    return headline, [
+        f"Reference: {bill['reference_number']}",
+        f"Total ${float(bill['amount']):.2f}, insurance ${float(bill['insurance_coverage'] or 0):.2f}, "
+        f"your portion ${bill['patient_portion_calculated']:.2f}, paid ${bill['total_paid']:.2f}",
+        f"Provider: {bill['dentist_name']}" if bill['dentist_name'] else None,
+        payment_line,
+        f"Diagnosis: {clip(bill['diagnosis'])}" if bill['diagnosis'] else None,
+        f"Service Details: {clip(bill['service_description'])}" if bill['service_description'] else None,
+        f"Treatment Notes: {clip(bill['treatment_notes'])}" if bill['treatment_notes'] else None,
+    ]
 
 @swaig.endpoint(
     "Get Bills",
@@ -2515,22 +2791,8 @@ def swaig_get_bills(challenge_token=None, service_name=None, status=None, amount
     
     db = get_db()
     
-    # Build comprehensive SQL query to get all bill details including payment history
-    base_query = '''
-        SELECT b.*, 
-               s.name as service_name, s.description as service_description, s.price as service_price,
-               CASE 
-                   WHEN d.first_name LIKE 'Dr.%' THEN d.first_name || ' ' || d.last_name
-                   ELSE 'Dr. ' || d.first_name || ' ' || d.last_name
-               END as dentist_name,
-               th.diagnosis, th.treatment_notes, th.treatment_date,
-               (b.amount - COALESCE(b.insurance_coverage, 0)) as calculated_patient_portion
-        FROM billing b
-        JOIN dental_services s ON b.service_id = s.id
-        LEFT JOIN dentists d ON b.dentist_id = d.id
-        LEFT JOIN treatment_history th ON b.reference_number = th.reference_number
-        WHERE b.patient_id = ?
-    '''
+    # All bill details including payment history, narrowed by the filters below
+    base_query = SWAIG_BILLS_QUERY
     
     conditions = []
     params = [patient_internal_id]
@@ -2568,11 +2830,11 @@ def swaig_get_bills(challenge_token=None, service_name=None, status=None, amount
         conditions.append("b.due_date = ?")
         params.append(due_date)
     
-    # Reference number filter (flexible matching)
+    # Reference number filter (flexible matching through the search index)
     if reference_number:
-        ref_search = reference_number.strip().upper()
-        conditions.append("UPPER(b.reference_number) LIKE ?")
-        params.append(f'%{ref_search}%')
+        ref_bill_ids = find_bill_ids(db, reference_number, patient_internal_id)
+        conditions.append(f"b.id IN ({', '.join('?' for _ in ref_bill_ids) or 'NULL'})")
+        params.extend(ref_bill_ids)
     
     # Add conditions to query
     if conditions:
@@ -2586,113 +2848,49 @@ def swaig_get_bills(challenge_token=None, service_name=None, status=None, amount
     logging.info(f"[SWAIG][DEBUG] Query: {base_query}")
     logging.info(f"[SWAIG][DEBUG] Params: {params}")
     
-    bills = db.execute(base_query, params).fetchall()
+    context = None if conditions else account_contexts.get(db, challenge_token, patient_id)
+    if context and context['patient']['id'] == patient_internal_id:
+        bills = context['bills']
+    else:
+        bills = swaig_bill_rows(db, base_query, tuple(params))
     
     # DEBUG: Log what bills were actually returned
     print(f"[SWAIG][DEBUG] Raw bills returned: {len(bills)}")
-    for bill in bills:
+    for bill, _ in bills:
         print(f"[SWAIG][DEBUG] Bill ID: {bill['id']}, Patient ID: {bill['patient_id']}, Bill #: {bill['bill_number']}")
     logging.info(f"[SWAIG][DEBUG] Raw bills returned: {len(bills)}")
     
-    # Get payment history for each bill
-    enhanced_bills = []
-    for bill in bills:
-        bill_dict = dict(bill)
-        
-        # Get payment history for this bill
-        payments = db.execute('''
-            SELECT payment_date, amount, payment_method_type, transaction_id
-            FROM payments
-            WHERE billing_id = ?
-            ORDER BY payment_date DESC
-        ''', (bill['id'],)).fetchall()
-        
-        # Calculate payment totals and remaining balance
-        total_paid = sum(float(p['amount']) for p in payments) if payments else 0
-        patient_portion = float(bill['patient_portion']) if bill['patient_portion'] else float(bill['calculated_patient_portion'])
-        remaining_balance = max(0, patient_portion - total_paid)
-        
-        # Add enhanced information to bill
-        bill_dict.update({
-            'payment_history': [dict(p) for p in payments],
-            'total_paid': total_paid,
-            'remaining_balance': remaining_balance,
-            'payment_count': len(payments),
-            'is_fully_paid': remaining_balance == 0,
-            'patient_portion_calculated': patient_portion
-        })
-        
-        enhanced_bills.append(bill_dict)
+    # Add payment totals and remaining balance to each bill
+    enhanced_bills = [swaig_bill_with_payments(bill, payments) for bill, payments in bills]
     
     print(f"[SWAIG][CONSOLE] Returning {len(enhanced_bills)} bills with full details for patient {patient_id}{filter_text}")
     logging.info(f"[SWAIG] Returning {len(enhanced_bills)} bills with full details for patient {patient_id}{filter_text}")
     
     if enhanced_bills:
-        bills_summary = f"Found {len(enhanced_bills)} bill(s)"
-        if filter_desc:
-            bills_summary += f" matching {', '.join(filter_desc)}"
-        bills_summary += ". "
-        
         pending_bills = [b for b in enhanced_bills if b['status'] != 'paid']
-        if pending_bills:
-            total_due = sum(b['remaining_balance'] for b in pending_bills)
-            bills_summary += f"Total amount due: ${total_due:.2f}.\n"
-            
-            bills_summary += f"\nDetailed Bill Information:\n"
-            
-            # Add comprehensive bill information
-            for i, bill in enumerate(enhanced_bills, 1):
-                status_text = f" ({bill['status'].title()})" if bill['status'] != 'pending' else ""
-                patient_portion = bill['patient_portion_calculated']
-                remaining = bill['remaining_balance']
-                
-                bills_summary += f"\n{i}. Bill #{bill['bill_number']} - {bill['service_name']}\n"
-                bills_summary += f"   Reference: {bill['reference_number']}\n"
-                bills_summary += f"   Total Amount: ${float(bill['amount']):.2f}\n"
-                bills_summary += f"   Insurance Coverage: ${float(bill['insurance_coverage'] or 0):.2f}\n"
-                bills_summary += f"   Patient Portion: ${patient_portion:.2f}\n"
-                bills_summary += f"   Amount Paid: ${bill['total_paid']:.2f}\n"
-                bills_summary += f"   Remaining Balance: ${remaining:.2f}{status_text}\n"
-                
-                if bill['dentist_name']:
-                    bills_summary += f"   Provider: {bill['dentist_name']}\n"
-                
-                if bill['service_description']:
-                    bills_summary += f"   Service Details: {bill['service_description']}\n"
-                
-                if bill['diagnosis']:
-                    bills_summary += f"   Diagnosis: {bill['diagnosis']}\n"
-                
-                if bill['due_date']:
-                    bills_summary += f"   Due Date: {bill['due_date']}\n"
-                
-                if bill['payment_history']:
-                    bills_summary += f"   Payment History: {bill['payment_count']} payment(s)\n"
-                    for payment in bill['payment_history'][:2]:  # Show last 2 payments
-                        bills_summary += f"     - ${float(payment['amount']):.2f} on {payment['payment_date']} via {payment['payment_method_type']}\n"
-                    if len(bill['payment_history']) > 2:
-                        bills_summary += f"     - ... and {len(bill['payment_history']) - 2} more payment(s)\n"
-                else:
-                    bills_summary += f"   Payment History: No payments yet\n"
-                
-                if bill['treatment_notes']:
-                    bills_summary += f"   Treatment Notes: {bill['treatment_notes']}\n"
+        total_due = sum(b['remaining_balance'] for b in pending_bills)
+        matching = f" matching {', '.join(filter_desc)}" if filter_desc else ""
+        reply = VoiceResponse(SWAIG_RESPONSE_BUDGET, noun='bills')
+        if pending_bills:
+            reply.summary(f"Found {len(enhanced_bills)} bill(s){matching}. Total amount due: ${total_due:.2f} "
+                          f"on {len(pending_bills)} unpaid bill(s).")
         else:
-            bills_summary += "All matching bills are paid.\n\nDetailed Bill Information:\n"
-            for i, bill in enumerate(enhanced_bills, 1):
-                patient_portion = bill['patient_portion_calculated']
-                bills_summary += f"\n{i}. Bill #{bill['bill_number']} - {bill['service_name']}: ${patient_portion:.2f} (Paid)\n"
-                bills_summary += f"   Reference: {bill['reference_number']}\n"
-                bills_summary += f"   Total Paid: ${bill['total_paid']:.2f}\n"
-                if bill['payment_history']:
-                    bills_summary += f"   Last Payment: ${float(bill['payment_history'][0]['amount']):.2f} on {bill['payment_history'][0]['payment_date']}\n"
-        
+            reply.summary(f"Found {len(enhanced_bills)} bill(s){matching}. All matching bills are paid.")
+
+        # Unpaid bills first: they are what callers ask about
+        ordered = pending_bills + [b for b in enhanced_bills if b['status'] == 'paid']
+        for i, bill in enumerate(ordered, 1):
+            reply.item(*swaig_bill_lines(i, bill))
+        bills_summary = reply.build()
+        logging.info(f"[SWAIG] swaig_get_bills reply: {len(bills_summary)} chars, {reply.omitted} bill(s) "
+                     f"counted only, {reply.collapsed} without details")
+
         return bills_summary, {
-            'bills': enhanced_bills, 
+            'bills': [compact(dict(b, patient_portion=b['patient_portion_calculated']), SWAIG_BILL_FIELDS) for b in ordered],
             'patient_id': patient_id, 
             'filters_applied': filter_desc,
             'total_bills': len(enhanced_bills),
-            'total_amount_due': sum(b['remaining_balance'] for b in pending_bills) if pending_bills else 0,
+            'total_amount_due': round(total_due, 2),
             'bills_with_payments': len([b for b in enhanced_bills if b['payment_count'] > 0])
         }
     else:
@@ -2779,8 +2977,10 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
             # Try type match (for common abbreviations like "cleaning", "whitening")
             service = db.execute('SELECT * FROM dental_services WHERE LOWER(type) = LOWER(?)', (service_id,)).fetchone()
         if not service:
-            # Try partial name match
-            service = db.execute('SELECT * FROM dental_services WHERE LOWER(name) LIKE LOWER(?)', (f'%{service_id}%',)).fetchone()
+            # Try partial or misspelled name match
+            service_matches = search(db, service_id, entities=('service',), limit=1)
+            if service_matches:
+                service = db.execute('SELECT * FROM dental_services WHERE id = ?', (service_matches[0]['id'],)).fetchone()
         
         if service:
             resolved_service_id = service['id']
@@ -2798,11 +2998,11 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
         if not dentist:
             return f"Dentist ID {dentist_id} not found", {}
     else:
-        # Try to resolve dentist by name
-        dentist = db.execute('''
-            SELECT * FROM dentists 
-            WHERE LOWER(first_name || ' ' || last_name) LIKE LOWER(?)
-        ''', (f'%{dentist_id}%',)).fetchone()
+        # Try to resolve dentist by name (prefix, partial or sound-alike)
+        dentist = None
+        dentist_matches = search(db, dentist_id, entities=('dentist',), limit=1)
+        if dentist_matches:
+            dentist = db.execute('SELECT * FROM dentists WHERE id = ?', (dentist_matches[0]['id'],)).fetchone()
         
         if dentist:
             resolved_dentist_id = dentist['id']
@@ -2829,30 +3029,27 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
     dentist_id = resolved_dentist_id
     service_id = resolved_service_id
     
-    # Convert time slot to actual times
-    if time_slot == 'morning':
-        start_time = f"{date}T08:00:00"
-        end_time = f"{date}T11:00:00"
-    elif time_slot == 'afternoon':
-        start_time = f"{date}T14:00:00"
-        end_time = f"{date}T16:00:00"
-    elif time_slot == 'evening':
-        start_time = f"{date}T18:00:00"
-        end_time = f"{date}T20:00:00"
-    elif time_slot == 'all_day':
-        start_time = f"{date}T08:00:00"
-        end_time = f"{date}T20:00:00"
-    else:
+    try:
+        window_start, window_end = slot_window(date, time_slot)
+    except BookingError as e:
         print(f"[SWAIG][CONSOLE] Invalid time slot: {time_slot}")
-        logging.warning(f"[SWAIG] Invalid time slot: {time_slot}")
+        logging.warning(f"[SWAIG] {e.message}")
         return "Invalid time slot", {}
-    
+
     try:
-        db.execute('''
-            INSERT INTO appointments (patient_id, dentist_id, service_id, type, status, start_time, end_time, notes, sms_reminder)
-            VALUES (?, ?, ?, ?, 'scheduled', ?, ?, '', 1)
-        ''', (patient['id'], dentist_id, service_id, 'checkup', start_time, end_time))
-        db.commit()
+        try:
+            appointment_id, start, _ = book_in_window(db, patient['id'], dentist_id, window_start, window_end,
+                                                      service_id=service_id)
+        except BookingConflict as e:
+            print(f"[SWAIG][CONSOLE] No free time for dentist {dentist_id} on {date} ({time_slot}): {e.message}")
+            logging.info(f"[SWAIG] No free time for dentist {dentist_id} on {date} ({time_slot}): {e.message}")
+            if not e.alternatives:
+                return f"There is no free time on {date} in the {time_slot} and nothing else open in the next two weeks. Please call the office.", {}
+            return (f"That time is not available. The nearest open times are {describe_alternatives(e.alternatives)}. "
+                    "Would you like one of those?",
+                    {'alternatives': alternatives_json(e.alternatives)})
+        start_time = start.strftime('%Y-%m-%d %H:%M:%S')
+        account_contexts.invalidate(challenge_token)
         
         # Send SMS confirmation
         try:
@@ -2861,12 +3058,7 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
             service = db.execute('SELECT name FROM dental_services WHERE id = ?', (service_id,)).fetchone()
             
             if dentist and service and patient.get('phone'):
-                mfa = SignalWireMFA(
-                    SIGNALWIRE_PROJECT_ID,
-                    SIGNALWIRE_TOKEN,
-                    SIGNALWIRE_SPACE,
-                    os.getenv('FROM_NUMBER')
-                )
+                mfa = get_signalwire()
                 
                 # Format the appointment time for SMS
                 appt_date = datetime.fromisoformat(start_time).strftime('%A, %B %d, %Y')
@@ -2875,7 +3067,7 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
                 sms_body = f"Your appointment for {service['name']} with Dr. {dentist['first_name']} {dentist['last_name']} is scheduled for {appt_date} at {appt_time}."
                 
                 mfa.client.messages.create(
-                    from_=os.getenv('FROM_NUMBER'),
+                    from_=settings.from_number,
                     to=patient['phone'],
                     body=sms_body
                 )
@@ -2888,7 +3080,9 @@ def swaig_schedule_appointment(dentist_id=None, service_id=None, date=None, time
         
         print(f"[SWAIG][CONSOLE] Appointment scheduled for patient {patient_id} with dentist {dentist_id} on {date} ({time_slot})")
         logging.info(f"[SWAIG] Appointment scheduled for patient {patient_id} with dentist {dentist_id} on {date} ({time_slot})")
-        return f"Appointment scheduled successfully for {date} in the {time_slot} time slot", {'patient_id': patient_id, 'date': date, 'time_slot': time_slot}
+        return (f"Appointment scheduled successfully for {start.strftime('%A, %B')} {start.day} at {start.strftime('%I:%M %p')}",
+                {'patient_id': patient_id, 'appointment_id': appointment_id, 'date': date, 'time_slot': time_slot,
+                 'start_time': start_time})
     except Exception as e:
         print(f"[SWAIG][CONSOLE] Failed to schedule appointment: {e}")
         logging.error(f"[SWAIG] Failed to schedule appointment: {e}")
@@ -2965,27 +3159,28 @@ def swaig_reschedule_appointment(appointment_id=None, date=None, time_slot=None,
         logging.warning(f"[SWAIG] Cannot reschedule cancelled appointment: {appointment_id}")
         return "Cannot reschedule a cancelled appointment. Please schedule a new appointment instead.", {}
     
-    # Convert time slot to actual times
-    if time_slot == 'morning':
-        start_time = f"{date}T08:00:00"
-        end_time = f"{date}T11:00:00"
-    elif time_slot == 'afternoon':
-        start_time = f"{date}T14:00:00"
-        end_time = f"{date}T16:00:00"
-    elif time_slot == 'evening':
-        start_time = f"{date}T18:00:00"
-        end_time = f"{date}T20:00:00"
-    elif time_slot == 'all_day':
-        start_time = f"{date}T08:00:00"
-        end_time = f"{date}T20:00:00"
-    else:
+    try:
+        window_start, window_end = slot_window(date, time_slot)
+    except BookingError as e:
         print(f"[SWAIG][CONSOLE] Invalid time slot: {time_slot}")
-        logging.warning(f"[SWAIG] Invalid time slot: {time_slot}")
+        logging.warning(f"[SWAIG] {e.message}")
         return "Invalid time slot", {}
-    
+
     try:
-        db.execute('UPDATE appointments SET start_time = ?, end_time = ? WHERE id = ?', (start_time, end_time, appointment_id))
-        db.commit()
+        try:
+            _, start, _ = book_in_window(db, appt['patient_id'], appt['dentist_id'], window_start, window_end,
+                                         duration=window_duration(appt, window_start, window_end),
+                                         notes=None, appointment_id=appt['id'])
+        except BookingConflict as e:
+            print(f"[SWAIG][CONSOLE] No free time to move appointment {appointment_id} to {date} ({time_slot}): {e.message}")
+            logging.info(f"[SWAIG] No free time to move appointment {appointment_id} to {date} ({time_slot}): {e.message}")
+            if not e.alternatives:
+                return f"There is no free time on {date} in the {time_slot} and nothing else open in the next two weeks. Your appointment was not changed.", {}
+            return (f"That time is not available, so your appointment was not changed. The nearest open times are "
+                    f"{describe_alternatives(e.alternatives)}. Would you like one of those?",
+                    {'appointment_id': appointment_id, 'alternatives': alternatives_json(e.alternatives)})
+        start_time = start.strftime('%Y-%m-%d %H:%M:%S')
+        account_contexts.invalidate(challenge_token)
         
         # Send SMS confirmation for rescheduled appointment
         try:
@@ -3000,12 +3195,7 @@ def swaig_reschedule_appointment(appointment_id=None, date=None, time_slot=None,
             ''', (appointment_id,)).fetchone()
             
             if updated_appt and updated_appt['phone']:
-                mfa = SignalWireMFA(
-                    SIGNALWIRE_PROJECT_ID,
-                    SIGNALWIRE_TOKEN,
-                    SIGNALWIRE_SPACE,
-                    os.getenv('FROM_NUMBER')
-                )
+                mfa = get_signalwire()
                 
                 # Format the appointment time for SMS
                 appt_date = datetime.fromisoformat(start_time).strftime('%A, %B %d, %Y')
@@ -3014,7 +3204,7 @@ def swaig_reschedule_appointment(appointment_id=None, date=None, time_slot=None,
                 sms_body = f"Your appointment for {updated_appt['service_name']} with Dr. {updated_appt['first_name']} {updated_appt['last_name']} has been rescheduled to {appt_date} at {appt_time}."
                 
                 mfa.client.messages.create(
-                    from_=os.getenv('FROM_NUMBER'),
+                    from_=settings.from_number,
                     to=updated_appt['phone'],
                     body=sms_body
                 )
@@ -3027,7 +3217,9 @@ def swaig_reschedule_appointment(appointment_id=None, date=None, time_slot=None,
         
         print(f"[SWAIG][CONSOLE] Appointment {appointment_id} rescheduled to {date} ({time_slot}) for patient {patient_id}")
         logging.info(f"[SWAIG] Appointment {appointment_id} rescheduled to {date} ({time_slot}) for patient {patient_id}")
-        return f"Appointment rescheduled successfully to {date} in the {time_slot} time slot", {'patient_id': patient_id, 'appointment_id': appointment_id, 'date': date, 'time_slot': time_slot}
+        return (f"Appointment rescheduled successfully to {start.strftime('%A, %B')} {start.day} at {start.strftime('%I:%M %p')}",
+                {'patient_id': patient_id, 'appointment_id': appointment_id, 'date': date, 'time_slot': time_slot,
+                 'start_time': start_time})
     except Exception as e:
         print(f"[SWAIG][CONSOLE] Failed to reschedule appointment: {e}")
         logging.error(f"[SWAIG] Failed to reschedule appointment: {e}")
@@ -3096,6 +3288,7 @@ def swaig_cancel_appointment(appointment_id=None, challenge_token=None, meta_dat
     try:
         db.execute('UPDATE appointments SET status = ? WHERE id = ?', ('cancelled', appointment_id))
         db.commit()
+        account_contexts.invalidate(challenge_token)
         
         # Send SMS confirmation for cancelled appointment
         try:
@@ -3110,12 +3303,7 @@ def swaig_cancel_appointment(appointment_id=None, challenge_token=None, meta_dat
             ''', (appointment_id,)).fetchone()
             
             if cancelled_appt and cancelled_appt['phone']:
-                mfa = SignalWireMFA(
-                    SIGNALWIRE_PROJECT_ID,
-                    SIGNALWIRE_TOKEN,
-                    SIGNALWIRE_SPACE,
-                    os.getenv('FROM_NUMBER')
-                )
+                mfa = get_signalwire()
                 
                 # Format the appointment time for SMS
                 appt_date = datetime.fromisoformat(cancelled_appt['start_time']).strftime('%A, %B %d, %Y')
@@ -3124,7 +3312,7 @@ def swaig_cancel_appointment(appointment_id=None, challenge_token=None, meta_dat
                 sms_body = f"Your appointment for {cancelled_appt['service_name']} with Dr. {cancelled_appt['first_name']} {cancelled_appt['last_name']} scheduled for {appt_date} at {appt_time} has been cancelled."
                 
                 mfa.client.messages.create(
-                    from_=os.getenv('FROM_NUMBER'),
+                    from_=settings.from_number,
                     to=cancelled_appt['phone'],
                     body=sms_body
                 )
@@ -3144,6 +3332,9 @@ def swaig_cancel_appointment(appointment_id=None, challenge_token=None, meta_dat
         db.rollback()
         return f"Failed to cancel appointment: {str(e)}", {}
 
+# Fuzzy reference matches fetched for a payment; more than one means the caller must confirm
+SWAIG_PAYMENT_CANDIDATES = 5
+
 @swaig.endpoint(
     "Make Payment (Full or Partial)",
     bill_id=SWAIGArgument(
@@ -3165,11 +3356,16 @@ def swaig_cancel_appointment(appointment_id=None, challenge_token=None, meta_dat
         type="string",
         description="Challenge token",
         required=True
+    ),
+    payment_attempt_id=SWAIGArgument(
+        type="string",
+        description="A new ID for each payment the caller asks for (e.g. 1, 2, 3 in this call). Send the same ID again only when retrying a payment that may not have gone through",
+        required=True
     )
 )
-def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challenge_token=None, meta_data_token=None, **kwargs):
-    print(f"[SWAIG][CONSOLE] swaig_make_payment called with bill_id={bill_id}, amount={amount}, payment_method_id={payment_method_id}")
-    logging.info(f"[SWAIG] swaig_make_payment called with bill_id={bill_id}, amount={amount}, payment_method_id={payment_method_id}")
+def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challenge_token=None, payment_attempt_id=None, meta_data_token=None, **kwargs):
+    print(f"[SWAIG][CONSOLE] swaig_make_payment called with bill_id={bill_id}, amount={amount}, payment_method_id={payment_method_id}, payment_attempt_id={payment_attempt_id}")
+    logging.info(f"[SWAIG] swaig_make_payment called with bill_id={bill_id}, amount={amount}, payment_method_id={payment_method_id}, payment_attempt_id={payment_attempt_id}")
     
     # Check if user is authenticated via challenge token
     if not is_challenge_token_valid(challenge_token):
@@ -3177,6 +3373,11 @@ def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challe
         logging.warning("[SWAIG] Invalid or missing challenge token")
         return "Please verify your identity first by providing the 6-digit code sent to your phone.", {}
     
+    if not payment_attempt_id:
+        print("[SWAIG][CONSOLE] Missing payment_attempt_id")
+        logging.warning("[SWAIG] Missing payment_attempt_id")
+        return "No payment was made: a payment_attempt_id is required. Use a new one for each payment the caller asks for.", {}
+    
     # Validate minimum payment amount
     try:
         payment_amount = float(amount)
@@ -3212,13 +3413,13 @@ def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challe
         
         # First try to find bill by ID (numeric)
         if bill_id.isdigit():
-            bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE id = ? AND patient_id = ?', (bill_id, patient['patient_id'])).fetchone()
+            bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE id = ? AND patient_id = ?', (bill_id, patient['id'])).fetchone()
             if bill_lookup:
                 actual_bill_id = bill_id
                 print(f"[SWAIG][CONSOLE] Found bill by ID: {actual_bill_id}")
             else:
                 # Try by bill_number if not found by ID
-                bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE bill_number = ? AND patient_id = ?', (bill_id, patient['patient_id'])).fetchone()
+                bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE bill_number = ? AND patient_id = ?', (bill_id, patient['id'])).fetchone()
                 if bill_lookup:
                     actual_bill_id = str(bill_lookup['id'])
                     print(f"[SWAIG][CONSOLE] Found bill by bill_number: {bill_id} -> Bill ID {actual_bill_id}")
@@ -3228,24 +3429,35 @@ def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challe
         # If not found by ID or not numeric, try as reference number
         if not actual_bill_id:
             # Try exact reference number match first
-            bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE reference_number = ? AND patient_id = ?', (bill_id, patient['patient_id'])).fetchone()
+            bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE reference_number = ? AND patient_id = ?', (bill_id, patient['id'])).fetchone()
             if bill_lookup:
                 actual_bill_id = str(bill_lookup['id'])
                 is_reference_number = True
                 print(f"[SWAIG][CONSOLE] Found bill by exact reference number: {bill_id} -> Bill ID {actual_bill_id}")
             else:
-                # Try flexible reference number matching (case insensitive, partial)
-                ref_search = bill_id.strip().upper()
-                bill_lookup = db.execute('''
-                    SELECT id, patient_portion, status, reference_number 
-                    FROM billing 
-                    WHERE patient_id = ? AND (
-                        UPPER(reference_number) = ? OR 
-                        UPPER(SUBSTR(reference_number, -8)) = ? OR
-                        UPPER(reference_number) LIKE ? OR
-                        UPPER(REPLACE(reference_number, '_', '')) LIKE ?
-                    )
-                ''', (patient['patient_id'], ref_search, ref_search[-8:] if len(ref_search) >= 8 else ref_search, f'%{ref_search}%', f'%{ref_search}%')).fetchone()
+                # Flexible reference matching may only pick the bill to charge when it is unambiguous
+                ref_bill_ids = find_bill_ids(db, bill_id, patient['id'], limit=SWAIG_PAYMENT_CANDIDATES)
+                bill_lookup = None
+                if len(ref_bill_ids) > 1:
+                    print(f"[SWAIG][CONSOLE] Reference {bill_id} matches {len(ref_bill_ids)} bills, asking the caller to confirm")
+                    logging.info(f"[SWAIG] Reference {bill_id} matches {len(ref_bill_ids)} bills for patient {patient_id}; no payment made")
+                    candidates = db.execute(f"""
+                        SELECT b.id, b.bill_number, b.reference_number, b.patient_portion, b.status, b.due_date, s.name as service_name
+                        FROM billing b JOIN dental_services s ON b.service_id = s.id
+                        WHERE b.id IN ({', '.join('?' for _ in ref_bill_ids)})
+                    """, ref_bill_ids).fetchall()
+                    candidates.sort(key=lambda bill: ref_bill_ids.index(bill['id']))
+                    reply = VoiceResponse(SWAIG_RESPONSE_BUDGET, noun='bills')
+                    reply.summary(f"No payment was made: '{bill_id}' could refer to more than one bill. "
+                                  "Please confirm which one with its exact reference number:")
+                    for bill in candidates:
+                        reply.item(f"- Ref: {bill['reference_number']} (Bill #{bill['bill_number'] or bill['id']}) - {bill['service_name']}: "
+                                   f"${float(bill['patient_portion'] or 0):.2f}, {bill['status']}, due {bill['due_date'] or 'N/A'}")
+                    return reply.build(), {'payment_made': False, 'patient_id': patient_id,
+                                           'bills': [compact(bill, ('id', 'bill_number', 'reference_number', 'service_name', 'patient_portion', 'status', 'due_date'))
+                                                     for bill in candidates]}
+                if ref_bill_ids:
+                    bill_lookup = db.execute('SELECT id, patient_portion, status, reference_number FROM billing WHERE id = ?', (ref_bill_ids[0],)).fetchone()
                 
                 if bill_lookup:
                     actual_bill_id = str(bill_lookup['id'])
@@ -3257,99 +3469,41 @@ def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challe
             logging.warning(f"[SWAIG] No bill found for {bill_id} for patient {patient_id}")
             return f"No bill found with {'reference number' if not bill_id.isdigit() else 'ID or reference number'} '{bill_id}' for your account", {}
         
-        # Verify payment method belongs to this patient
-        method = db.execute('SELECT method_type FROM payment_methods WHERE id = ? AND patient_id = ?', (payment_method_id, patient['patient_id'])).fetchone()
-        if not method:
-            print(f"[SWAIG][CONSOLE] Invalid payment method {payment_method_id} for patient {patient_id}")
-            logging.warning(f"[SWAIG] Invalid payment method {payment_method_id} for patient {patient_id}")
-            return "Invalid payment method or payment method does not belong to your account", {}
-        payment_method_type = method['method_type']
-        
-        # Use the found bill data
-        bill = bill_lookup
-        
-        # Validate payment doesn't exceed remaining balance
-        remaining_balance = float(bill['patient_portion'])
-        if payment_amount > remaining_balance:
-            print(f"[SWAIG][CONSOLE] Payment amount ${payment_amount:.2f} exceeds remaining balance ${remaining_balance:.2f}")
-            logging.warning(f"[SWAIG] Payment amount ${payment_amount:.2f} exceeds remaining balance ${remaining_balance:.2f}")
-            return f"Payment amount ${payment_amount:.2f} exceeds the remaining balance of ${remaining_balance:.2f}. The maximum payment for this bill is ${remaining_balance:.2f}.", {}
-        
-        new_portion = bill['patient_portion'] - float(amount)
-        if new_portion > 0:
-            new_status = 'partial'
-        else:
-            new_status = 'paid'
-            new_portion = 0
-        
-        # Process payment
-        payment_reference = f"PAY_{secrets.token_hex(4).upper()}"
-        db.execute('''
-            INSERT INTO payments (billing_id, patient_id, amount, payment_date, payment_method_id, payment_method_type, status, transaction_id, notes)
-            VALUES (?, ?, ?, datetime('now'), ?, ?, 'completed', ?, ?)
-        ''', (actual_bill_id, patient['patient_id'], amount, payment_method_id, payment_method_type, payment_reference, ''))
-        db.commit()
-        
-        # Update billing record
-        db.execute('UPDATE billing SET patient_portion = ?, status = ? WHERE id = ?', (new_portion, new_status, actual_bill_id))
-        db.commit()
-        
-        # Send SMS confirmation for payment
+        # Retries of one payment attempt within a verified session are posted once. The key is
+        # kept with the payment, so it names the session by a hash of its bearer token
+        session_hash = hashlib.sha256(challenge_token.encode()).hexdigest()
+        idempotency_key = f"swaig:{session_hash}:{payment_attempt_id}"
         try:
-            # Get payment and bill details for SMS
-            payment_details = db.execute('''
-                SELECT b.*, s.name as service_name, p.phone, pm.method_type,
-                       CASE 
-                           WHEN pm.method_type = 'credit_card' THEN '**** **** **** ' || substr(pm.card_number, -4)
-                           WHEN pm.method_type = 'banking' THEN pm.bank_name || ' - ****' || substr(pm.account_number, -4)
-                       END as payment_method_details
-                FROM billing b
-                JOIN dental_services s ON b.service_id = s.id
-                JOIN patients p ON b.patient_id = p.id
-                JOIN payment_methods pm ON pm.id = ?
-                WHERE b.id = ?
-            ''', (payment_method_id, actual_bill_id)).fetchone()
-            
-            if payment_details and payment_details['phone']:
-                mfa = SignalWireMFA(
-                    SIGNALWIRE_PROJECT_ID,
-                    SIGNALWIRE_TOKEN,
-                    SIGNALWIRE_SPACE,
-                    os.getenv('FROM_NUMBER')
-                )
-                
-                sms_body = f"Payment confirmation: ${amount:.2f} payment received for {payment_details['service_name']}. "
-                if new_portion > 0:
-                    sms_body += f"Remaining balance: ${new_portion:.2f}."
-                else:
-                    sms_body += "Bill is now fully paid."
-                
-                sms_body += f" Payment Ref: {payment_reference}"
-                if payment_details['reference_number']:
-                    sms_body += f" | Bill Ref: {payment_details['reference_number']}"
-                
-                mfa.client.messages.create(
-                    from_=os.getenv('FROM_NUMBER'),
-                    to=payment_details['phone'],
-                    body=sms_body
-                )
-                print(f"[SWAIG][CONSOLE] SMS payment confirmation sent to {payment_details['phone']}")
-                logging.info(f"[SWAIG] SMS payment confirmation sent to {payment_details['phone']}")
-        except Exception as sms_error:
-            print(f"[SWAIG][CONSOLE] Failed to send SMS payment confirmation: {sms_error}")
-            logging.error(f"[SWAIG] Failed to send SMS payment confirmation: {sms_error}")
-            # Don't fail the payment if SMS fails
-        
+            payment = post_payment(db, patient['id'], actual_bill_id, payment_method_id, payment_amount,
+                                   idempotency_key=idempotency_key, min_amount=5.00, transaction_prefix='PAY_')
+        except PaymentError as e:
+            print(f"[SWAIG][CONSOLE] Payment rejected for bill {actual_bill_id}, patient {patient_id}: {e.message}")
+            logging.warning(f"[SWAIG] Payment rejected for bill {actual_bill_id}, patient {patient_id}: {e.message}")
+            if e.status == 409:
+                return f"Payment attempt ID {payment_attempt_id} was already used for a different payment in this call. Use a new payment_attempt_id.", {}
+            return f"{e.message}.", {}
+
+        account_contexts.invalidate(challenge_token)
+        if not payment['replayed']:
+            send_payment_confirmation_sms(db, payment)
+
+        new_portion = payment['remaining_balance']
+        payment_reference = payment['transaction_id']
         # Create response message
-        response_msg = f"Payment of ${amount:.2f} processed successfully for bill reference {bill['reference_number']}. Remaining balance: ${new_portion:.2f}"
-        
-        print(f"[SWAIG][CONSOLE] Payment successful for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
-        logging.info(f"[SWAIG] Payment successful for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
-        return response_msg, {'patient_id': patient_id, 'amount_paid': amount, 'remaining_balance': new_portion, 'bill_id': actual_bill_id, 'reference_number': bill['reference_number'], 'payment_reference': payment_reference}
+        if payment['replayed']:
+            response_msg = (f"This payment of ${payment['amount']:.2f} for bill reference {payment['reference_number']} was already recorded earlier in this call "
+                            f"(confirmation {payment_reference}); no new payment was made. Remaining balance: ${new_portion:.2f}. "
+                            "To make another payment, use a new payment_attempt_id.")
+            print(f"[SWAIG][CONSOLE] Payment already recorded for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
+            logging.info(f"[SWAIG] Payment already recorded for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
+        else:
+            response_msg = f"Payment of ${payment['amount']:.2f} processed successfully for bill reference {payment['reference_number']}. Remaining balance: ${new_portion:.2f}"
+            print(f"[SWAIG][CONSOLE] Payment successful for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
+            logging.info(f"[SWAIG] Payment successful for bill {actual_bill_id} (input: {bill_id}), patient {patient_id}, amount ${amount}")
+        return response_msg, {'patient_id': patient_id, 'amount_paid': payment['amount'], 'remaining_balance': new_portion, 'bill_id': actual_bill_id, 'reference_number': payment['reference_number'], 'payment_reference': payment_reference, 'already_recorded': payment['replayed']}
     except Exception as e:
         print(f"[SWAIG][CONSOLE] Payment failed: {e}")
         logging.error(f"[SWAIG] Payment failed: {e}")
-        db.rollback()
         return f"Payment failed: {str(e)}", {}
 
 @swaig.endpoint(
@@ -3372,7 +3526,6 @@ def swaig_make_payment(bill_id=None, amount=None, payment_method_id=None, challe
     )
 )
 def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=None, meta_data=None, **kwargs):
-    global LAST_MFA_ID, PENDING_PATIENT_DATA
     print(f"[SWAIG][CONSOLE] send_mfa_code called with to_number={to_number}, patient_id={patient_id}, first_name={first_name}, last_name={last_name}, meta_data={meta_data}")
     logging.info(f"[SWAIG] send_mfa_code called with to_number={to_number}, patient_id={patient_id}, first_name={first_name}, last_name={last_name}, meta_data={meta_data}")
     
@@ -3406,7 +3559,7 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
         
         # Try exact match first
         print(f"[SWAIG][CONSOLE] Attempting exact match: first_name='{first_name.lower().strip()}', last_name='{last_name.lower().strip()}'")
-        matches = db.execute("SELECT * FROM patients WHERE LOWER(TRIM(first_name)) = ? AND LOWER(TRIM(last_name)) = ?", (first_name.lower().strip(), last_name.lower().strip())).fetchall()
+        matches = find_patients_by_name(db, first_name, last_name)
         print(f"[SWAIG][CONSOLE] Found {len(matches)} patient(s) with exact match first_name='{first_name}', last_name='{last_name}'")
         
         if len(matches) == 1:
@@ -3420,7 +3573,7 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
         else:
             # Try reversed name order in case names were switched
             print(f"[SWAIG][CONSOLE] No exact match found. Attempting reversed match: first_name='{last_name.lower().strip()}', last_name='{first_name.lower().strip()}'")
-            matches_reversed = db.execute("SELECT * FROM patients WHERE LOWER(TRIM(first_name)) = ? AND LOWER(TRIM(last_name)) = ?", (last_name.lower().strip(), first_name.lower().strip())).fetchall()
+            matches_reversed = find_patients_by_name(db, last_name, first_name)
             print(f"[SWAIG][CONSOLE] Trying reversed names: first='{last_name}', last='{first_name}' - Found {len(matches_reversed)} match(es)")
             
             if len(matches_reversed) == 1:
@@ -3437,6 +3590,13 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
                 all_patients_for_debug = db.execute("SELECT first_name, last_name, phone FROM patients").fetchall()
                 print(f"[SWAIG][CONSOLE] Available patients for comparison: {[(p['first_name'], p['last_name']) for p in all_patients_for_debug]}")
                 return f"No patient found with name '{first_name} {last_name}'. Please check the spelling or provide patient_id.", {}
+    elif not to_number and meta_data and meta_data.get('caller_id'):
+        # Known caller: identify them from caller ID with a single index probe before asking for names
+        patient = lookup_patient_by_phone(db, meta_data['caller_id'])
+        if patient:
+            found_patient_data = dict(patient)
+            print(f"[SWAIG][CONSOLE] Identified caller by caller ID: {found_patient_data.get('first_name')} {found_patient_data.get('last_name')} (Patient ID: {found_patient_data.get('patient_id')})")
+            logging.info(f"[SWAIG] Identified caller by caller ID: Patient {found_patient_data.get('patient_id')}")
     
     # Determine the phone number to use
     phone_to_use = None
@@ -3456,14 +3616,6 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
             phone_to_use = caller_id
             print(f"[SWAIG][CONSOLE] Fallback to caller ID from meta_data: {phone_to_use}")
             logging.info(f"[SWAIG] Fallback to caller ID from meta_data: {phone_to_use}")
-            # Try to find patient by caller ID if we don't have patient data yet
-            if not found_patient_data:
-                caller_phone = format_to_e164(caller_id)
-                if caller_phone:
-                    caller_patient = db.execute('SELECT * FROM patients WHERE phone = ?', (caller_phone,)).fetchone()
-                    if caller_patient:
-                        found_patient_data = dict(caller_patient)
-                        print(f"[SWAIG][CONSOLE] Found patient by caller ID: {found_patient_data.get('first_name')} {found_patient_data.get('last_name')}")
         else:
             print("[SWAIG][CONSOLE] No phone number provided or found")
             logging.warning("[SWAIG] No phone number provided or found")
@@ -3480,29 +3632,21 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
     logging.info(f"[SWAIG] Formatted phone number to E.164: {e164_phone}")
     
     try:
-        mfa = SignalWireMFA(
-            SIGNALWIRE_PROJECT_ID,
-            SIGNALWIRE_TOKEN,
-            SIGNALWIRE_SPACE,
-            os.getenv('FROM_NUMBER')
-        )
+        mfa = get_signalwire()
         response = mfa.send_mfa(e164_phone)
         mfa_id = response.get("id")
         if not mfa_id:
             print("[SWAIG][CONSOLE] MFA ID not found in response")
             logging.error("[SWAIG] MFA ID not found in response")
             return "MFA ID not found in response", {}
-        LAST_MFA_ID = mfa_id
+        MFA_STATE.set('last_mfa_id', mfa_id)
         
         # Store patient data temporarily for verification step
         if found_patient_data:
             print(f"[SWAIG][CONSOLE] Storing patient data for MFA session {mfa_id}: Patient {found_patient_data.get('patient_id', 'Unknown')}")
             # Store in a temporary location that verify_mfa_code can access
             # This simulates what would normally come through meta_data
-            global PENDING_PATIENT_DATA
-            if 'PENDING_PATIENT_DATA' not in globals():
-                PENDING_PATIENT_DATA = {}
-            PENDING_PATIENT_DATA[mfa_id] = found_patient_data
+            PENDING_PATIENT_DATA.set(mfa_id, swaig_session_record(found_patient_data))
         
         print(f"[SWAIG][CONSOLE] MFA code sent successfully to {e164_phone}, mfa_id={mfa_id}")
         logging.info(f"[SWAIG] MFA code sent successfully to {e164_phone}, mfa_id={mfa_id}")
@@ -3512,6 +3656,10 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
             patient_info = f" for {found_patient_data.get('first_name', '')} {found_patient_data.get('last_name', '')}"
         
         return f"6-digit verification code sent successfully to {e164_phone}{patient_info}", {"mfa_id": mfa_id, "phone_number": e164_phone, "patient_found": bool(found_patient_data)}
+    except OutboundUnavailable as e:
+        print(f"[SWAIG][CONSOLE] MFA code not sent, service unavailable: {e}")
+        logging.warning(f"[SWAIG] MFA code not sent to {e164_phone}: {e}")
+        return "Our verification text service is temporarily unavailable. Please try again in a few minutes, or we can help you with general questions in the meantime.", {}
     except Exception as e:
         print(f"[SWAIG][CONSOLE] Failed to send MFA code to {e164_phone}: {e}")
         logging.error(f"[SWAIG] Failed to send MFA code to {e164_phone}: {e}")
@@ -3527,39 +3675,31 @@ def send_mfa_code(to_number=None, patient_id=None, first_name=None, last_name=No
 )
 def verify_mfa_code(token=None, meta_data=None, **kwargs):
     import uuid
-    global LAST_MFA_ID, PENDING_PATIENT_DATA
+    last_mfa_id = get_last_mfa_id()
     print(f"[SWAIG][CONSOLE] verify_mfa_code called with token={token}, meta_data={meta_data}")
     logging.info(f"[SWAIG] verify_mfa_code called with token={token}, meta_data={meta_data}")
     
-    if not LAST_MFA_ID or not is_valid_uuid(LAST_MFA_ID):
+    if not last_mfa_id or not is_valid_uuid(last_mfa_id):
         print("[SWAIG][CONSOLE] No valid MFA session")
         logging.warning("[SWAIG] No valid MFA session")
         return "No valid MFA session", {}
     
     try:
-        mfa = SignalWireMFA(
-            SIGNALWIRE_PROJECT_ID,
-            SIGNALWIRE_TOKEN,
-            SIGNALWIRE_SPACE,
-            os.getenv('FROM_NUMBER')
-        )
-        verification_response = mfa.verify_mfa(LAST_MFA_ID, token)
+        mfa = get_signalwire()
+        verification_response = mfa.verify_mfa(last_mfa_id, token)
         print(f"[SWAIG][CONSOLE] Verification response: {verification_response}")
         logging.info(f"[SWAIG] Verification response: {verification_response}")
         
         if "mfa_id" not in verification_response:
-            verification_response["mfa_id"] = LAST_MFA_ID
+            verification_response["mfa_id"] = last_mfa_id
         
         if verification_response.get("success"):
             # Extract patient data from multiple sources
-            patient_data = None
             
-            # First, try to get from pending patient data (stored during send_mfa_code)
-            if 'PENDING_PATIENT_DATA' in globals() and LAST_MFA_ID in PENDING_PATIENT_DATA:
-                patient_data = PENDING_PATIENT_DATA[LAST_MFA_ID]
+            # First, try to get from pending patient data (stored during send_mfa_code; used once)
+            patient_data = PENDING_PATIENT_DATA.pop(last_mfa_id)
+            if patient_data:
                 print(f"[SWAIG][CONSOLE] Using patient data from send_mfa_code: {patient_data.get('patient_id', 'Unknown')}")
-                # Clean up pending data
-                del PENDING_PATIENT_DATA[LAST_MFA_ID]
             
             # Then try meta_data if we don't have patient data yet
             if not patient_data and meta_data:
@@ -3582,13 +3722,11 @@ def verify_mfa_code(token=None, meta_data=None, **kwargs):
                             print(f"[SWAIG][CONSOLE] Found patient by patient_id from meta_data: {patient_data.get('patient_id')}")
                     elif 'caller_id' in meta_data:
                         # Try to find patient by phone number
-                        caller_phone = format_to_e164(meta_data['caller_id'])
-                        if caller_phone:
-                            db = get_db()
-                            patient_record = db.execute('SELECT * FROM patients WHERE phone = ?', (caller_phone,)).fetchone()
-                            if patient_record:
-                                patient_data = dict(patient_record)
-                                print(f"[SWAIG][CONSOLE] Found patient by caller_id from meta_data: {patient_data.get('patient_id')}")
+                        db = get_db()
+                        patient_record = lookup_patient_by_phone(db, meta_data['caller_id'])
+                        if patient_record:
+                            patient_data = dict(patient_record)
+                            print(f"[SWAIG][CONSOLE] Found patient by caller_id from meta_data: {patient_data.get('patient_id')}")
                     
                     # Try direct fields in meta_data
                     if not patient_data and ('first_name' in meta_data or 'last_name' in meta_data):
@@ -3597,14 +3735,15 @@ def verify_mfa_code(token=None, meta_data=None, **kwargs):
                         if first_name and last_name:
                             db = get_db()
                             # Try exact match
-                            patient_record = db.execute('SELECT * FROM patients WHERE LOWER(TRIM(first_name)) = ? AND LOWER(TRIM(last_name)) = ?', (first_name.lower().strip(), last_name.lower().strip())).fetchone()
+                            name_matches = find_patients_by_name(db, first_name, last_name)
+                            patient_record = name_matches[0] if name_matches else None
                             if patient_record:
                                 patient_data = dict(patient_record)
                                 print(f"[SWAIG][CONSOLE] Found patient by name from meta_data: {patient_data.get('patient_id')}")
             
             # Store the verified patient data using new session management
             if patient_data:
-                store_verified_patient(LAST_MFA_ID, patient_data)
+                store_verified_patient(last_mfa_id, patient_data)
                 
                 # Generate a challenge token for subsequent API calls
                 challenge_token = str(uuid.uuid4())
@@ -3612,13 +3751,19 @@ def verify_mfa_code(token=None, meta_data=None, **kwargs):
                 # Store the challenge token with patient data for protected functions
                 store_challenge_token(challenge_token, patient_data)
                 
+                # Load what the follow-up questions will need while the agent reads out the confirmation
+                try:
+                    account_contexts.prefetch(get_db(), challenge_token, patient_data.get('patient_id'))
+                except Exception as e:
+                    logging.warning(f"[SWAIG] Account context prefetch failed for patient {patient_data.get('patient_id')}: {e}")
+                
                 print(f"[SWAIG][CONSOLE] Generated challenge token: {challenge_token}")
                 print(f"[SWAIG][CONSOLE] AI should use this challenge token for subsequent calls: {challenge_token}")
                 logging.info(f"[SWAIG] Generated challenge token for patient {patient_data.get('patient_id')}")
                 logging.info(f"[SWAIG] AI should use challenge token {challenge_token} for subsequent calls")
                 
                 return f"MFA verified successfully for patient {patient_data.get('patient_id', 'Unknown')} ({patient_data.get('first_name', '')} {patient_data.get('last_name', '')}). You can now access your account. Use challenge token {challenge_token} for subsequent requests.", {
-                    "mfa_id": LAST_MFA_ID, 
+                    "mfa_id": last_mfa_id, 
                     "patient_verified": True, 
                     "patient_id": patient_data.get('patient_id'),
                     "challenge_token": challenge_token
@@ -3626,16 +3771,16 @@ def verify_mfa_code(token=None, meta_data=None, **kwargs):
             else:
                 print("[SWAIG][CONSOLE] MFA verified but no patient data found in meta_data or pending data")
                 logging.warning("[SWAIG] MFA verified but no patient data found in meta_data or pending data")
-                return "MFA verified successfully, but patient data not found. Please provide patient information or try sending the MFA code again with your name or patient ID.", {"mfa_id": LAST_MFA_ID, "patient_verified": False}
+                return "MFA verified successfully, but patient data not found. Please provide patient information or try sending the MFA code again with your name or patient ID.", {"mfa_id": last_mfa_id, "patient_verified": False}
         else:
             error_message = verification_response.get("message", "Invalid MFA code. Please try again.")
             print(f"[SWAIG][CONSOLE] MFA verification failed: {error_message}")
             logging.warning(f"[SWAIG] MFA verification failed: {error_message}")
-            return error_message, {"mfa_id": LAST_MFA_ID}
+            return error_message, {"mfa_id": last_mfa_id}
     except Exception as e:
         print(f"[SWAIG][CONSOLE] Verification failed: {e}")
         logging.error(f"[SWAIG] Verification failed: {e}")
-        return f"Verification failed: {str(e)}", {"mfa_id": LAST_MFA_ID if LAST_MFA_ID else None}
+        return f"Verification failed: {str(e)}", {"mfa_id": last_mfa_id if last_mfa_id else None}
 
 @app.route('/api/test-sms', methods=['POST'])
 @login_required
@@ -3645,14 +3790,9 @@ def api_test_sms():
     if not user or 'phone' not in user.keys() or not user['phone']:
         return jsonify({'success': False, 'error': 'No phone number found for user'}), 400
     try:
-        mfa = SignalWireMFA(
-            SIGNALWIRE_PROJECT_ID,
-            SIGNALWIRE_TOKEN,
-            SIGNALWIRE_SPACE,
-            os.getenv('FROM_NUMBER')
-        )
+        mfa = get_signalwire()
         mfa.client.messages.create(
-            from_=os.getenv('FROM_NUMBER'),
+            from_=settings.from_number,
             to=user['phone'],
             body='This is a test SMS from your SignalWire Dental Office System.'
         )
@@ -3669,12 +3809,7 @@ def api_test_mfa():
     if not user or 'phone' not in user.keys() or not user['phone']:
         return jsonify({'success': False, 'error': 'No phone number found for user'}), 400
     try:
-        mfa = SignalWireMFA(
-            SIGNALWIRE_PROJECT_ID,
-            SIGNALWIRE_TOKEN,
-            SIGNALWIRE_SPACE,
-            os.getenv('FROM_NUMBER')
-        )
+        mfa = get_signalwire()
         response = mfa.send_mfa(user['phone'])
         mfa_id = response.get('id')
         if not mfa_id:
@@ -3693,12 +3828,7 @@ def api_verify_mfa():
     if not mfa_id or not code:
         return jsonify({'success': False, 'error': 'Missing MFA ID or code'}), 400
     try:
-        mfa = SignalWireMFA(
-            SIGNALWIRE_PROJECT_ID,
-            SIGNALWIRE_TOKEN,
-            SIGNALWIRE_SPACE,
-            os.getenv('FROM_NUMBER')
-        )
+        mfa = get_signalwire()
         result = mfa.verify_mfa(mfa_id, code)
         if result.get('success'):
             return jsonify({'success': True}), 200
@@ -3767,6 +3897,8 @@ def api_get_patient(patient_id):
             query = f"UPDATE patients SET {', '.join(update_fields)} WHERE patient_id = ?"
             
             db.execute(query, params)
+            if 'phone' in data:
+                sync_patient_phone_e164(db, patient['id'])
             db.commit()
             
             # Return updated patient data
@@ -3778,15 +3910,9 @@ def api_get_patient(patient_id):
             db.rollback()
             return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/patient/<int:patient_id>/history')
-@login_required
-def patient_history_for_dentist(patient_id):
-    if session['user_type'] != 'dentist':
-        return redirect(url_for('patient_dashboard'))
-    db = get_db()
-    patient = db.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
-    if not patient:
-        return render_template('404.html'), 404
+@query_cache.cached('patient_history', tables=('appointments', 'dentists', 'dental_services', 'treatment_history', 'billing'))
+def patient_history_data(db, patient_id):
+    """A patient's appointments, treatments and bills for the dentist's history page"""
     appointments = db.execute('''
         SELECT a.*, d.first_name as dentist_first_name, d.last_name as dentist_last_name,
                s.name as service_name
@@ -3812,6 +3938,18 @@ def patient_history_for_dentist(patient_id):
         WHERE b.patient_id = ?
         ORDER BY b.due_date DESC
     ''', (patient_id,)).fetchall()
+    return appointments, treatments, bills
+
+@app.route('/patient/<int:patient_id>/history')
+@login_required
+def patient_history_for_dentist(patient_id):
+    if session['user_type'] != 'dentist':
+        return redirect(url_for('patient_dashboard'))
+    db = get_db()
+    patient = db.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
+    if not patient:
+        return render_template('404.html'), 404
+    appointments, treatments, bills = patient_history_data(db, patient_id)
     return render_template('patient_history.html',
                          patient=patient,
                          appointments=appointments,
@@ -3822,8 +3960,29 @@ def patient_history_for_dentist(patient_id):
 @login_required
 def api_get_patients():
     db = get_db()
-    patients = db.execute('SELECT id, first_name, last_name, patient_id FROM patients ORDER BY last_name, first_name').fetchall()
-    return jsonify([dict(p) for p in patients])
+    patients = db.execute('SELECT id, first_name, last_name, patient_id FROM patients ORDER BY last_name, first_name')
+    return stream_json(patients)
+
+@app.route('/api/patients/search', methods=['GET'])
+@login_required
+def api_search_patients():
+    if session['user_type'] != 'dentist':
+        return jsonify({'error': 'Unauthorized - Dentist access required'}), 403
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify([])
+    limit = min(request.args.get('limit', 20, type=int), 100)
+
+    db = get_db()
+    matches = search(db, query, entities=('patient',), limit=limit)
+    if not matches:
+        return jsonify([])
+    ids = [m['id'] for m in matches]
+    rows = db.execute(f"SELECT id, first_name, last_name, patient_id, phone, email FROM patients WHERE id IN ({', '.join('?' for _ in ids)})", ids).fetchall()
+    by_id = {row['id']: dict(row) for row in rows}
+    # Keep the search ranking and say how each patient matched
+    return jsonify([dict(by_id[m['id']], match=m['match']) for m in matches if m['id'] in by_id])
 
 @app.route('/api/treatments', methods=['POST'])
 @login_required
@@ -3843,6 +4002,9 @@ def api_create_treatment():
 
     db = get_db()
     try:
+        # Allocate the bill number before the inserts take the write lock
+        bill_number = generate_unique_bill_number()
+
         # Insert treatment
         db.execute('''
             INSERT INTO treatment_history (patient_id, dentist_id, service_id, treatment_date, diagnosis, treatment_notes, follow_up_date, reference_number, bill_amount)
@@ -3859,9 +4021,6 @@ def api_create_treatment():
             data.get('bill_amount', 0.0)
         ))
 
-        # Generate unique bill number
-        bill_number = generate_unique_bill_number()
-
         # Insert corresponding bill
         db.execute('''
             INSERT INTO billing (
@@ -3888,6 +4047,31 @@ def api_create_treatment():
         db.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+SWAIG_APPOINTMENTS_QUERY = '''
+    SELECT a.*, s.name as service_name, s.type as service_type,
+           CASE 
+               WHEN d.first_name LIKE 'Dr.%' THEN d.first_name || ' ' || d.last_name
+               ELSE 'Dr. ' || d.first_name || ' ' || d.last_name
+           END as dentist_name
+    FROM appointments a
+    JOIN dental_services s ON a.service_id = s.id
+    JOIN dentists d ON a.dentist_id = d.id
+    WHERE a.patient_id = ? AND a.status != 'cancelled'
+'''
+
+@query_cache.cached('swaig_appointments', tables=('appointments', 'dental_services', 'dentists'))
+def swaig_appointment_rows(db, query, params):
+    """A caller's appointments for the query swaig_get_appointments built, and their cancelled count"""
+    appointments = db.execute(query, params).fetchall()
+    
+    # Also get count of cancelled appointments for informational purposes
+    cancelled_count = db.execute('''
+        SELECT COUNT(*) as count
+        FROM appointments
+        WHERE patient_id = ? AND status = 'cancelled'
+    ''', (params[0],)).fetchone()['count']
+    return appointments, cancelled_count
+
 @swaig.endpoint(
     "Get Appointments",
     challenge_token=SWAIGArgument(
@@ -3921,26 +4105,15 @@ def swaig_get_appointments(challenge_token=None, service_type=None, meta_data_to
         return "Patient information not found. Please verify your identity again.", {}
     
     db = get_db()
-    patient = db.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,)).fetchone()
-    if not patient:
+    context = account_contexts.get(db, challenge_token, patient_id)
+    if not context:
         print(f"[SWAIG][CONSOLE] Patient not found: {patient_id}")
         logging.warning(f"[SWAIG] Patient not found: {patient_id}")
         return "Patient account not found", {}
     
     # Build query with optional service filtering
-    query = '''
-        SELECT a.*, s.name as service_name, s.type as service_type,
-               CASE 
-                   WHEN d.first_name LIKE 'Dr.%' THEN d.first_name || ' ' || d.last_name
-                   ELSE 'Dr. ' || d.first_name || ' ' || d.last_name
-               END as dentist_name
-        FROM appointments a
-        JOIN dental_services s ON a.service_id = s.id
-        JOIN dentists d ON a.dentist_id = d.id
-        WHERE a.patient_id = ? AND a.status != 'cancelled'
-    '''
-    
-    params = [patient['id']]
+    query = SWAIG_APPOINTMENTS_QUERY
+    params = [context['patient']['id']]
     
     # Add service type filtering if provided
     if service_type:
@@ -3968,14 +4141,10 @@ def swaig_get_appointments(challenge_token=None, service_type=None, meta_data_to
     
     query += ' ORDER BY a.start_time ASC'
     
-    appointments = db.execute(query, params).fetchall()
-    
-    # Also get count of cancelled appointments for informational purposes
-    cancelled_count = db.execute('''
-        SELECT COUNT(*) as count
-        FROM appointments
-        WHERE patient_id = ? AND status = 'cancelled'
-    ''', (patient['id'],)).fetchone()['count']
+    if service_type:
+        appointments, cancelled_count = swaig_appointment_rows(db, query, tuple(params))
+    else:
+        appointments, cancelled_count = context['appointments'], context['cancelled_appointments']
     
     print(f"[SWAIG][CONSOLE] Returning {len(appointments)} appointments for patient {patient_id}" + 
           (f" (filtered by service_type: {service_type})" if service_type else ""))
@@ -4121,6 +4290,18 @@ def swaig_get_appointments(challenge_token=None, service_type=None, meta_data_to
                 'cancelled_count': cancelled_count
             }
 
+SWAIG_PAYMENT_METHODS_QUERY = '''
+    SELECT id, method_type,
+           CASE 
+               WHEN method_type = 'credit_card' THEN '**** **** **** ' || substr(card_number, -4)
+               WHEN method_type = 'banking' THEN bank_name || ' - ****' || substr(account_number, -4)
+           END as details,
+           is_default
+    FROM payment_methods
+    WHERE patient_id = ?
+    ORDER BY is_default DESC, created_at DESC
+'''
+
 @swaig.endpoint(
     "Get Payment Methods",
     challenge_token=SWAIGArgument(
@@ -4149,24 +4330,13 @@ def swaig_get_payment_methods(challenge_token=None, meta_data_token=None, **kwar
         return "Patient information not found. Please verify your identity again.", {}
     
     db = get_db()
-    patient = db.execute('SELECT * FROM patients WHERE patient_id = ?', (patient_id,)).fetchone()
-    if not patient:
+    context = account_contexts.get(db, challenge_token, patient_id)
+    if not context:
         print(f"[SWAIG][CONSOLE] Patient not found: {patient_id}")
         logging.warning(f"[SWAIG] Patient not found: {patient_id}")
         return "Patient account not found", {}
     
-    # Fetch payment methods
-    payment_methods = db.execute('''
-        SELECT id, method_type,
-               CASE 
-                   WHEN method_type = 'credit_card' THEN '**** **** **** ' || substr(card_number, -4)
-                   WHEN method_type = 'banking' THEN bank_name || ' - ****' || substr(account_number, -4)
-               END as details,
-               is_default
-        FROM payment_methods
-        WHERE patient_id = ?
-        ORDER BY is_default DESC, created_at DESC
-    ''', (patient['id'],)).fetchall()
+    payment_methods = context['payment_methods']
     
     print(f"[SWAIG][CONSOLE] Returning {len(payment_methods)} payment methods for patient {patient_id}")
     logging.info(f"[SWAIG] Returning {len(payment_methods)} payment methods for patient {patient_id}")
@@ -4188,6 +4358,106 @@ def swaig_get_payment_methods(challenge_token=None, meta_data_token=None, **kwar
     else:
         return "You have no payment methods on file. Please add a payment method to make payments.", {'payment_methods': [], 'patient_id': patient_id}
 
+ACCOUNT_SUMMARY_SECTIONS = ('balance', 'bills', 'appointments', 'payment_methods')
+
+@swaig.endpoint(
+    "Get Account Summary - balance, unpaid bills, upcoming appointments and payment methods in one call. Prefer this over calling the separate functions one after another",
+    challenge_token=SWAIGArgument(
+        type="string",
+        description="Challenge token",
+        required=True
+    ),
+    sections=SWAIGArgument(
+        type="string",
+        description="Comma-separated parts to include: balance, bills, appointments, payment_methods (default: all)",
+        required=False
+    )
+)
+def swaig_get_account_summary(challenge_token=None, sections=None, meta_data_token=None, **kwargs):
+    print(f"[SWAIG][CONSOLE] swaig_get_account_summary called with sections={sections}")
+    logging.info(f"[SWAIG] swaig_get_account_summary called with sections={sections}")
+    
+    if not is_challenge_token_valid(challenge_token):
+        print("[SWAIG][CONSOLE] Invalid or missing challenge token")
+        logging.warning("[SWAIG] Invalid or missing challenge token")
+        return "Please verify your identity first by providing the 6-digit code sent to your phone.", {}
+    
+    patient_data = get_patient_by_challenge_token(challenge_token)
+    patient_id = patient_data.get('patient_id')
+    if not patient_id:
+        print("[SWAIG][CONSOLE] No patient ID in challenge token data")
+        logging.warning("[SWAIG] No patient ID in challenge token data")
+        return "Patient information not found. Please verify your identity again.", {}
+    
+    requested = [part.strip().lower().replace(' ', '_') for part in (sections or '').split(',') if part.strip()]
+    chosen = [section for section in ACCOUNT_SUMMARY_SECTIONS if not requested or section in requested]
+    if not chosen:
+        return f"Please choose sections from: {', '.join(ACCOUNT_SUMMARY_SECTIONS)}.", {}
+    
+    # One batched load (or none, when it was prefetched at verification) for every section
+    context = account_contexts.get(get_db(), challenge_token, patient_id)
+    if not context:
+        print(f"[SWAIG][CONSOLE] Patient not found: {patient_id}")
+        logging.warning(f"[SWAIG] Patient not found: {patient_id}")
+        return "Patient account not found", {}
+    
+    text = {}
+    lists = {}  # section: (noun, summary line, item lines)
+    payload = {'patient_id': patient_id, 'sections': chosen}
+    if 'balance' in chosen:
+        text['balance'] = f"Outstanding balance: ${context['balance']:.2f}."
+        payload['balance'] = round(context['balance'], 2)
+    if 'bills' in chosen:
+        unpaid = [bill for bill in (swaig_bill_with_payments(bill, payments) for bill, payments in context['bills'])
+                  if bill['status'] != 'paid']
+        lists['bills'] = ('bills', f"Unpaid bills: {len(unpaid)}, ${sum(bill['remaining_balance'] for bill in unpaid):.2f} due in total."
+                          if unpaid else "No unpaid bills.",
+                          [swaig_bill_lines(i, bill)[0] for i, bill in enumerate(unpaid, 1)])
+        payload['bills'] = [compact(dict(bill, patient_portion=bill['patient_portion_calculated']), SWAIG_BILL_FIELDS)
+                            for bill in unpaid]
+    if 'appointments' in chosen:
+        now = datetime.now()
+        upcoming = []
+        for appointment in context['appointments']:
+            try:
+                start = datetime.fromisoformat(appointment['start_time'].replace('T', ' '))
+            except (AttributeError, ValueError):
+                start = None  # unparseable times count as upcoming, as in swaig_get_appointments
+            if start is None or start >= now:
+                upcoming.append((start, appointment))
+        lines = []
+        for i, (start, appointment) in enumerate(upcoming, 1):
+            when = f"{start.strftime('%A, %B %d, %Y')} at {start.strftime('%I:%M %p')}" if start else appointment['start_time']
+            lines.append(f"{i}. {when} - {appointment['service_name']} with {appointment['dentist_name']} (ID: {appointment['id']})")
+        lists['appointments'] = ('appointments', f"Upcoming appointments: {len(upcoming)}." if upcoming else "No upcoming appointments.", lines)
+        payload['appointments'] = [compact(appointment, ('id', 'start_time', 'end_time', 'status', 'service_name', 'dentist_name'))
+                                   for _, appointment in upcoming]
+    if 'payment_methods' in chosen:
+        methods = context['payment_methods']
+        lists['payment_methods'] = ('payment methods', f"Payment methods on file: {len(methods)}." if methods else "No payment methods on file.",
+                                    [f"- ID {method['id']}: {method['details']}" + (" (Default)" if method['is_default'] else "")
+                                     for method in methods])
+        payload['payment_methods'] = methods
+    
+    # Summary lines are always kept; the list items share the rest of the budget, smallest
+    # list first, so what one list doesn't need goes to the next
+    left = SWAIG_RESPONSE_BUDGET - sum(len(line) + 1 for line in text.values()) - sum(len(summary) + 1 for _, summary, _ in lists.values())
+    by_size = sorted(lists, key=lambda section: sum(len(line) + 1 for line in lists[section][2]))
+    for n, section in enumerate(by_size):
+        noun, summary_line, lines = lists[section]
+        share = max(left, 0) // (len(by_size) - n)
+        reply = VoiceResponse(len(summary_line) + 1 + share if SWAIG_RESPONSE_BUDGET else 0, noun=noun)
+        reply.summary(summary_line)
+        for line in lines:
+            reply.item(line)
+        text[section] = reply.build()
+        left -= len(text[section]) - len(summary_line)
+    
+    summary = "\n".join(text[section] for section in chosen)
+    print(f"[SWAIG][CONSOLE] Returning account summary ({', '.join(chosen)}) for patient {patient_id}")
+    logging.info(f"[SWAIG] Returning account summary ({', '.join(chosen)}) for patient {patient_id}: {len(summary)} chars")
+    return summary, payload
+
 @swaig.endpoint(
     "Get Appointment Details",
     appointment_id=SWAIGArgument(
@@ -4605,16 +4875,11 @@ def swaig_verify_bill_reference(reference_number=None, service_name=None, status
     conditions = []
     params = [patient_internal_id]
     
-    # Reference number search (flexible matching)
+    # Reference number search (flexible matching through the search index)
     if reference_number:
-        ref_search = reference_number.strip().upper()
-        conditions.append("""(
-            UPPER(b.reference_number) = ? OR 
-            UPPER(SUBSTR(b.reference_number, -8)) = ? OR
-            UPPER(b.reference_number) LIKE ? OR
-            UPPER(REPLACE(b.reference_number, '_', '')) LIKE ?
-        )""")
-        params.extend([ref_search, ref_search[-8:] if len(ref_search) >= 8 else ref_search, f'%{ref_search}%', f'%{ref_search}%'])
+        ref_bill_ids = find_bill_ids(db, reference_number, patient_internal_id)
+        conditions.append(f"b.id IN ({', '.join('?' for _ in ref_bill_ids) or 'NULL'})")
+        params.extend(ref_bill_ids)
     
     # Service name search (case insensitive, partial match)
     if service_name:
@@ -4667,6 +4932,10 @@ def swaig_verify_bill_reference(reference_number=None, service_name=None, status
     base_query += " ORDER BY b.created_at DESC"
     
     bills = db.execute(base_query, params).fetchall()
+    search_criteria = {name: value for name, value in (
+        ('reference_number', reference_number), ('service_name', service_name), ('status', status), ('date', date),
+        ('due_date', due_date), ('amount', amount), ('amount_min', amount_min), ('amount_max', amount_max),
+    ) if value is not None}
     
     print(f"[SWAIG][CONSOLE] Found {len(bills)} bills matching search criteria for patient {patient_id}")
     logging.info(f"[SWAIG] Found {len(bills)} bills matching search criteria for patient {patient_id}")
@@ -4697,36 +4966,26 @@ def swaig_verify_bill_reference(reference_number=None, service_name=None, status
             ORDER BY b.created_at DESC
         ''', (patient_internal_id,)).fetchall()
         
-        suggestion_text = f"No bills found matching {criteria_text}. "
+        reply = VoiceResponse(SWAIG_RESPONSE_BUDGET, noun='bills', max_items=5)
         if all_bills:
-            suggestion_text += f"Your available bills are:\n"
-            for bill in all_bills[:5]:  # Show up to 5 bills
-                due_date_display = bill['due_date'] or "N/A"
-                patient_portion = float(bill['patient_portion'])
-                suggestion_text += f"- {bill['service_name']}: ${patient_portion:.2f} ({bill['status']}, due {due_date_display}) - Ref: {bill['reference_number']}\n"
-            if len(all_bills) > 5:
-                suggestion_text += f"... and {len(all_bills) - 5} more bills\n"
+            reply.summary(f"No bills found matching {criteria_text}. Your available bills are:")
+            for bill in all_bills:
+                reply.item(f"- {bill['service_name']}: ${float(bill['patient_portion']):.2f} "
+                           f"({bill['status']}, due {bill['due_date'] or 'N/A'}) - Ref: {bill['reference_number']}")
         else:
-            suggestion_text += "You have no bills on your account."
+            reply.summary(f"No bills found matching {criteria_text}. You have no bills on your account.")
         
-        return suggestion_text, {'bills': [], 'patient_id': patient_id, 'search_criteria': {
-            'reference_number': reference_number,
-            'service_name': service_name,
-            'status': status,
-            'date': date,
-            'due_date': due_date,
-            'amount': amount,
-            'amount_min': amount_min,
-            'amount_max': amount_max
-        }}
+        return reply.build(), {'bills': [], 'patient_id': patient_id, 'search_criteria': search_criteria}
     
     # If multiple bills found, show summary
     if len(bills) > 1:
-        bills_summary = f"Found {len(bills)} bills matching your search criteria:\n"
-        total_amount = 0
-        pending_amount = 0
+        total_amount = sum(float(bill['patient_portion']) for bill in bills)
+        pending_amount = sum(float(bill['patient_portion']) for bill in bills if bill['display_status'] != 'Paid')
         
-        for i, bill in enumerate(bills[:10], 1):  # Show first 10 matches
+        reply = VoiceResponse(SWAIG_RESPONSE_BUDGET, noun='bills', max_items=10)
+        reply.summary(f"Found {len(bills)} bills matching your search criteria. Total Amount: ${total_amount:.2f}"
+                      + (f" | Pending: ${pending_amount:.2f}" if pending_amount > 0 else ""))
+        for i, bill in enumerate(bills, 1):
             # Format dates
             created_date = "N/A"
             due_date_display = "N/A"
@@ -4743,52 +5002,28 @@ def swaig_verify_bill_reference(reference_number=None, service_name=None, status
                 except:
                     due_date_display = bill['due_date']
             
-            amount = float(bill['patient_portion'])
-            total_amount += amount
-            if bill['display_status'] != 'Paid':
-                pending_amount += amount
-            
-            bills_summary += f"\n{i}. Bill #{bill['id']} - {bill['service_name']}\n"
-            bills_summary += f"   Date: {created_date} | Due: {due_date_display}"
-            bills_summary += f"\n   Amount: ${amount:.2f} | Status: {bill['display_status']}"
-            bills_summary += f"\n   Reference: {bill['reference_number']}"
-            if bill['dentist_name']:
-                bills_summary += f"\n   Provider: {bill['dentist_name']}"
-            
-            if i < len(bills) and i < 10:
-                bills_summary += "\n"
-        
-        if len(bills) > 10:
-            bills_summary += f"\n\n... and {len(bills) - 10} more bills"
-        
-        bills_summary += f"\n\nSummary: Total Amount: ${total_amount:.2f}"
-        if pending_amount > 0:
-            bills_summary += f" | Pending: ${pending_amount:.2f}"
+            reply.item(f"{i}. Bill #{bill['id']} - {bill['service_name']}: ${float(bill['patient_portion']):.2f}, {bill['display_status']}", [
+                f"Reference: {bill['reference_number']}",
+                f"Date: {created_date} | Due: {due_date_display}",
+                f"Provider: {bill['dentist_name']}" if bill['dentist_name'] else None,
+            ])
+        bills_summary = reply.build()
         
         print(f"[SWAIG][CONSOLE] Multiple bills found matching criteria, patient {patient_id}")
-        logging.info(f"[SWAIG] Multiple bills found matching criteria, patient {patient_id}")
+        logging.info(f"[SWAIG] Multiple bills found matching criteria, patient {patient_id}: reply {len(bills_summary)} chars, "
+                     f"{reply.omitted} bill(s) counted only")
         
         return bills_summary, {
-            'bills': [dict(b) for b in bills],
+            'bills': [compact(b, SWAIG_BILL_REFERENCE_FIELDS) for b in bills],
             'patient_id': patient_id,
-            'total_amount': total_amount,
-            'pending_amount': pending_amount,
+            'total_amount': round(total_amount, 2),
+            'pending_amount': round(pending_amount, 2),
             'match_count': len(bills),
-            'search_criteria': {
-                'reference_number': reference_number,
-                'service_name': service_name,
-                'status': status,
-                'date': date,
-                'due_date': due_date,
-                'amount': amount,
-                'amount_min': amount_min,
-                'amount_max': amount_max
-            }
+            'search_criteria': search_criteria
         }
     
     # Single bill found - return detailed information (same as before)
     bill = bills[0]
-    bill_dict = dict(bill)
     
     # Format dates for display
     due_date_str = "Not specified"
@@ -4820,48 +5055,38 @@ def swaig_verify_bill_reference(reference_number=None, service_name=None, status
     remaining_balance = max(0, float(bill['patient_portion']))
     
     # Create detailed response
-    details = f"Bill Verified - Reference #{bill['reference_number']}:\n"
-    details += f"Bill #: {bill['bill_number'] if 'bill_number' in bill else bill['id']}\n"
-    details += f"Service: {bill['service_name']}"
-    if bill['service_description']:
-        details += f" - {bill['service_description']}"
-    details += f"\nTotal Amount: ${float(bill['amount']):.2f}"
-    details += f"\nPatient Portion: ${float(bill['patient_portion']):.2f}"
-    details += f"\nRemaining Balance: ${remaining_balance:.2f}"
-    details += f"\nStatus: {bill['display_status']}"
-    details += f"\nDue Date: {due_date_str}"
-    details += f"\nBill Date: {created_date_str}"
-    
+    service = f"{bill['service_name']} - {clip(bill['service_description'])}" if bill['service_description'] else bill['service_name']
+    details = [
+        f"Bill Verified - Reference #{bill['reference_number']}:",
+        f"Bill #: {bill['bill_number'] if 'bill_number' in bill else bill['id']}",
+        f"Service: {service}",
+        f"Total Amount: ${float(bill['amount']):.2f}",
+        f"Patient Portion: ${float(bill['patient_portion']):.2f}",
+        f"Remaining Balance: ${remaining_balance:.2f}",
+        f"Status: {bill['display_status']}",
+        f"Due Date: {due_date_str}",
+        f"Bill Date: {created_date_str}",
+    ]
     if bill['dentist_name']:
-        details += f"\nProvider: {bill['dentist_name']}"
-    
+        details.append(f"Provider: {bill['dentist_name']}")
     if payments:
-        details += f"\nPayments Made: {len(payments)} payment(s), Total: ${total_paid:.2f}"
+        details.append(f"Payments Made: {len(payments)} payment(s), Total: ${total_paid:.2f}")
     else:
-        details += f"\nPayments Made: No payments yet"
+        details.append("Payments Made: No payments yet")
     
     print(f"[SWAIG][CONSOLE] Bill verified by search criteria -> Bill {bill['id']} for patient {patient_id}")
     logging.info(f"[SWAIG] Bill verified by search criteria -> Bill {bill['id']} for patient {patient_id}")
     
-    return details, {
-        'bill': bill_dict,
+    return "\n".join(details), {
+        'bill': compact(bill, SWAIG_BILL_REFERENCE_FIELDS),
         'patient_id': patient_id,
         'reference_number': bill['reference_number'],
         'bill_id': bill['id'],
         'verified': True,
-        'total_paid': total_paid,
-        'remaining_balance': remaining_balance,
+        'total_paid': round(total_paid, 2),
+        'remaining_balance': round(remaining_balance, 2),
         'payments': [dict(p) for p in payments],
-        'search_criteria': {
-            'reference_number': reference_number,
-            'service_name': service_name,
-            'status': status,
-            'date': date,
-            'due_date': due_date,
-            'amount': amount,
-            'amount_min': amount_min,
-            'amount_max': amount_max
-        }
+        'search_criteria': search_criteria
     }
 
 @app.route('/api/send-bill-sms', methods=['POST'])
@@ -4932,12 +5157,10 @@ def send_bill_sms():
 Thank you for choosing our dental practice!"""
     
     try:
-        # Use existing SMS infrastructure
-        import requests
-        
         # Use SignalWire SMS API
-        response = requests.post(
-            f"{SIGNALWIRE_SPACE}/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages",
+        response = outbound.post(
+            'sms',
+            f"{SIGNALWIRE_API_URL}/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages",
             auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_AUTH_TOKEN),
             data={
                 'From': SIGNALWIRE_PHONE_NUMBER,
@@ -4956,10 +5179,124 @@ Thank you for choosing our dental practice!"""
             app.logger.error(f"SMS sending failed: {response.status_code} - {response.text}")
             return jsonify({'error': 'Failed to send SMS'}), 500
             
+    except OutboundUnavailable as e:
+        app.logger.warning(f"[OUTBOUND] Bill SMS not sent: {e}")
+        return jsonify({'error': 'Text messaging is temporarily unavailable. Please try again in a few minutes.'}), 503
     except Exception as e:
         app.logger.error(f"Error sending bill SMS: {str(e)}")
         return jsonify({'error': f'SMS sending failed: {str(e)}'}), 500
 
+def render_bill_image(bill):
+    """Draw a bill as a JPG under static/temp for an MMS; returns (filename, path, size in bytes)"""
+    from PIL import Image, ImageDraw, ImageFont
+    import uuid
+    
+    # Create image (portrait orientation, good for mobile viewing)
+    img_width = 600
+    img_height = 800
+    img = Image.new('RGB', (img_width, img_height), color='white')
+    draw = ImageDraw.Draw(img)
+    
+    # Try to use better fonts, fallback to default
+    try:
+        title_font = ImageFont.truetype("arial.ttf", 24)
+        header_font = ImageFont.truetype("arial.ttf", 18)
+        normal_font = ImageFont.truetype("arial.ttf", 14)
+        small_font = ImageFont.truetype("arial.ttf", 12)
+    except:
+        # Fallback to default font
+        title_font = ImageFont.load_default()
+        header_font = ImageFont.load_default()
+        normal_font = ImageFont.load_default()
+        small_font = ImageFont.load_default()
+    
+    # Calculate amounts
+    total_amount = float(bill['amount']) if bill['amount'] else 0
+    patient_portion = float(bill['patient_portion']) if bill['patient_portion'] else 0
+    insurance_portion = total_amount - patient_portion
+    amount_paid = float(bill['amount_paid']) if bill['amount_paid'] else 0
+    remaining_balance = patient_portion - amount_paid
+    
+    # Drawing helper function
+    y_pos = 20
+    def draw_text(text, font, color='black', y_offset=0):
+        nonlocal y_pos
+        y_pos += y_offset
+        draw.text((20, y_pos), text, fill=color, font=font)
+        y_pos += 25
+        return y_pos
+    
+    def draw_section_header(text):
+        nonlocal y_pos
+        y_pos += 10
+        draw.rectangle([(10, y_pos), (img_width-10, y_pos+30)], fill='#f3f4f6')
+        draw.text((20, y_pos+5), text, fill='#2563eb', font=header_font)
+        y_pos += 40
+    
+    # Title with Bill Number prominently displayed
+    draw_text(f"DENTAL OFFICE BILL #{bill['bill_number']}", title_font, '#2563eb', 10)
+    y_pos += 10
+    
+    # Bill Information
+    draw_section_header("Bill Information")
+    draw_text(f"Reference: {bill['reference_number'] or 'N/A'}", normal_font)
+    draw_text(f"Date: {bill['created_at'][:10] if bill['created_at'] else 'N/A'}", normal_font)
+    draw_text(f"Due Date: {bill['due_date'][:10] if bill['due_date'] else 'N/A'}", normal_font)
+    draw_text(f"Status: {bill['status'].upper() if bill['status'] else 'N/A'}", normal_font)
+    
+    # Patient Information
+    draw_section_header("Patient Information")
+    draw_text(f"Name: {bill['patient_first_name']} {bill['patient_last_name']}", normal_font)
+    draw_text(f"Phone: {bill['phone'] or 'N/A'}", normal_font)
+    
+    # Service Details
+    draw_section_header("Service Details")
+    draw_text(f"Service: {bill['service_name'] or 'N/A'}", normal_font)
+    draw_text(f"Treatment Date: {bill['treatment_date'][:10] if bill['treatment_date'] else 'N/A'}", normal_font)
+    if bill['dentist_first_name']:
+        draw_text(f"Dentist: {bill['dentist_first_name']} {bill['dentist_last_name']}", normal_font)
+    
+    # Amount Breakdown
+    draw_section_header("Amount Breakdown")
+    draw_text(f"Total Amount: ${total_amount:.2f}", normal_font)
+    draw_text(f"Insurance Portion: ${insurance_portion:.2f}", normal_font)
+    draw_text(f"Patient Portion: ${patient_portion:.2f}", normal_font, '#2563eb')
+    draw_text(f"Amount Paid: ${amount_paid:.2f}", normal_font)
+    
+    # Remaining Balance (highlighted)
+    balance_color = '#059669' if remaining_balance <= 0 else '#dc2626'
+    draw_text(f"Remaining Balance: ${remaining_balance:.2f}", normal_font, balance_color)
+    
+    # Footer
+    y_pos = img_height - 60
+    draw_text("Questions? Call our office", small_font, '#6b7280')
+    draw_text("Thank you for choosing our dental practice!", small_font, '#6b7280')
+    
+    # Save image to static directory for public access
+    image_filename = f"{uuid.uuid4()}.jpg"
+    static_path = os.path.join('static', 'temp')
+    
+    # Create temp directory if it doesn't exist
+    os.makedirs(static_path, exist_ok=True)
+    
+    image_path = os.path.join(static_path, image_filename)
+    
+    # Save optimized image
+    img.save(image_path, 'JPEG', quality=85, optimize=True)
+    file_size = os.path.getsize(image_path)
+    
+    # If file is too large, reduce quality
+    if file_size > 300000:  # 300KB limit
+        img.save(image_path, 'JPEG', quality=60, optimize=True)
+        file_size = os.path.getsize(image_path)
+    
+    # If still too large, reduce image dimensions
+    if file_size > 300000:
+        img_resized = img.resize((400, 533), Image.Resampling.LANCZOS)
+        img_resized.save(image_path, 'JPEG', quality=70, optimize=True)
+        file_size = os.path.getsize(image_path)
+    return image_filename, image_path, file_size
+
 @app.route('/api/send-bill-mms', methods=['POST'])
 @login_required
 def send_bill_mms():
@@ -5019,131 +5356,26 @@ def send_bill_mms():
     if not patient_phone:
         return jsonify({'error': 'Invalid phone number format'}), 400
     
+    # Don't draw an image that can't be sent
+    if not outbound.available('mms'):
+        return jsonify({'error': 'Picture messaging is temporarily unavailable. Please try again in a few minutes.'}), 503
+    
     try:
-        # Generate JPG image of the bill
-        from PIL import Image, ImageDraw, ImageFont
-        from io import BytesIO
-        import base64
-        import tempfile
-        import os
-        
-        # Create image (portrait orientation, good for mobile viewing)
-        img_width = 600
-        img_height = 800
-        img = Image.new('RGB', (img_width, img_height), color='white')
-        draw = ImageDraw.Draw(img)
-        
-        # Try to use better fonts, fallback to default
-        try:
-            title_font = ImageFont.truetype("arial.ttf", 24)
-            header_font = ImageFont.truetype("arial.ttf", 18)
-            normal_font = ImageFont.truetype("arial.ttf", 14)
-            small_font = ImageFont.truetype("arial.ttf", 12)
-        except:
-            # Fallback to default font
-            title_font = ImageFont.load_default()
-            header_font = ImageFont.load_default()
-            normal_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
-        # Calculate amounts
-        total_amount = float(bill['amount']) if bill['amount'] else 0
-        patient_portion = float(bill['patient_portion']) if bill['patient_portion'] else 0
-        insurance_portion = total_amount - patient_portion
-        amount_paid = float(bill['amount_paid']) if bill['amount_paid'] else 0
-        remaining_balance = patient_portion - amount_paid
-        
-        # Drawing helper function
-        y_pos = 20
-        def draw_text(text, font, color='black', y_offset=0):
-            nonlocal y_pos
-            y_pos += y_offset
-            draw.text((20, y_pos), text, fill=color, font=font)
-            y_pos += 25
-            return y_pos
-        
-        def draw_section_header(text):
-            nonlocal y_pos
-            y_pos += 10
-            draw.rectangle([(10, y_pos), (img_width-10, y_pos+30)], fill='#f3f4f6')
-            draw.text((20, y_pos+5), text, fill='#2563eb', font=header_font)
-            y_pos += 40
-        
-        # Title with Bill Number prominently displayed
-        draw_text(f"DENTAL OFFICE BILL #{bill['bill_number']}", title_font, '#2563eb', 10)
-        y_pos += 10
-        
-        # Bill Information
-        draw_section_header("Bill Information")
-        draw_text(f"Reference: {bill['reference_number'] or 'N/A'}", normal_font)
-        draw_text(f"Date: {bill['created_at'][:10] if bill['created_at'] else 'N/A'}", normal_font)
-        draw_text(f"Due Date: {bill['due_date'][:10] if bill['due_date'] else 'N/A'}", normal_font)
-        draw_text(f"Status: {bill['status'].upper() if bill['status'] else 'N/A'}", normal_font)
-        
-        # Patient Information
-        draw_section_header("Patient Information")
-        draw_text(f"Name: {bill['patient_first_name']} {bill['patient_last_name']}", normal_font)
-        draw_text(f"Phone: {bill['phone'] or 'N/A'}", normal_font)
-        
-        # Service Details
-        draw_section_header("Service Details")
-        draw_text(f"Service: {bill['service_name'] or 'N/A'}", normal_font)
-        draw_text(f"Treatment Date: {bill['treatment_date'][:10] if bill['treatment_date'] else 'N/A'}", normal_font)
-        if bill['dentist_first_name']:
-            draw_text(f"Dentist: {bill['dentist_first_name']} {bill['dentist_last_name']}", normal_font)
-        
-        # Amount Breakdown
-        draw_section_header("Amount Breakdown")
-        draw_text(f"Total Amount: ${total_amount:.2f}", normal_font)
-        draw_text(f"Insurance Portion: ${insurance_portion:.2f}", normal_font)
-        draw_text(f"Patient Portion: ${patient_portion:.2f}", normal_font, '#2563eb')
-        draw_text(f"Amount Paid: ${amount_paid:.2f}", normal_font)
-        
-        # Remaining Balance (highlighted)
-        balance_color = '#059669' if remaining_balance <= 0 else '#dc2626'
-        draw_text(f"Remaining Balance: ${remaining_balance:.2f}", normal_font, balance_color)
-        
-        # Footer
-        y_pos = img_height - 60
-        draw_text("Questions? Call our office", small_font, '#6b7280')
-        draw_text("Thank you for choosing our dental practice!", small_font, '#6b7280')
-        
-        # Save image to static directory for public access
-        import uuid
-        image_filename = f"{uuid.uuid4()}.jpg"
-        static_path = os.path.join('static', 'temp')
-        
-        # Create temp directory if it doesn't exist
-        os.makedirs(static_path, exist_ok=True)
-        
-        image_path = os.path.join(static_path, image_filename)
-        
-        # Save optimized image
-        img.save(image_path, 'JPEG', quality=85, optimize=True)
-        file_size = os.path.getsize(image_path)
-        
-        # If file is too large, reduce quality
-        if file_size > 300000:  # 300KB limit
-            img.save(image_path, 'JPEG', quality=60, optimize=True)
-            file_size = os.path.getsize(image_path)
-        
-        # If still too large, reduce image dimensions
-        if file_size > 300000:
-            img_resized = img.resize((400, 533), Image.Resampling.LANCZOS)
-            img_resized.save(image_path, 'JPEG', quality=70, optimize=True)
-            file_size = os.path.getsize(image_path)
+        # Generate JPG image of the bill; identical concurrent requests share one image
+        image_filename, image_path, file_size = single_flight.do(
+            'bill-mms-image', (bill['id'], session['user_type'], session['user_id']), lambda: render_bill_image(bill))
         
         # Create public URL for the image
         # Uses PROJECT_URL environment variable for deployment flexibility
         public_image_url = f"{PROJECT_URL}/static/temp/{image_filename}"
         
         # Send MMS via SignalWire
-        import requests
         import threading
         import time
         
-        response = requests.post(
-            f"{SIGNALWIRE_SPACE}/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages",
+        response = outbound.post(
+            'mms',
+            f"{SIGNALWIRE_API_URL}/api/laml/2010-04-01/Accounts/{SIGNALWIRE_PROJECT_ID}/Messages",
             auth=(SIGNALWIRE_PROJECT_ID, SIGNALWIRE_AUTH_TOKEN),
             data={
                 'From': SIGNALWIRE_PHONE_NUMBER,
@@ -5178,6 +5410,9 @@ def send_bill_mms():
             app.logger.error(f"MMS sending failed: {response.status_code} - {response.text}")
             return jsonify({'error': 'Failed to send MMS'}), 500
             
+    except OutboundUnavailable as e:
+        app.logger.warning(f"[OUTBOUND] Bill MMS not sent: {e}")
+        return jsonify({'error': 'Picture messaging is temporarily unavailable. Please try again in a few minutes.'}), 503
     except Exception as e:
         app.logger.error(f"Error sending bill MMS: {str(e)}")
         return jsonify({'error': f'MMS sending failed: {str(e)}'}), 500
@@ -5228,6 +5463,8 @@ def api_patient_by_patient_id(patient_id):
             query = f"UPDATE patients SET {', '.join(update_fields)} WHERE patient_id = ?"
             
             db.execute(query, params)
+            if 'phone' in data:
+                sync_patient_phone_e164(db, patient['id'])
             db.commit()
             
             # Return updated patient data
@@ -5308,17 +5545,28 @@ def cleanup_old_temp_files():
     except Exception as e:
         app.logger.warning(f"Error during temp file cleanup: {e}")
 
+background_jobs.register('temp-file-cleanup', 1800, cleanup_old_temp_files)  # Every 30 minutes
+
 def schedule_cleanup_job():
-    """Schedule periodic cleanup of temp files"""
-    def cleanup_worker():
-        while True:
-            time.sleep(1800)  # Run every 30 minutes
-            cleanup_old_temp_files()
-    
-    cleanup_thread = threading.Thread(target=cleanup_worker)
-    cleanup_thread.daemon = True
-    cleanup_thread.start()
-    app.logger.info("Scheduled temp file cleanup job")
+    """Start the periodic jobs (temp file cleanup) unless another process of this deployment runs them"""
+    if background_jobs.start():
+        app.logger.info("Scheduled temp file cleanup job")
+
+def init_worker():
+    """Per-process setup for a gunicorn worker forked from the preloaded app (see gunicorn.conf.py)"""
+    # Connections are per request (get_db) or per block (bill_number_allocator, which also
+    # drops a block reserved before the fork), so no SQLite handle crosses the fork.
+    # Anything the master cached while preloading is dropped and the RNG reseeded so
+    # workers don't share random sequences.
+    global _signalwire
+    _signalwire = None  # its HTTP connection pool must not be shared with the master
+    random.seed()
+    caller_id_cache.clear()
+    working_hours_cache.clear()
+    app.jinja_env.fragment_cache.clear()
+    query_cache.clear()
+    background_jobs.after_fork()
+    schedule_cleanup_job()
 
 @swaig.endpoint(
     "Get Available Services and Dentists",
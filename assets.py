@@ -0,0 +1,200 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip variants are built
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Build output lives under static/ so serve_static can send it like any other file
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Generated or user-specific content that must not be fingerprinted
+SKIP_DIRS = {DIST_DIR, 'temp'}
+SKIP_EXTENSIONS = {'.md'}
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html', '.map', '.ico'}
+MIN_COMPRESS_SIZE = 1024
+
+# Preferred first when the client accepts several
+ENCODING_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+# Fingerprinted files never change, so caches may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _fingerprinted_name(relative_path, digest):
+    root, ext = os.path.splitext(relative_path)
+    return f'{root}.{digest}{ext}'
+
+
+def _compress_variants(path, data):
+    encodings = []
+    variants = [('gzip', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('br', brotli.compress(data, quality=11)))
+    for encoding, compressed in variants:
+        # Only keep a variant when it actually saves bytes
+        if len(compressed) < len(data):
+            with open(f'{path}.{ENCODING_SUFFIXES[encoding]}', 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def build_assets(static_dir=STATIC_DIR):
+    """Fingerprint every static file into static/dist/ and pre-compress the text ones.
+
+    Writes static/dist/manifest.json mapping each source path (e.g. css/style.css)
+    to its fingerprinted path and available encodings. Files from the previous
+    build are kept, so pages rendered just before a deploy still load.
+    """
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    previous = _read_manifest(manifest_path)
+
+    files = {}
+    for root, dirs, filenames in os.walk(static_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.relpath(os.path.join(root, d), static_dir) not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in SKIP_EXTENSIONS:
+                continue
+            source = os.path.join(root, filename)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, '/')
+            with open(source, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            target_relative = f'{DIST_DIR}/{_fingerprinted_name(relative, digest)}'
+            target = os.path.join(static_dir, *target_relative.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target)
+
+            encodings = []
+            if ext in COMPRESSIBLE_EXTENSIONS and len(data) >= MIN_COMPRESS_SIZE:
+                encodings = _compress_variants(target, data)
+            files[relative] = {
+                'path': target_relative,
+                'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                'encodings': encodings,
+            }
+
+    keep = {entry['path'] for entry in list(files.values()) + list(previous.get('files', {}).values())}
+    _remove_stale(dist_dir, static_dir, keep)
+
+    manifest = {'files': files}
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def _remove_stale(dist_dir, static_dir, keep):
+    for root, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            if filename == MANIFEST_NAME:
+                continue
+            path = os.path.join(root, filename)
+            relative = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            for suffix in ENCODING_SUFFIXES.values():
+                if relative.endswith(f'.{suffix}'):
+                    relative = relative[:-len(suffix) - 1]
+                    break
+            if relative not in keep:
+                os.remove(path)
+
+
+def _read_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def negotiate_encoding(accept_encoding, available):
+    """Pick the best of the available encodings the client accepts (None for identity)"""
+    if not available or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ENCODING_SUFFIXES:
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class AssetManifest:
+    """Resolves source paths to fingerprinted ones from static/dist/manifest.json.
+
+    Without a manifest (assets not built) every lookup falls back to the source
+    path, so development works without a build step. With auto_reload the file
+    is re-read whenever it changes on disk.
+    """
+
+    def __init__(self, static_dir=STATIC_DIR, auto_reload=False):
+        self.path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+        self.auto_reload = auto_reload
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._files = {}
+        self._by_path = {}
+        self._loaded = False
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if self._loaded and (not self.auto_reload or mtime == self._mtime):
+            return
+        with self._lock:
+            files = _read_manifest(self.path).get('files', {}) if mtime else {}
+            self._files = files
+            self._by_path = {entry['path']: entry for entry in files.values()}
+            self._mtime = mtime
+            self._loaded = True
+            if mtime:
+                logging.info(f"[ASSETS] Loaded manifest with {len(files)} fingerprinted files")
+
+    def resolve(self, filename):
+        self._load()
+        entry = self._files.get(filename)
+        return entry['path'] if entry else filename
+
+    def fingerprinted(self, filename):
+        """The manifest entry when filename is a fingerprinted build output, else None"""
+        self._load()
+        return self._by_path.get(filename)
+
+    @property
+    def version(self):
+        """Changes whenever a new manifest is loaded (None without one)"""
+        self._load()
+        return self._mtime
+
+
+if __name__ == '__main__':
+    manifest = build_assets()
+    for source, entry in sorted(manifest['files'].items()):
+        print(f"{source} -> {entry['path']} {' '.join(entry['encodings'])}")
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were built')
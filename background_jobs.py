@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; every process then runs its own jobs
+    fcntl = None
+
+# How often a process that lost the lock checks whether the holder has gone
+STANDBY_RETRY = 60
+
+
+class BackgroundJobs:
+    """Periodic jobs that run in exactly one process of a deployment.
+
+    Under gunicorn every worker calls start() after it is forked; the first to
+    take an exclusive flock on lock_path runs the jobs and the others stand by,
+    retrying every STANDBY_RETRY seconds so a replacement takes over when the
+    running worker exits (the kernel drops the lock with the process). The dev
+    server's reloader parent and child are covered the same way.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._jobs = []
+        self._mutex = threading.Lock()
+        self._lock_file = None
+        self._pid = None
+        self._running = False
+        self._stop = threading.Event()
+
+    def register(self, name, interval, func):
+        """Run func() every interval seconds (first run after one interval) once started"""
+        self._jobs.append((name, interval, func))
+
+    @property
+    def running(self):
+        """True when this process holds the lock and runs the jobs"""
+        return self._running and self._pid == os.getpid()
+
+    def after_fork(self):
+        """Forget state inherited from the parent process.
+
+        The inherited lock descriptor is closed without unlocking: the flock
+        belongs to the parent's open file and stays with it.
+        """
+        if self._pid == os.getpid():
+            return
+        if self._lock_file is not None:
+            try:
+                self._lock_file.close()
+            except OSError:
+                pass
+        self._mutex = threading.Lock()
+        self._lock_file = None
+        self._pid = None
+        self._running = False
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start the jobs if no other process runs them; returns whether this process does.
+
+        Safe to call more than once per process.
+        """
+        self.after_fork()
+        with self._mutex:
+            if self._pid == os.getpid():
+                return self._running
+            self._pid = os.getpid()
+            if self._acquire():
+                self._start_jobs()
+            else:
+                logging.info(f"[JOBS] Background jobs run in another process; pid {self._pid} is standing by")
+                threading.Thread(target=self._standby, name='jobs-standby', daemon=True).start()
+        return self._running
+
+    def stop(self):
+        """Stop the job threads at their next wake-up (used on worker exit)"""
+        self._stop.set()
+
+    def _acquire(self):
+        if fcntl is None:
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f'{os.getpid()}\n')
+        lock_file.flush()
+        self._lock_file = lock_file
+        return True
+
+    def _standby(self):
+        while not self._stop.wait(STANDBY_RETRY):
+            with self._mutex:
+                if self._pid != os.getpid():
+                    return
+                if self._acquire():
+                    self._start_jobs()
+                    return
+
+    def _start_jobs(self):
+        self._running = True
+        for name, interval, func in self._jobs:
+            threading.Thread(target=self._loop, args=(name, interval, func), name=f'job-{name}', daemon=True).start()
+        logging.info(f"[JOBS] pid {os.getpid()} runs background jobs: {', '.join(job[0] for job in self._jobs)}")
+
+    def _loop(self, name, interval, func):
+        while not self._stop.wait(interval):
+            try:
+                func()
+            except Exception as e:
+                logging.error(f"[JOBS] {name} failed: {e}")
@@ -0,0 +1,103 @@
+"""Latency of SWAIG follow-up questions served from the prefetched account context.
+
+Plays --calls phone calls through POST /swaig against the local SignalWire
+stand-in (signalwire_stub.py): send_mfa_code, verify_mfa_code (which
+prefetches the caller's account context), then the read-only follow-ups
+check_balance, get_bills, get_appointments and get_payment_methods, twice
+each. Reports per function the p50/p95 latency when served from the
+context, and when an unrelated write elsewhere in the practice (another
+patient's bill changes) lands right before each follow-up, so the context has
+to be reloaded. The caller has --bills bills, as in swaig_response_bench.py.
+
+    python benchmarks/account_context_bench.py --calls 50 --bills 40
+"""
+import argparse
+import base64
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from query_cache_bench import create_database  # noqa: E402
+from swaig_response_bench import add_heavy_caller  # noqa: E402
+from signalwire_stub import StubSignalWire  # noqa: E402
+
+FOLLOW_UPS = ('swaig_check_balance', 'swaig_get_bills', 'swaig_get_appointments', 'swaig_get_payment_methods')
+AUTH = ('bench', 'bench')
+
+
+def swaig(client, function, **arguments):
+    response = client.post('/swaig', json={'function': function, 'argument': {'parsed': [arguments]}, 'meta_data': {}},
+                           headers={'Authorization': 'Basic ' + base64.b64encode(':'.join(AUTH).encode()).decode()})
+    if response.status_code != 200:
+        raise AssertionError(f'{function}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+    return response.get_json()
+
+
+def play_call(app, client, latencies, write_between):
+    swaig(client, 'send_mfa_code', patient_id=1)
+    verified = swaig(client, 'verify_mfa_code', token='123456')
+    token = (verified.get('action') or {}).get('challenge_token')
+    if not token:
+        raise AssertionError(f"verification failed: {verified.get('response')}")
+    for _ in range(2):
+        for function in FOLLOW_UPS:
+            if write_between:
+                with app.app.app_context():
+                    db = app.get_db()
+                    db.execute("UPDATE billing SET status = status WHERE patient_id = 2")
+                    db.commit()
+            began = time.perf_counter()
+            result = swaig(client, function, challenge_token=token)
+            latencies[function].append(time.perf_counter() - began)
+            if 'verify your identity' in result['response']:
+                raise AssertionError(f'{function}: {result["response"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--bills', type=int, default=40, help="bills on the caller's account")
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    stub = StubSignalWire().start()
+    stub.set_profile('healthy', latency=0, jitter=0)
+    os.environ.update({
+        'SIGNALWIRE_BASE_URL': stub.url, 'SIGNALWIRE_SPACE': 'stub', 'SIGNALWIRE_PROJECT_ID': 'bench',
+        'SIGNALWIRE_TOKEN': 'bench', 'FROM_NUMBER': '+15550000000', 'HTTP_USERNAME': AUTH[0], 'HTTP_PASSWORD': AUTH[1],
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, _, _ = create_database(os.path.join(tmp, 'dental_office.db'), args.patients)
+        add_heavy_caller(conn, 1, args.bills)
+        conn.execute("UPDATE patients SET phone = '+15550100001' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        os.chdir(tmp)  # app opens dental_office.db and its cache files in the working directory
+        import app
+
+        client = app.app.test_client()
+        print(f"{args.calls} calls, caller with {args.bills} bills; each follow-up asked twice per call")
+        print(f"{'follow-up':<28} {'mode':<22} {'p50':>8} {'p95':>8}")
+        for mode, write_between in (('from context', False), ('reloaded after write', True)):
+            latencies = {function: [] for function in FOLLOW_UPS}
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(args.calls):
+                    play_call(app, client, latencies, write_between)
+            for function, values in latencies.items():
+                values.sort()
+                print(f'{function:<28} {mode:<22} {statistics.median(values) * 1000:6.2f}ms '
+                      f'{values[int(len(values) * 0.95)] * 1000:6.2f}ms')
+        print(app.account_contexts.stats())
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
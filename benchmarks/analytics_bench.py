@@ -0,0 +1,145 @@
+"""Benchmark for the revenue rollups and their aggregation.
+
+Compares the dashboard's old monthly revenue query (a billing scan filtered on
+strftime) and a per-service monthly revenue report computed straight from
+billing with the same figures read from billing_daily. Also times group_sum's
+Python and numpy paths on the rollup rows and the cost the triggers add to
+each billing insert.
+
+    python benchmarks/analytics_bench.py --bills 200000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics  # noqa: E402
+from db_migrate import migrate  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATUSES = ('pending', 'paid', 'overdue', 'cancelled', 'partial')
+SERVICES = 12
+DENTISTS = 8
+HISTORY_DAYS = 3 * 365
+
+
+def create_database(path, bills):
+    conn = sqlite3.connect(path)
+    with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.executemany("INSERT INTO dental_services (id, name, description, price, type) VALUES (?, ?, '', 100, 'checkup')",
+                     [(s, f'Service {s}') for s in range(1, SERVICES + 1)])
+    conn.executemany(
+        'INSERT INTO dentists (id, first_name, last_name, email, phone, license_number, working_hours, '
+        "password_hash, password_salt) VALUES (?, ?, 'Bench', ?, '555-0200', ?, '{}', 'x', 'x')",
+        [(d, f'Dentist{d}', f'd{d}@bench', f'LIC{d}') for d in range(1, DENTISTS + 1)]
+    )
+    conn.execute("INSERT INTO patients (id, first_name, last_name, email, phone, address, date_of_birth, password_hash, "
+                 "password_salt, patient_id) VALUES (1, 'P', 'Bench', 'p@bench', '555', 'x', '1990-01-01', 'x', 'x', '1')")
+    rng = random.Random(11)
+    first = date.today() - timedelta(days=HISTORY_DAYS - 30)
+    rows = []
+    for _ in range(bills):
+        amount = round(rng.uniform(50, 900), 2)
+        rows.append((rng.randint(1, DENTISTS), rng.randint(1, SERVICES), amount, amount, rng.choice(STATUSES),
+                     (first + timedelta(days=rng.randrange(HISTORY_DAYS))).isoformat() + ' 09:00:00'))
+    began = time.perf_counter()
+    conn.executemany('INSERT INTO billing (patient_id, dentist_id, service_id, amount, patient_portion, status, due_date) '
+                     'VALUES (1, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    with_triggers = time.perf_counter() - began
+    conn.execute('ANALYZE')
+    return conn, rows, with_triggers
+
+
+def insert_without_triggers(rows):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'plain.db'))
+        with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+            conn.executescript(f.read())
+        began = time.perf_counter()
+        conn.executemany('INSERT INTO billing (patient_id, dentist_id, service_id, amount, patient_portion, status, '
+                         'due_date) VALUES (1, ?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        elapsed = time.perf_counter() - began
+        conn.close()
+    return elapsed
+
+
+def measure(label, repeat, func, baseline=None):
+    result = func()
+    began = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_call = (time.perf_counter() - began) / repeat * 1000
+    speedup = f'  {baseline / per_call:7.1f}x' if baseline else ''
+    print(f'  {label:<36} {per_call:9.2f} ms{speedup}')
+    return per_call, result
+
+
+def old_monthly_revenue(conn, dentist_id):
+    return conn.execute('''
+        SELECT COALESCE(SUM(b.amount), 0) FROM billing b
+        WHERE b.dentist_id = ? AND strftime('%Y-%m', b.due_date) = strftime('%Y-%m', 'now')
+    ''', (dentist_id,)).fetchone()[0]
+
+
+def old_service_report(conn, start_date, end_date):
+    return conn.execute('''
+        SELECT strftime('%Y-%m', due_date), service_id, COUNT(*), SUM(amount)
+        FROM billing WHERE date(due_date) >= ? AND date(due_date) <= ?
+        GROUP BY 1, 2 ORDER BY 1, 2
+    ''', (start_date.isoformat(), end_date.isoformat())).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bills', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, rows, with_triggers = create_database(os.path.join(tmp, 'bench.db'), args.bills)
+        without = insert_without_triggers(rows)
+        rollup_rows = conn.execute('SELECT COUNT(*) FROM billing_daily').fetchone()[0]
+        print(f'{args.bills} bills -> {rollup_rows} billing_daily rows')
+        print(f'  insert cost: {without / args.bills * 1e6:.1f} us/bill without triggers, '
+              f'{with_triggers / args.bills * 1e6:.1f} us/bill with rollup triggers')
+
+        print('dashboard monthly revenue:')
+        baseline, old = measure('billing scan (strftime)', args.repeat, lambda: old_monthly_revenue(conn, 1))
+        _, new = measure('billing_daily range', args.repeat, lambda: analytics.monthly_revenue(conn, 1), baseline)
+        assert abs(old - new) < 0.01, (old, new)
+
+        end_date = date.today()
+        start_date = end_date - timedelta(days=730)
+        print('per-service monthly revenue, two years:')
+        baseline, old = measure('GROUP BY on billing', args.repeat, lambda: old_service_report(conn, start_date, end_date))
+        _, new = measure('analytics.revenue_report', args.repeat,
+                         lambda: analytics.revenue_report(conn, start_date, end_date, 'month', 'service'), baseline)
+        assert [(r[0], r[1], r[2]) for r in old] == [(r['period'], r['service'], r['bills']) for r in new]
+
+        rows = analytics.daily_sums(conn, 'billing_daily', ('bills', 'billed', 'insurance', 'outstanding'),
+                                    start_date, end_date, by='service')
+        group_args = ([r[0] for r in rows], [r[1] for r in rows], [[r[c] for r in rows] for c in (2, 3, 4, 5)])
+        print(f'group_sum over {len(rows)} day x service rows into week x service:')
+        baseline, py = measure('python', args.repeat, lambda: analytics.group_sum(*group_args, period='week',
+                                                                                  use_numpy=False))
+        if analytics.get_numpy() is None:
+            print('  numpy is not installed; skipped')
+        else:
+            _, np_rows = measure('numpy', args.repeat, lambda: analytics.group_sum(*group_args, period='week',
+                                                                                 use_numpy=True), baseline)
+            assert [r[:3] for r in py] == [r[:3] for r in np_rows]
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
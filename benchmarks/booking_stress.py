@@ -0,0 +1,180 @@
+"""Concurrency stress test for conflict-checked appointment booking.
+
+Many threads, each with its own SQLite connection (like separate gunicorn
+workers) and its own patient, race for the same dentist:
+
+1. every booker asks for the same exact slot; exactly one may win and every
+   loser must get a conflict with alternatives that are really free;
+2. every booker asks for "the morning" and takes the first free slot in it;
+   the morning must fill up with no two appointments overlapping.
+
+    python benchmarks/booking_stress.py --bookers 32 --rounds 10
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_migrate import migrate  # noqa: E402
+from booking import book, book_in_window, slot_window, BookingConflict, BookingError, format_time  # noqa: E402
+from working_hours import sync_dentist_working_hours  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEEKDAY_HOURS = {day: {'start': '08:00', 'end': '17:00'}
+                 for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday')}
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def create_database(path, bookers, rounds):
+    conn = connect(path)
+    with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.execute("INSERT INTO dental_services (id, name, description, price, type) VALUES (1, 'Checkup', '', 80, 'checkup')")
+    conn.executemany(
+        'INSERT INTO patients (id, first_name, last_name, email, phone, address, date_of_birth, '
+        'password_hash, password_salt, patient_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(n, f'Patient{n}', 'Stress', f'p{n}@stress', '555-0100', '1 Test St', '1990-01-01', 'x', 'x', str(1000000 + n))
+         for n in range(1, bookers + 1)]
+    )
+    conn.executemany(
+        'INSERT INTO dentists (id, first_name, last_name, email, phone, license_number, working_hours, '
+        'password_hash, password_salt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(d, f'Dentist{d}', 'Stress', f'd{d}@stress', '555-0200', f'LIC{d}', json.dumps(WEEKDAY_HOURS), 'x', 'x')
+         for d in range(1, rounds + 1)]
+    )
+    for d in range(1, rounds + 1):
+        sync_dentist_working_hours(conn, d)
+    conn.commit()
+    conn.close()
+
+
+def next_monday():
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+def race(path, bookers, attempt):
+    """Run attempt(conn, patient_id) in every booker at once; returns (results, conflicts, errors, seconds)"""
+    results, conflicts, errors = [], [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(bookers)
+
+    def booker(patient_id):
+        conn = connect(path)
+        barrier.wait()
+        try:
+            result = attempt(conn, patient_id)
+            with lock:
+                results.append(result)
+        except BookingConflict as e:
+            with lock:
+                conflicts.append(e)
+        except (BookingError, sqlite3.Error) as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=booker, args=(n,)) for n in range(1, bookers + 1)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, conflicts, errors, time.perf_counter() - began
+
+
+def overlapping_pairs(conn, dentist_id):
+    return conn.execute('''
+        SELECT COUNT(*) FROM appointments a JOIN appointments b
+          ON a.dentist_id = b.dentist_id AND a.id < b.id AND a.start_time < b.end_time AND b.start_time < a.end_time
+        WHERE a.dentist_id = ?
+    ''', (dentist_id,)).fetchone()[0]
+
+
+def run(bookers, rounds):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        create_database(path, bookers, rounds)
+        day = next_monday()
+        slot_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=9)
+        slot_end = slot_start + timedelta(hours=1)
+        window_start, window_end = slot_window(day.isoformat(), 'morning')
+        # 08:00-11:00 on a 30-minute grid holds three back-to-back hour-long appointments
+        window_capacity = 3
+        ok = True
+        attempts = 0
+        elapsed = 0.0
+
+        for dentist in range(1, rounds + 1):
+            results, conflicts, errors, seconds = race(
+                path, bookers, lambda conn, patient: book(conn, patient, dentist, slot_start, slot_end, service_id=1))
+            attempts += bookers
+            elapsed += seconds
+            conn = connect(path)
+            if len(results) != 1 or len(conflicts) != bookers - 1:
+                print(f'FAIL: exact slot, dentist {dentist}: {len(results)} winners, {len(conflicts)} conflicts')
+                ok = False
+            for conflict in conflicts:
+                for start, end in conflict.alternatives:
+                    if conn.execute('SELECT 1 FROM appointments WHERE dentist_id = ? AND start_time < ? AND end_time > ?',
+                                    (dentist, format_time(end), format_time(start))).fetchone():
+                        print(f'FAIL: alternative {start} offered to a loser is already taken')
+                        ok = False
+            if any(not conflict.alternatives for conflict in conflicts):
+                print('FAIL: a loser got no alternatives')
+                ok = False
+            conn.execute('DELETE FROM appointments WHERE dentist_id = ?', (dentist,))
+            conn.commit()
+            conn.close()
+
+            results, conflicts, errors2, seconds = race(
+                path, bookers, lambda conn, patient: book_in_window(conn, patient, dentist, window_start, window_end,
+                                                                    service_id=1))
+            attempts += bookers
+            elapsed += seconds
+            errors += errors2
+            conn = connect(path)
+            booked = conn.execute('SELECT COUNT(*) FROM appointments WHERE dentist_id = ?', (dentist,)).fetchone()[0]
+            if len(results) != min(bookers, window_capacity) or booked != len(results):
+                print(f'FAIL: window, dentist {dentist}: {len(results)} booked, {booked} rows, '
+                      f'expected {min(bookers, window_capacity)}')
+                ok = False
+            if overlapping_pairs(conn, dentist):
+                print(f'FAIL: dentist {dentist} has overlapping appointments')
+                ok = False
+            conn.close()
+            if errors:
+                print(f'FAIL: errors, first: {errors[0]}')
+                ok = False
+
+        print(f'bookers={bookers} rounds={rounds} attempts={attempts} elapsed={elapsed:.2f}s '
+              f'throughput={attempts / elapsed:.0f} bookings/s')
+        print('OK' if ok else 'FAILED')
+        return ok
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bookers', type=int, default=32, help='simultaneous bookers per race')
+    parser.add_argument('--rounds', type=int, default=10, help='races to run, each against a fresh dentist')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.bookers, args.rounds) else 1)
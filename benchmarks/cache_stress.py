@@ -0,0 +1,135 @@
+"""Multi-process stress test and throughput of the shared SQLite cache.
+
+Forks worker processes (like gunicorn workers) that share one cache file and
+checks what a per-process cache can't promise:
+
+1. get_or_set on a cold key: every process gets the same value;
+2. incr: no increment is lost;
+3. pop (single-use tokens): every key is taken by exactly one process;
+4. a value set in one process is read by the others; invalidate() drops a
+   whole namespace for all of them;
+5. eviction keeps the file at max_entries.
+
+Then times get/set for the SQLite backend against the in-process one.
+
+    python benchmarks/cache_stress.py --processes 8 --ops 2000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_cache import SQLiteCache, MemoryCache  # noqa: E402
+
+
+def run_workers(processes, target, *args):
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=target, args=(queue, n) + args) for n in range(processes)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def cold_key(queue, n, path):
+    cache = SQLiteCache(path)
+    queue.put(cache.get_or_set('stress', 'cold', lambda: f'value from {n}'))
+
+
+def increments(queue, n, path, ops):
+    cache = SQLiteCache(path)
+    for _ in range(ops):
+        cache.incr('stress', 'counter')
+    queue.put(n)
+
+
+def pops(queue, n, path, keys):
+    cache = SQLiteCache(path)
+    queue.put([key for key in range(keys) if cache.pop('tokens', key) is not None])
+
+
+def reads(queue, n, path):
+    cache = SQLiteCache(path)
+    queue.put((cache.get('shared', 'greeting'), cache.get('dropped', 'a')))
+
+
+def throughput(cache, ops):
+    began = time.perf_counter()
+    for i in range(ops):
+        cache.set('bench', i % 500, {'patient_id': i, 'name': 'Bench'})
+    set_rate = ops / (time.perf_counter() - began)
+    began = time.perf_counter()
+    for i in range(ops):
+        cache.get('bench', i % 500)
+    return set_rate, ops / (time.perf_counter() - began)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--ops', type=int, default=2000, help='increments per process and timed operations')
+    args = parser.parse_args()
+    multiprocessing.set_start_method('fork')
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.db')
+        cache = SQLiteCache(path, max_entries=1000)
+
+        values = run_workers(args.processes, cold_key, path)
+        if len(set(values)) != 1:
+            print(f'FAIL: get_or_set gave different values: {sorted(set(values))}')
+            ok = False
+
+        began = time.perf_counter()
+        run_workers(args.processes, increments, path, args.ops)
+        elapsed = time.perf_counter() - began
+        total = cache.get('stress', 'counter')
+        if total != args.processes * args.ops:
+            print(f'FAIL: counter is {total}, expected {args.processes * args.ops}')
+            ok = False
+        print(f'incr: {args.processes} processes x {args.ops} -> {total} '
+              f'({args.processes * args.ops / elapsed:.0f} increments/s)')
+
+        keys = 500
+        for key in range(keys):
+            cache.set('tokens', key, f'token {key}')
+        taken = [key for popped in run_workers(args.processes, pops, path, keys) for key in popped]
+        if sorted(taken) != list(range(keys)):
+            print(f'FAIL: pop handed out {len(taken)} tokens for {keys} keys ({len(set(taken))} distinct)')
+            ok = False
+
+        cache.set('shared', 'greeting', 'hello')
+        cache.set('dropped', 'a', 1)
+        cache.invalidate('dropped')
+        if set(run_workers(args.processes, reads, path)) != {('hello', None)}:
+            print('FAIL: another process did not see a set or an invalidate')
+            ok = False
+
+        for i in range(3000):
+            cache.set('fill', i, i)
+        cache.evict()
+        entries = cache.stats()['entries']
+        if entries > cache.max_entries:
+            print(f'FAIL: {entries} entries after eviction, max {cache.max_entries}')
+            ok = False
+        if cache.get('fill', 2999) != 2999:
+            print('FAIL: eviction dropped a recently used entry')
+            ok = False
+
+        print('single process, 500 hot keys:')
+        for label, backend in (('memory', MemoryCache()), ('sqlite', SQLiteCache(os.path.join(tmp, 'bench.db')))):
+            set_rate, get_rate = throughput(backend, args.ops)
+            print(f'  {label:<7} set {set_rate:9.0f}/s  get {get_rate:9.0f}/s  {backend.stats()}')
+    print('OK' if ok else 'FAILED')
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
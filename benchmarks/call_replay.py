@@ -0,0 +1,109 @@
+"""Call duration with one get_account_summary call instead of four separate lookups.
+
+Replays a scripted "what do I owe and when am I next in?" phone call --calls
+times through POST /swaig, against the local SignalWire stand-in
+(signalwire_stub.py) with its healthy latency, in two versions:
+
+    separate   send_mfa_code, verify_mfa_code, check_balance, get_bills,
+               get_appointments, get_payment_methods
+    summary    send_mfa_code, verify_mfa_code, get_account_summary
+
+Each SWAIG call is timed for real (including the carrier round trips of the
+MFA calls). The AI agent's side is modelled, not measured: every tool call
+costs one LLM turn of --turn-latency seconds, plus --per-token seconds per
+token of reply text it has to read (chars / CHARS_PER_TOKEN). Reports per
+version the tool calls, reply characters, SWAIG time and modelled call
+duration (p50/p95). The caller has --bills bills, as in swaig_response_bench.py.
+
+    python benchmarks/call_replay.py --calls 50 --bills 40 --turn-latency 0.8 --per-token 0.0005
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from account_context_bench import AUTH, swaig  # noqa: E402
+from query_cache_bench import create_database  # noqa: E402
+from swaig_response_bench import add_heavy_caller  # noqa: E402
+from signalwire_stub import StubSignalWire  # noqa: E402
+from swaig_response import CHARS_PER_TOKEN  # noqa: E402
+
+SCRIPTS = {
+    'separate': ('swaig_check_balance', 'swaig_get_bills', 'swaig_get_appointments', 'swaig_get_payment_methods'),
+    'summary': ('swaig_get_account_summary',),
+}
+
+
+def replay(client, questions, turn_latency, per_token):
+    """One call: verification, then the questions; returns (tool calls, reply chars, SWAIG seconds, modelled seconds)"""
+    calls = chars = 0
+    swaig_time = 0.0
+    token = None
+    steps = [('send_mfa_code', {'patient_id': 1}), ('verify_mfa_code', {'token': '123456'})]
+    steps += [(function, None) for function in questions]
+    for function, arguments in steps:
+        began = time.perf_counter()
+        result = swaig(client, function, **(arguments or {'challenge_token': token}))
+        swaig_time += time.perf_counter() - began
+        if function == 'verify_mfa_code':
+            token = (result.get('action') or {}).get('challenge_token')
+            if not token:
+                raise AssertionError(f"verification failed: {result.get('response')}")
+        elif 'verify your identity' in result['response']:
+            raise AssertionError(f'{function}: {result["response"]}')
+        calls += 1
+        chars += len(result['response'])
+    modelled = swaig_time + calls * turn_latency + chars / CHARS_PER_TOKEN * per_token
+    return calls, chars, swaig_time, modelled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--bills', type=int, default=40, help="bills on the caller's account")
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--turn-latency', type=float, default=0.8, help='modelled seconds per LLM turn (tool call)')
+    parser.add_argument('--per-token', type=float, default=0.0005, help='modelled seconds per token of reply read')
+    args = parser.parse_args()
+
+    stub = StubSignalWire().start()
+    stub.set_profile('healthy')
+    os.environ.update({
+        'SIGNALWIRE_BASE_URL': stub.url, 'SIGNALWIRE_SPACE': 'stub', 'SIGNALWIRE_PROJECT_ID': 'bench',
+        'SIGNALWIRE_TOKEN': 'bench', 'FROM_NUMBER': '+15550000000', 'HTTP_USERNAME': AUTH[0], 'HTTP_PASSWORD': AUTH[1],
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, _, _ = create_database(os.path.join(tmp, 'dental_office.db'), args.patients)
+        add_heavy_caller(conn, 1, args.bills)
+        conn.execute("UPDATE patients SET phone = '+15550100001' WHERE id = 1")
+        conn.commit()
+        conn.close()
+        os.chdir(tmp)  # app opens dental_office.db and its cache files in the working directory
+        import app
+
+        client = app.app.test_client()
+        print(f"{args.calls} calls, caller with {args.bills} bills; LLM modelled at {args.turn_latency}s per turn "
+              f"+ {args.per_token}s per token read")
+        print(f"{'script':<10} {'tool calls':>10} {'chars':>7} {'SWAIG p50':>10} {'call p50':>9} {'call p95':>9}")
+        for name, questions in SCRIPTS.items():
+            results = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(args.calls):
+                    results.append(replay(client, questions, args.turn_latency, args.per_token))
+            durations = sorted(result[3] for result in results)
+            print(f'{name:<10} {results[0][0]:10d} {results[0][1]:7d} '
+                  f'{statistics.median(result[2] for result in results) * 1000:8.1f}ms '
+                  f'{statistics.median(durations):8.2f}s {durations[int(len(durations) * 0.95)]:8.2f}s')
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
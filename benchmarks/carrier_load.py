@@ -0,0 +1,133 @@
+"""How the app behaves when the carrier is slow or failing.
+
+Starts the SignalWire stand-in (signalwire_stub.py) and, for each carrier
+profile, a fresh gunicorn running the app against it (SIGNALWIRE_BASE_URL).
+Concurrent clients then play the start of a phone call over SWAIG: send an
+MFA code, then verify it. Reports per profile the SWAIG latency, what callers
+were told (sent / verified, "temporarily unavailable", other failures) and
+how many requests actually reached the carrier, which shows the deadlines and
+circuit breakers (outbound.py) at work.
+
+    python benchmarks/carrier_load.py --clients 8 --seconds 10 --profiles healthy,slow,down,hanging
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from serving_bench import prepare, free_port, start_server, stop_server  # noqa: E402
+from signalwire_stub import StubSignalWire, PROFILES  # noqa: E402
+
+SWAIG_AUTH = ('swaig', 'load-test')
+
+
+def swaig_call(connection, function, arguments):
+    body = json.dumps({'function': function, 'argument': {'parsed': [arguments]}})
+    token = base64.b64encode(':'.join(SWAIG_AUTH).encode()).decode()
+    connection.request('POST', '/swaig', body=body,
+                       headers={'Content-Type': 'application/json', 'Authorization': f'Basic {token}'})
+    response = connection.getresponse()
+    payload = response.read()
+    return response.status, json.loads(payload).get('response', '') if response.status == 200 else ''
+
+
+def outcome(function, status, text):
+    if status != 200:
+        return f'http {status}'
+    if 'temporarily unavailable' in text:
+        return 'unavailable'
+    if function == 'send_mfa_code':
+        return 'sent' if 'sent successfully' in text else 'send failed'
+    return 'verified' if 'verified successfully' in text else 'verify failed'
+
+
+def client_loop(port, number, stop, latencies, outcomes, lock, timeout):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    while not stop.is_set():
+        for function, arguments in (('send_mfa_code', {'to_number': f'+1555{number:07d}'}),
+                                    ('verify_mfa_code', {'token': '123456'})):
+            began = time.perf_counter()
+            try:
+                result = outcome(function, *swaig_call(connection, function, arguments))
+            except (OSError, http.client.HTTPException, ValueError):
+                result = 'client timeout/error'
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+            elapsed = time.perf_counter() - began
+            with lock:
+                latencies[function].append(elapsed)
+                outcomes[result] = outcomes.get(result, 0) + 1
+    connection.close()
+
+
+def run_profile(app_dir, stub, profile, args):
+    stub.set_profile(profile, hang=args.hang)
+    before = {endpoint: dict(counts) for endpoint, counts in stub.stats()['requests'].items()}
+    port = free_port()
+    os.environ['PORT'] = str(port)
+    server = start_server('gunicorn', app_dir, port, args.workers, args.threads)
+    try:
+        stop = threading.Event()
+        latencies = {'send_mfa_code': [], 'verify_mfa_code': []}
+        outcomes = {}
+        lock = threading.Lock()
+        clients = [threading.Thread(target=client_loop, args=(port, n, stop, latencies, outcomes, lock, args.hang + 30))
+                   for n in range(args.clients)]
+        for client in clients:
+            client.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for client in clients:
+            client.join()
+    finally:
+        stop_server(server)
+    reached = stub.stats()['requests']['mfa']['requests'] - before['mfa']['requests']
+    return latencies, outcomes, reached
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default='healthy,slow,flaky,down,hanging',
+                        help=f"comma-separated, from {', '.join(sorted(PROFILES))}")
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--outbound-timeout', type=float, default=3, help="the app's OUTBOUND_TIMEOUT")
+    parser.add_argument('--hang', type=float, default=30, help='how long a hanging carrier request takes')
+    args = parser.parse_args()
+
+    stub = StubSignalWire().start()
+    os.environ.update({
+        'SIGNALWIRE_BASE_URL': stub.url, 'SIGNALWIRE_SPACE': 'stub', 'SIGNALWIRE_PROJECT_ID': 'load-test',
+        'SIGNALWIRE_TOKEN': 'load-test', 'FROM_NUMBER': '+15550000000',
+        'HTTP_USERNAME': SWAIG_AUTH[0], 'HTTP_PASSWORD': SWAIG_AUTH[1],
+        'OUTBOUND_TIMEOUT': str(args.outbound_timeout), 'LOG_LEVEL': 'warning',
+    })
+    print(f'{args.clients} callers for {args.seconds:.0f}s per profile, outbound timeout {args.outbound_timeout}s, '
+          f'{args.workers} workers x {args.threads} threads')
+    print(f"{'profile':<10} {'calls/s':>8} {'send p50':>9} {'send p99':>9} {'verify p50':>10} {'at carrier':>10}  outcomes")
+    with tempfile.TemporaryDirectory() as tmp:
+        app_dir = prepare(tmp)
+        for profile in args.profiles.split(','):
+            latencies, outcomes, reached = run_profile(app_dir, stub, profile, args)
+            sends, verifies = latencies['send_mfa_code'], latencies['verify_mfa_code']
+
+            def pct(values, q):
+                return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else float('nan')
+            print(f'{profile:<10} {(len(sends) + len(verifies)) / args.seconds:8.1f} {pct(sends, 50):7.0f}ms '
+                  f'{pct(sends, 99):7.0f}ms {pct(verifies, 50):8.0f}ms {reached:10d}  '
+                  + ', '.join(f'{name} {count}' for name, count in sorted(outcomes.items())))
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark for single-flight coalescing of identical concurrent requests.
+
+Sends bursts of --concurrency identical requests at once through the Flask
+test client (one thread each, like a gthread worker) for a bill PDF and for
+the dentist dashboard, with coalescing on and off, and reports how many
+times the work actually ran and how long each burst took. The query cache is
+cleared before every dashboard burst so each one starts cold, as it would
+right after a write.
+
+    python benchmarks/coalescing_bench.py --concurrency 8 --bursts 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from query_cache_bench import create_database  # noqa: E402
+
+
+class Uncoalesced:
+    """Stands in for app.single_flight to measure every request doing its own work"""
+
+    def do(self, name, key, fn):
+        return fn()
+
+
+def burst(clients, path):
+    barrier = threading.Barrier(len(clients))
+    statuses = []
+
+    def request(client):
+        barrier.wait()
+        statuses.append(client.get(path).status_code)
+
+    threads = [threading.Thread(target=request, args=(client,)) for client in clients]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    if set(statuses) != {200}:
+        raise AssertionError(f'{path}: statuses {statuses}')
+    return elapsed
+
+
+def counted(module, name, calls):
+    """Wrap module.name so calls[0] counts how often it really runs"""
+    original = getattr(module, name)
+
+    def wrapper(*args):
+        calls[0] += 1
+        return original(*args)
+    setattr(module, name, wrapper)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--bursts', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, _, _ = create_database(os.path.join(tmp, 'dental_office.db'), args.patients)
+        bill_id = conn.execute('SELECT id FROM billing WHERE dentist_id = 1 LIMIT 1').fetchone()[0]
+        conn.close()
+        os.chdir(tmp)  # app opens dental_office.db and its cache files in the working directory
+        import app
+
+        clients = []
+        for _ in range(args.concurrency):
+            client = app.app.test_client()
+            with client.session_transaction() as session:
+                session['user_id'] = 1
+                session['user_type'] = 'dentist'
+            clients.append(client)
+
+        renders, dashboards = [0], [0]
+        counted(app, 'render_bill_pdf', renders)
+        counted(app, 'dentist_dashboard_data', dashboards)
+        coalescing = app.single_flight
+
+        print(f"{args.concurrency} identical requests per burst, {args.bursts} bursts")
+        print(f"{'request':<18} {'mode':<12} {'runs/burst':>10} {'burst p50':>10} {'burst max':>10}")
+        for label, path, calls, cold in (('bill pdf', f'/api/bill-pdf/{bill_id}', renders, False),
+                                         ('dentist dashboard', '/dentist/dashboard', dashboards, True)):
+            for mode, flight in (('uncoalesced', Uncoalesced()), ('coalesced', coalescing)):
+                app.single_flight = flight
+                calls[0] = 0
+                times = []
+                for _ in range(args.bursts):
+                    if cold:
+                        app.query_cache.clear()
+                    times.append(burst(clients, path))
+                print(f'{label:<18} {mode:<12} {calls[0] / args.bursts:10.1f} '
+                      f'{statistics.median(times) * 1000:8.1f}ms {max(times) * 1000:8.1f}ms')
+        print(coalescing.stats())
+
+
+if __name__ == '__main__':
+    main()
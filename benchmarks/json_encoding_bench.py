@@ -0,0 +1,99 @@
+"""Micro-benchmark for API row encoding.
+
+Compares the old `jsonify([dict(r) for r in rows])` path (Flask's default JSON
+provider) with json_encoding: jsonify on sqlite3.Row values through
+RowJSONProvider, and dump_rows straight from a cursor. The new paths run with
+orjson when it is installed and again with the stdlib encoder.
+
+    python benchmarks/json_encoding_bench.py --rows 2000 --repeat 50
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+
+import json_encoding  # noqa: E402
+from json_encoding import RowJSONProvider, dump_rows  # noqa: E402
+
+QUERY = 'SELECT * FROM appointments ORDER BY start_time DESC'
+
+
+def create_database(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('''
+        CREATE TABLE appointments (
+            id INTEGER PRIMARY KEY, patient_id INTEGER, dentist_id INTEGER, service_id INTEGER,
+            start_time TEXT, end_time TEXT, status TEXT, notes TEXT, service_name TEXT,
+            dentist_first_name TEXT, dentist_last_name TEXT, price REAL, sms_reminder INTEGER
+        )
+    ''')
+    conn.executemany(
+        'INSERT INTO appointments VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(1000000 + i % 500, 1 + i % 7, 1 + i % 12,
+          f'2024-{1 + i % 12:02d}-{1 + i % 28:02d} {8 + i % 9:02d}:00:00',
+          f'2024-{1 + i % 12:02d}-{1 + i % 28:02d} {9 + i % 9:02d}:00:00',
+          ('scheduled', 'completed', 'cancelled')[i % 3], f'Visit notes for appointment {i} — follow up',
+          'Regular Cleaning', 'Sarah', 'Johnson', 120.0 + i % 50, i % 2)
+         for i in range(rows)]
+    )
+    return conn
+
+
+def measure(label, repeat, func, baseline=None):
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = len(func())
+    per_call = (time.perf_counter() - start) / repeat * 1000
+    speedup = f'  {baseline / per_call:4.1f}x' if baseline else ''
+    print(f'  {label:<44} {per_call:8.2f} ms  {size:>9} bytes{speedup}')
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    conn = create_database(args.rows)
+    old_app = Flask('old')
+    new_app = Flask('new')
+    new_app.json = RowJSONProvider(new_app)
+
+    def old_path():
+        with old_app.app_context():
+            rows = conn.execute(QUERY).fetchall()
+            return jsonify([dict(r) for r in rows]).get_data()
+
+    def new_jsonify():
+        with new_app.app_context():
+            return jsonify(conn.execute(QUERY).fetchall()).get_data()
+
+    def new_dump_rows():
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return dump_rows(cursor.execute(QUERY)).encode()
+
+    print(f'{args.rows} rows, {args.repeat} runs each')
+    baseline = measure('[dict(r) for r in rows] + jsonify (old)', args.repeat, old_path)
+
+    accelerated = json_encoding.orjson
+    encoders = [('orjson', accelerated), ('stdlib', None)] if accelerated else [('stdlib', None)]
+    for name, module in encoders:
+        json_encoding.orjson = module
+        measure(f'jsonify(rows) via RowJSONProvider [{name}]', args.repeat, new_jsonify, baseline)
+        measure(f'dump_rows(tuple cursor) [{name}]', args.repeat, new_dump_rows, baseline)
+    json_encoding.orjson = accelerated
+    if accelerated is None:
+        print('orjson is not installed; only the stdlib encoder was measured')
+
+
+if __name__ == '__main__':
+    main()
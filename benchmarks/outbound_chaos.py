@@ -0,0 +1,151 @@
+"""Failure-injection test of the outbound layer (outbound.py) against a local server.
+
+Runs a throwaway HTTP server whose behaviour can be switched between healthy,
+slow (sleeps past the timeout) and failing (HTTP 503), then checks that:
+
+1. a slow endpoint costs at most its timeout, never the server's delay;
+2. after --failures consecutive failures the circuit opens and calls fail
+   in well under a millisecond without touching the network;
+3. after --reset seconds a single half-open probe goes through, reopening the
+   circuit while the server still fails and closing it once it recovers;
+4. inside a request, a call gets no more than what is left of the budget and
+   is not attempted at all once the budget is spent;
+5. the SignalWire SDK client (when installed) goes through the same breakers,
+   with media messages classed as MMS.
+
+    python benchmarks/outbound_chaos.py --timeout 1 --reset 1
+"""
+import argparse
+import http.server
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbound import Outbound, CircuitOpenError, DeadlineExceeded, RESPONSE_RESERVE  # noqa: E402
+
+
+class Behaviour:
+    mode = 'healthy'
+    delay = 5.0
+    hits = 0
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        Behaviour.hits += 1
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if Behaviour.mode == 'slow':
+            time.sleep(Behaviour.delay)
+        status = 503 if Behaviour.mode == 'failing' else 201
+        body = b'{"sid": "SM1", "status": "queued"}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def timed(fn):
+    began = time.perf_counter()
+    try:
+        result = fn()
+    except Exception as e:
+        result = e
+    return result, time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timeout', type=float, default=1.0, help='per-call timeout for every endpoint class')
+    parser.add_argument('--failures', type=int, default=3, help='consecutive failures that open a circuit')
+    parser.add_argument('--reset', type=float, default=1.0, help='seconds before an open circuit probes')
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/Messages'
+    outbound = Outbound(timeouts={'mfa': args.timeout, 'sms': args.timeout, 'mms': args.timeout},
+                        failure_threshold=args.failures, reset_timeout=args.reset)
+    breaker = outbound.breakers['sms']
+    ok = True
+
+    def check(condition, message):
+        nonlocal ok
+        print(('ok   ' if condition else 'FAIL ') + message)
+        ok = ok and condition
+
+    def post():
+        return outbound.post('sms', url, data={'To': '+15550100', 'Body': 'chaos'})
+
+    response, elapsed = timed(post)
+    check(getattr(response, 'status_code', None) == 201, f'healthy call succeeds ({elapsed * 1000:.0f}ms)')
+
+    Behaviour.mode = 'slow'
+    Behaviour.delay = args.timeout * 10
+    result, elapsed = timed(post)
+    check(elapsed < args.timeout * 2 and isinstance(result, Exception),
+          f'slow call gives up after {elapsed:.2f}s (timeout {args.timeout}s, server delay {Behaviour.delay:.1f}s)')
+
+    Behaviour.mode = 'failing'
+    for _ in range(args.failures - 1):
+        post()
+    check(breaker.state == 'open', f'circuit opens after {args.failures} consecutive failures (state {breaker.state})')
+    hits = Behaviour.hits
+    rejections = [timed(post) for _ in range(1000)]
+    check(all(isinstance(result, CircuitOpenError) for result, _ in rejections) and Behaviour.hits == hits,
+          f'open circuit fails fast without network calls '
+          f'(mean {sum(elapsed for _, elapsed in rejections) / len(rejections) * 1e6:.1f}us per call)')
+
+    time.sleep(args.reset)
+    hits = Behaviour.hits
+    post()
+    check(Behaviour.hits == hits + 1 and breaker.state == 'open', 'half-open probe reaches the failing server and reopens')
+
+    Behaviour.mode = 'healthy'
+    time.sleep(args.reset)
+    response, _ = timed(post)
+    check(getattr(response, 'status_code', None) == 201 and breaker.state == 'closed', 'probe against the recovered server closes it')
+
+    Behaviour.mode = 'slow'
+    outbound.start_request(budget=RESPONSE_RESERVE + args.timeout * 0.6)
+    result, elapsed = timed(post)
+    check(not isinstance(result, DeadlineExceeded) and elapsed < args.timeout * 0.8,
+          f'call inside a request is cut to the remaining budget ({elapsed:.2f}s of {args.timeout}s)')
+    outbound.start_request(budget=0.2)
+    hits = Behaviour.hits
+    result, elapsed = timed(post)
+    check(isinstance(result, DeadlineExceeded) and Behaviour.hits == hits, 'no call once the request budget is spent')
+    outbound.end_request()
+    Behaviour.mode = 'healthy'
+
+    try:
+        from signalwire.rest import Client
+    except ImportError:
+        print('skip signalwire SDK not installed')
+    else:
+        client = Client('project', 'token', signalwire_space_url=f'127.0.0.1:{server.server_port}',
+                        http_client=outbound.signalwire_http_client())
+        client.api.base_url = f'http://127.0.0.1:{server.server_port}'
+        calls = outbound.breakers['mms'].counters['calls']
+        try:
+            client.messages.create(from_='+15550100', to='+15550101', body='chaos', media_url=['http://example.invalid/a.jpg'])
+        except Exception as e:
+            print(f'     SDK call raised {type(e).__name__}: {e}')
+        check(outbound.breakers['mms'].counters['calls'] == calls + 1, 'SDK media message counted against the MMS breaker')
+
+    for endpoint, stats in outbound.stats()['endpoints'].items():
+        print(f'  {endpoint}: {stats}')
+    server.shutdown()
+    print('OK' if ok else 'FAILED')
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,133 @@
+"""Concurrency stress test for the payment posting engine.
+
+Many threads, each with its own SQLite connection (like separate gunicorn
+workers), pay the same bill at once. Afterwards the bill balance must equal the
+original balance minus the sum of the accepted payments, no payment may push the
+balance below zero, and retried idempotency keys must never post twice.
+
+    python benchmarks/payment_stress.py --payers 32 --payments 25
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_migrate import migrate  # noqa: E402
+from payments import post_payment, PaymentError  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def create_database(path, balance):
+    conn = connect(path)
+    with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.execute('''
+        INSERT INTO patients (id, first_name, last_name, email, phone, address, date_of_birth,
+                              password_hash, password_salt, patient_id)
+        VALUES (1, 'Load', 'Test', 'load@test', '555-0100', '1 Test St', '1990-01-01', 'x', 'x', '1000001')
+    ''')
+    conn.execute("INSERT INTO dental_services (id, name, description, price, type) VALUES (1, 'Cleaning', '', 100, 'cleaning')")
+    conn.execute("INSERT INTO payment_methods (id, patient_id, method_type, card_number) VALUES (1, 1, 'credit_card', '4111')")
+    conn.execute('''
+        INSERT INTO billing (id, patient_id, service_id, amount, patient_portion, status, due_date, reference_number, bill_number)
+        VALUES (1, 1, 1, ?, ?, 'pending', datetime('now', '+30 days'), 'REF_STRESS', '100001')
+    ''', (balance, balance))
+    conn.commit()
+    conn.close()
+
+
+def run(payers, payments_per_payer, amount, balance, retry_every):
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        create_database(path, balance)
+        accepted = []
+        rejected = []
+        replayed = []
+        errors = []
+        lock = threading.Lock()
+        start = threading.Barrier(payers)
+
+        def payer(worker):
+            conn = connect(path)
+            start.wait()
+            for i in range(payments_per_payer):
+                key = f'{worker}-{i}'
+                attempts = 2 if retry_every and i % retry_every == 0 else 1
+                for _ in range(attempts):
+                    try:
+                        result = post_payment(conn, 1, 1, 1, amount, idempotency_key=key)
+                    except PaymentError as e:
+                        with lock:
+                            rejected.append(e.status)
+                        break
+                    except sqlite3.Error as e:
+                        with lock:
+                            errors.append(str(e))
+                        break
+                    with lock:
+                        (replayed if result['replayed'] else accepted).append(result['amount'])
+            conn.close()
+
+        threads = [threading.Thread(target=payer, args=(n,)) for n in range(payers)]
+        began = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - began
+
+        conn = connect(path)
+        bill = conn.execute('SELECT patient_portion, status FROM billing WHERE id = 1').fetchone()
+        posted = conn.execute('SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM payments WHERE billing_id = 1').fetchone()
+        conn.close()
+
+        attempts = len(accepted) + len(replayed) + len(rejected) + len(errors)
+        print(f'payers={payers} attempts={attempts} elapsed={elapsed:.2f}s throughput={attempts / elapsed:.0f} ops/s')
+        print(f'accepted={len(accepted)} replayed={len(replayed)} rejected={len(rejected)} errors={len(errors)}')
+        print(f"final balance=${bill['patient_portion']:.2f} status={bill['status']} "
+              f'posted rows={posted[0]} posted total=${posted[1]:.2f}')
+
+        ok = True
+        if round(balance - posted[1], 2) != round(bill['patient_portion'], 2):
+            print('FAIL: balance does not match posted payments')
+            ok = False
+        if bill['patient_portion'] < 0:
+            print('FAIL: balance went negative')
+            ok = False
+        if posted[0] != len(accepted):
+            print('FAIL: a replayed idempotency key posted a second payment')
+            ok = False
+        if errors:
+            print(f'FAIL: database errors, first: {errors[0]}')
+            ok = False
+        print('OK' if ok else 'FAILED')
+        return ok
+    finally:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payers', type=int, default=16)
+    parser.add_argument('--payments', type=int, default=20, help='payments per payer')
+    parser.add_argument('--amount', type=float, default=5.00)
+    parser.add_argument('--balance', type=float, default=1000.00)
+    parser.add_argument('--retry-every', type=int, default=3, help='resend every Nth payment with the same key')
+    args = parser.parse_args()
+    sys.exit(0 if run(args.payers, args.payments, args.amount, args.balance, args.retry_every) else 1)
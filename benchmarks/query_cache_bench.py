@@ -0,0 +1,188 @@
+"""Benchmark for the query-result cache (query_cache.py) on app's cached reads.
+
+Builds a practice with --patients patients and calls the dentist dashboard,
+the patient history page and the SWAIG bill lookup the way they are used: a
+dashboard refreshed by several dentists, and the same caller's bills asked for
+a few times in one phone call. Each workload runs uncached, cached, and cached
+with a write every --write-every reads; the mixed run is then replayed
+checking every cached result against a fresh query. Also times what the
+table_versions triggers add to a write.
+
+    python benchmarks/query_cache_bench.py --patients 2000 --reads 600
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db_migrate import migrate  # noqa: E402
+
+DENTISTS = 8
+SERVICES = 12
+TYPES = ('checkup', 'cleaning', 'filling', 'extraction', 'root_canal', 'whitening', 'orthodontics', 'other')
+STATUSES = ('scheduled', 'completed', 'completed', 'cancelled')
+
+BILLS_QUERY = '''
+    SELECT b.*, s.name as service_name, th.diagnosis, th.treatment_date
+    FROM billing b
+    JOIN dental_services s ON b.service_id = s.id
+    LEFT JOIN dentists d ON b.dentist_id = d.id
+    LEFT JOIN treatment_history th ON b.reference_number = th.reference_number
+    WHERE b.patient_id = ?
+    ORDER BY b.due_date DESC
+'''
+
+
+def create_database(path, patients):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.executemany("INSERT INTO dental_services (id, name, description, price, type) VALUES (?, ?, '', 100, ?)",
+                     [(s, f'Service {s}', TYPES[s % len(TYPES)]) for s in range(1, SERVICES + 1)])
+    conn.executemany(
+        'INSERT INTO dentists (id, first_name, last_name, email, phone, license_number, working_hours, '
+        "password_hash, password_salt) VALUES (?, ?, 'Bench', ?, '555-0200', ?, '{}', 'x', 'x')",
+        [(d, f'Dentist{d}', f'd{d}@bench', f'LIC{d}') for d in range(1, DENTISTS + 1)]
+    )
+    conn.executemany("INSERT INTO patients (id, first_name, last_name, email, phone, address, date_of_birth, "
+                     "password_hash, password_salt, patient_id) VALUES (?, 'P', ?, ?, '555', 'x', '1990-01-01', 'x', 'x', ?)",
+                     [(p, f'Bench{p}', f'p{p}@bench', str(p)) for p in range(1, patients + 1)])
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    appointments, treatments, bills, payments = [], [], [], []
+    for p in range(1, patients + 1):
+        for visit in range(rng.randint(3, 12)):
+            dentist, service = rng.randint(1, DENTISTS), rng.randint(1, SERVICES)
+            start = now + timedelta(days=rng.randint(-700, 60), hours=rng.randint(-6, 6))
+            appointments.append((p, dentist, service, TYPES[service % len(TYPES)], rng.choice(STATUSES),
+                                 start.strftime('%Y-%m-%d %H:%M:%S'), (start + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')))
+            if start < now:
+                reference = f'REF-{p}-{visit}'
+                treatments.append((p, dentist, service, start.strftime('%Y-%m-%d'), 'Diagnosis', 'Notes', reference))
+                amount = round(rng.uniform(50, 900), 2)
+                bills.append((p, dentist, service, amount, amount, rng.choice(('paid', 'pending', 'partial')),
+                              (start + timedelta(days=30)).strftime('%Y-%m-%d'), reference))
+    conn.executemany('INSERT INTO appointments (patient_id, dentist_id, service_id, type, status, start_time, end_time) '
+                     'VALUES (?, ?, ?, ?, ?, ?, ?)', appointments)
+    conn.executemany('INSERT INTO treatment_history (patient_id, dentist_id, service_id, treatment_date, diagnosis, '
+                     'treatment_notes, reference_number) VALUES (?, ?, ?, ?, ?, ?, ?)', treatments)
+    conn.executemany('INSERT INTO billing (patient_id, dentist_id, service_id, amount, patient_portion, status, due_date, '
+                     'reference_number) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', bills)
+    for bill_id, patient_id, amount in conn.execute("SELECT id, patient_id, amount FROM billing WHERE status != 'pending'"):
+        payments.append((bill_id, patient_id, amount / 2, f'TX-{bill_id}'))
+    conn.executemany("INSERT INTO payments (billing_id, patient_id, amount, payment_date, payment_method_type, status, "
+                     "transaction_id) VALUES (?, ?, ?, '2024-01-01', 'credit_card', 'completed', ?)", payments)
+    conn.commit()
+    conn.execute('ANALYZE')
+    return conn, len(appointments), len(bills)
+
+
+def rows(value):
+    """Comparable form of a cached result (sqlite3.Row compares by identity)"""
+    if isinstance(value, sqlite3.Row):
+        return tuple(value)
+    if isinstance(value, (list, tuple)):
+        return [rows(item) for item in value]
+    if isinstance(value, dict):
+        return {key: rows(item) for key, item in value.items()}
+    return value
+
+
+def write(conn, rng):
+    """A write touching the tables every workload reads, like a booking or a payment would"""
+    conn.execute("UPDATE appointments SET notes = ? WHERE id = ?", (f'note {rng.random()}', rng.randint(1, 1000)))
+    conn.execute("UPDATE billing SET status = status WHERE id = ?", (rng.randint(1, 1000),))
+    conn.commit()
+
+
+def run(conn, calls, cached, write_every):
+    rng = random.Random(3)
+    began = time.perf_counter()
+    for n, (func, args) in enumerate(calls, 1):
+        (func if cached else func.uncached)(conn, *args)
+        if write_every and n % write_every == 0:
+            write(conn, rng)
+    return (time.perf_counter() - began) / len(calls) * 1000
+
+
+def verify(label, conn, calls, write_every):
+    """Replay the mixed run untimed, comparing every cached result with a fresh query"""
+    rng = random.Random(3)
+    for n, (func, args) in enumerate(calls, 1):
+        if rows(func(conn, *args)) != rows(func.uncached(conn, *args)):
+            raise AssertionError(f'{label}: cached result of {func.__name__}{args} differs from the database')
+        if write_every and n % write_every == 0:
+            write(conn, rng)
+
+
+def workloads(patients, reads):
+    import app
+    rng = random.Random(5)
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    dashboard = [(app.dentist_dashboard_data, (rng.randint(1, 3), today)) for _ in range(reads)]
+    history = [(app.patient_history_data, (rng.randint(1, 20),)) for _ in range(reads)]
+    # One call asks for the same bills about three times
+    bills = [(app.swaig_bill_rows, (BILLS_QUERY, (patient,)))
+             for patient in rng.sample(range(1, patients + 1), max(1, reads // 3)) for _ in range(3)]
+    return app, (('dentist dashboard', dashboard), ('patient history', history), ('swaig bills', bills))
+
+
+def trigger_cost(conn, updates):
+    def timed():
+        began = time.perf_counter()
+        for n in range(updates):
+            conn.execute("UPDATE appointments SET notes = ? WHERE id = ?", (f'n{n}', n % 1000 + 1))
+            conn.commit()
+        return (time.perf_counter() - began) / updates * 1e6
+    with_triggers = timed()
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'appointments_version_%'").fetchall():
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.commit()
+    return with_triggers, timed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--reads', type=int, default=600, help='calls per workload')
+    parser.add_argument('--write-every', type=int, default=20, help='reads between writes in the mixed runs')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, appointment_count, bill_count = create_database(os.path.join(tmp, 'bench.db'), args.patients)
+        print(f'{args.patients} patients, {appointment_count} appointments, {bill_count} bills')
+        os.chdir(tmp)  # app opens its shared cache file relative to the working directory
+        app, loads = workloads(args.patients, args.reads)
+        cache = app.query_cache
+
+        print(f"{'workload':<18} {'uncached':>10} {'cached':>10} {'+writes':>10}  hit rate (+writes)")
+        for label, calls in loads:
+            uncached = run(conn, calls, False, 0)
+            cache.clear()
+            cached = run(conn, calls, True, 0)
+            name = calls[0][0].query_name
+            read_only = cache.stats()['queries'][name]
+            cache.clear()
+            mixed = run(conn, calls, True, args.write_every)
+            counters = cache.stats()['queries'][name]
+            verify(label, conn, calls, args.write_every)
+            print(f'{label:<18} {uncached:8.3f}ms {cached:8.3f}ms {mixed:8.3f}ms  '
+                  f"{read_only['hit_rate']:.0%} ({counters['hit_rate']:.0%}, {counters['stale']} stale)")
+        stats = cache.stats()
+        print(f"cache holds {stats['entries']} entries, ~{stats['bytes'] / 1024:.0f} KiB")
+
+        with_triggers, without = trigger_cost(conn, 2000)
+        print(f'appointment update + commit: {with_triggers:.1f}us with version triggers, {without:.1f}us without')
+
+
+if __name__ == '__main__':
+    main()
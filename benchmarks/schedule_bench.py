@@ -0,0 +1,135 @@
+"""Benchmark for the dentist schedule endpoint's query and bucketing.
+
+Compares schedule.dentist_schedule (one range scan over (dentist_id, start_time)
+plus single-pass bucketing) with the previous approach: fetch every appointment
+in the range and rescan the whole list for each day. The previous code queried
+columns that don't exist, so the baseline here uses start_time with the old loop.
+
+    python benchmarks/schedule_bench.py --dentists 6 --per-day 16
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_migrate import migrate  # noqa: E402
+from dentist_schedule import dentist_schedule, multi_dentist_schedule, _APPOINTMENT_QUERY  # noqa: E402
+from working_hours import sync_dentist_working_hours  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEEKDAY_HOURS = {day: {'start': '08:00', 'end': '17:00'}
+                 for day in ('monday', 'tuesday', 'wednesday', 'thursday', 'friday')}
+FIRST_DAY = datetime(2023, 1, 1)
+HISTORY_DAYS = 730
+
+
+def create_database(path, dentists, per_day):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    with open(os.path.join(ROOT, 'schema.sql'), 'r') as f:
+        conn.executescript(f.read())
+    migrate(conn)
+    conn.execute("INSERT INTO dental_services (id, name, description, price, type) VALUES (1, 'Checkup', '', 80, 'checkup')")
+    conn.executemany(
+        'INSERT INTO patients (id, first_name, last_name, email, phone, address, date_of_birth, '
+        'password_hash, password_salt, patient_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(1000000 + i, f'Patient{i}', 'Bench', f'p{i}@bench', '555-0100', '1 Bench St', '1990-01-01', 'x', 'x', str(1000000 + i))
+         for i in range(500)]
+    )
+    conn.executemany(
+        'INSERT INTO dentists (id, first_name, last_name, email, phone, license_number, working_hours, '
+        'password_hash, password_salt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(d, f'Dentist{d}', 'Bench', f'd{d}@bench', '555-0200', f'LIC{d}', json.dumps(WEEKDAY_HOURS), 'x', 'x')
+         for d in range(1, dentists + 1)]
+    )
+    for d in range(1, dentists + 1):
+        sync_dentist_working_hours(conn, d)
+    rows = []
+    rng = random.Random(7)
+    for offset in range(HISTORY_DAYS):
+        day = FIRST_DAY + timedelta(days=offset)
+        if day.weekday() >= 5:
+            continue
+        for dentist in range(1, dentists + 1):
+            for slot in range(per_day):
+                start = day + timedelta(hours=8, minutes=30 * slot)
+                rows.append((1000000 + rng.randrange(500), dentist, 1, 'checkup', 'scheduled',
+                             start.strftime('%Y-%m-%d %H:%M:%S'),
+                             (start + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M:%S')))
+    conn.executemany(
+        'INSERT INTO appointments (patient_id, dentist_id, service_id, type, status, start_time, end_time) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+    )
+    conn.commit()
+    conn.execute('ANALYZE')
+    return conn, len(rows)
+
+
+def old_schedule(db, dentist, start_date, end_date):
+    working_hours = json.loads(dentist['working_hours'])
+    appointments = db.execute(_APPOINTMENT_QUERY, (
+        dentist['id'], start_date.strftime('%Y-%m-%d'), (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+    )).fetchall()
+    schedule = []
+    current_date = start_date
+    while current_date <= end_date:
+        day_of_week = current_date.strftime('%A').lower()
+        date_str = current_date.strftime('%Y-%m-%d')
+        if day_of_week in working_hours:
+            day_schedule = {'date': date_str, 'working_hours': working_hours[day_of_week], 'appointments': []}
+            for appointment in appointments:
+                if appointment['start_time'][:10] == date_str:
+                    day_schedule['appointments'].append(dict(appointment))
+            schedule.append(day_schedule)
+        current_date += timedelta(days=1)
+    return schedule
+
+
+def measure(label, repeat, func, baseline=None):
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_call = (time.perf_counter() - start) / repeat * 1000
+    speedup = f'  {baseline / per_call:6.1f}x' if baseline else ''
+    print(f'  {label:<34} {per_call:9.2f} ms{speedup}')
+    return per_call, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dentists', type=int, default=6)
+    parser.add_argument('--per-day', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, total = create_database(os.path.join(tmp, 'bench.db'), args.dentists, args.per_day)
+        print(f'{total} appointments, {args.dentists} dentists')
+        plan = conn.execute('EXPLAIN QUERY PLAN ' + _APPOINTMENT_QUERY, (1, '2024-01-01', '2024-04-01')).fetchall()
+        print('  plan: ' + '; '.join(row[3] for row in plan))
+
+        dentist = conn.execute('SELECT id, working_hours FROM dentists WHERE id = 1').fetchone()
+        start_date = FIRST_DAY + timedelta(days=365)
+        for label, days in (('quarter', 91), ('year', 365)):
+            end_date = start_date + timedelta(days=days - 1)
+            print(f'{label} ({days} days):')
+            baseline, old = measure('old per-day rescan', args.repeat, lambda: old_schedule(conn, dentist, start_date, end_date))
+            _, new = measure('range scan + bucketing', args.repeat,
+                             lambda: dentist_schedule(conn, 1, start_date, end_date), baseline)
+            assert [(d['date'], d['appointments']) for d in old] == [(d['date'], d['appointments']) for d in new], \
+                'schedules differ'
+            measure(f'all {args.dentists} dentists', args.repeat,
+                    lambda: multi_dentist_schedule(conn, None, start_date, end_date))
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""Throughput of the Werkzeug dev server against the gunicorn production config.
+
+Copies the app into a temp directory (its own database, logs and lock file),
+loads the test data, then starts each server in turn and drives it with
+concurrent keep-alive clients for a fixed time:
+
+- dev: what `python app.py` runs (debug mode, reloader and debugger on);
+- gunicorn: `gunicorn -c gunicorn.conf.py` (gthread workers, preloaded app).
+
+    python benchmarks/serving_bench.py --clients 32 --seconds 10 --path /login
+"""
+import argparse
+import http.client
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COPY_IGNORE = shutil.ignore_patterns('.git', 'venv', '.venv', '__pycache__', 'logs', '*.db', '*.db-*', '*.lock',
+                                     'benchmarks', '.jinja_cache')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare(workdir):
+    app_dir = os.path.join(workdir, 'app')
+    shutil.copytree(ROOT, app_dir, ignore=COPY_IGNORE)
+    for script in ('init_db.py', 'init_test_data.py'):
+        subprocess.run([sys.executable, script], cwd=app_dir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return app_dir
+
+
+def wait_ready(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def start_server(mode, app_dir, port, workers, threads):
+    env = dict(os.environ, PORT=str(port))
+    if mode == 'dev':
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--debug', '--host', '127.0.0.1',
+                   '--port', str(port)]
+    else:
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py']
+        if workers:
+            env['WEB_CONCURRENCY'] = str(workers)
+        if threads:
+            env['GUNICORN_THREADS'] = str(threads)
+    process = subprocess.Popen(command, cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    wait_ready(port, process)
+    return process
+
+
+def stop_server(process):
+    # The reloader and gunicorn both run child processes; stop the whole group
+    try:
+        os.killpg(process.pid, 15)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, 9)
+
+
+def load(port, path, clients, seconds):
+    """Returns (requests, errors, reconnects, latencies in ms).
+
+    A kept-alive connection the server dropped between requests (e.g. a gunicorn
+    worker recycled by max_requests) counts as a reconnect, not an error.
+    """
+    latencies, errors, reconnects = [], [0], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + seconds
+
+    def client():
+        conn = None
+        mine = []
+        failed = dropped = 0
+        while time.monotonic() < stop_at:
+            reused = conn is not None
+            if conn is None:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            began = time.perf_counter()
+            try:
+                conn.request('GET', path)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failed += 1
+                else:
+                    mine.append((time.perf_counter() - began) * 1000)
+                if response.will_close:
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException):
+                if reused:
+                    dropped += 1
+                else:
+                    failed += 1
+                conn.close()
+                conn = None
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+            reconnects[0] += dropped
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies), errors[0], reconnects[0], sorted(latencies)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32, help='concurrent keep-alive clients')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--path', default='/login', help='page to request')
+    parser.add_argument('--workers', type=int, help='gunicorn workers (default: gunicorn.conf.py, one per core)')
+    parser.add_argument('--threads', type=int, help='threads per gunicorn worker')
+    parser.add_argument('--modes', default='dev,gunicorn')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app_dir = prepare(workdir)
+        baseline = None
+        for mode in args.modes.split(','):
+            port = free_port()
+            process = start_server(mode, app_dir, port, args.workers, args.threads)
+            try:
+                load(port, args.path, args.clients, 1)  # warm up
+                requests, errors, reconnects, latencies = load(port, args.path, args.clients, args.seconds)
+            finally:
+                stop_server(process)
+            rate = requests / args.seconds
+            speedup = f'  {rate / baseline:5.1f}x' if baseline else ''
+            baseline = baseline or rate
+            print(f'{mode:<9} {rate:8.0f} req/s  p50 {percentile(latencies, 0.5):7.1f} ms  '
+                  f'p99 {percentile(latencies, 0.99):7.1f} ms  errors {errors}  reconnects {reconnects}{speedup}')
+
+
+if __name__ == '__main__':
+    main()
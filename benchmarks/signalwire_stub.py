@@ -0,0 +1,283 @@
+"""Local stand-in for the SignalWire REST API, for load tests and benchmarks.
+
+Implements the subset the app uses:
+
+    POST /api/relay/rest/mfa/sms                    send an MFA code
+    POST /api/relay/rest/mfa/<id>/verify            check a code
+    POST [/api/laml]/2010-04-01/Accounts/<project>/Messages[.json]
+                                                    create an SMS, or an MMS
+                                                    with MediaUrl, which is
+                                                    then fetched like the
+                                                    carrier would
+
+plus control endpoints for the test driving it:
+
+    GET  /__stub/stats                              requests, messages, fetches
+    GET  /__stub/mfa/<id>                           the code "sent" to a phone
+    POST /__stub/profile                            {"profile": "flaky",
+                                                     "endpoint": "sms", ...}
+
+Every endpoint class (mfa, sms, mms, media) has a latency/error profile:
+base latency plus jitter, a fraction of requests answered with an error
+status, and a fraction that hang for a long time. Presets: healthy, slow,
+flaky, throttled, down, hanging. Point the app at it with
+SIGNALWIRE_BASE_URL=http://127.0.0.1:<port> (SIGNALWIRE_SPACE,
+SIGNALWIRE_PROJECT_ID and SIGNALWIRE_TOKEN may be anything).
+
+    python benchmarks/signalwire_stub.py --port 9999 --profile flaky
+    python benchmarks/signalwire_stub.py --profile healthy --mms-profile slow
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from dataclasses import dataclass, asdict, replace
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+ENDPOINTS = ('mfa', 'sms', 'mms', 'media')
+
+
+@dataclass(frozen=True)
+class Profile:
+    latency: float = 0.05  # seconds before every answer
+    jitter: float = 0.02  # plus up to this much, uniformly
+    error_rate: float = 0.0  # fraction answered with error_status
+    error_status: int = 503
+    hang_rate: float = 0.0  # fraction that wait hang seconds before answering
+    hang: float = 60.0
+
+
+PROFILES = {
+    'healthy': Profile(),
+    'slow': Profile(latency=2.0, jitter=1.0),
+    'flaky': Profile(latency=0.1, jitter=0.1, error_rate=0.3),
+    'throttled': Profile(error_rate=0.5, error_status=429),
+    'down': Profile(error_rate=1.0),
+    'hanging': Profile(hang_rate=1.0),
+}
+
+MESSAGES_PATH = re.compile(r'^(?:/api/laml)?/2010-04-01/Accounts/([^/]+)/Messages(?:\.json)?$')
+MFA_VERIFY_PATH = re.compile(r'^/api/relay/rest/mfa/([^/]+)/verify$')
+
+
+class StubSignalWire:
+    """The stand-in server; start() runs it on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, profile='healthy', mfa_code='123456', media_delay=1.0, seed=None):
+        self.profiles = {endpoint: PROFILES[profile] for endpoint in ENDPOINTS}
+        self.mfa_code = mfa_code  # None: a random code per request, readable at /__stub/mfa/<id>
+        self.media_delay = media_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.mfa = {}
+        self.messages = []
+        self.media_fetches = []
+        self.requests = {endpoint: {'requests': 0, 'errors': 0, 'hangs': 0} for endpoint in ENDPOINTS}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def set_profile(self, profile='healthy', endpoint=None, **overrides):
+        """Switch one endpoint class (or all) to a preset, optionally overriding its fields"""
+        chosen = replace(PROFILES[profile], **overrides)
+        with self.lock:
+            for name in ([endpoint] if endpoint else ENDPOINTS):
+                self.profiles[name] = chosen
+
+    def stats(self):
+        with self.lock:
+            return {
+                'profiles': {endpoint: asdict(profile) for endpoint, profile in self.profiles.items()},
+                'requests': {endpoint: dict(counts) for endpoint, counts in self.requests.items()},
+                'mfa_sent': len(self.mfa),
+                'mfa_verified': sum(1 for entry in self.mfa.values() if entry['verified']),
+                'messages': len(self.messages),
+                'media_fetches': list(self.media_fetches),
+            }
+
+    def _delay(self, endpoint):
+        """Apply the endpoint's profile; returns an error status to answer with, or None"""
+        with self.lock:
+            profile = self.profiles[endpoint]
+            counts = self.requests[endpoint]
+            counts['requests'] += 1
+            roll = self.random.random()
+            hang = roll < profile.hang_rate
+            error = not hang and self.random.random() < profile.error_rate
+            wait = profile.hang if hang else profile.latency + self.random.uniform(0, profile.jitter)
+            counts['hangs'] += hang
+            counts['errors'] += error
+        time.sleep(wait)
+        return profile.error_status if error else None
+
+    def _send_mfa(self, body):
+        mfa_id = str(uuid.uuid4())
+        code = self.mfa_code or f'{self.random.randrange(10 ** 6):06d}'
+        with self.lock:
+            self.mfa[mfa_id] = {'to': body.get('to'), 'code': code, 'attempts': 0, 'verified': False,
+                                'max_attempts': int(body.get('max_attempts') or 3)}
+        return 200, {'id': mfa_id, 'success': True, 'to': body.get('to'), 'channel': 'sms'}
+
+    def _verify_mfa(self, mfa_id, body):
+        with self.lock:
+            entry = self.mfa.get(mfa_id)
+            if entry is None:
+                return 404, {'success': False, 'message': 'MFA request not found'}
+            entry['attempts'] += 1
+            if entry['attempts'] > entry['max_attempts']:
+                return 400, {'success': False, 'message': 'Too many attempts'}
+            entry['verified'] = entry['verified'] or str(body.get('token')) == entry['code']
+            return 200, {'success': entry['verified']}
+
+    def _create_message(self, project, form):
+        media = form.get('MediaUrl', [])
+        sid = 'SM' + uuid.uuid4().hex
+        now = formatdate(usegmt=True)
+        message = {
+            'sid': sid, 'account_sid': project, 'from': form.get('From', [None])[0], 'to': form.get('To', [None])[0],
+            'body': form.get('Body', [''])[0], 'num_media': str(len(media)), 'num_segments': '1',
+            'status': 'queued', 'direction': 'outbound-api', 'api_version': '2010-04-01',
+            'date_created': now, 'date_updated': now, 'date_sent': None, 'price': None, 'price_unit': 'USD',
+            'error_code': None, 'error_message': None, 'messaging_service_sid': None,
+            'uri': f'/api/laml/2010-04-01/Accounts/{project}/Messages/{sid}.json', 'subresource_uris': {},
+        }
+        with self.lock:
+            self.messages.append(dict(message, media_urls=media))
+        for url in media:
+            timer = threading.Timer(self.media_delay, self._fetch_media, args=(sid, url, time.monotonic()))
+            timer.daemon = True
+            timer.start()
+        return 201, message
+
+    def _fetch_media(self, sid, url, queued_at):
+        """Download a MediaUrl the way the carrier does when it delivers the MMS"""
+        status = self._delay('media')
+        began = time.monotonic()
+        fetch = {'sid': sid, 'url': url, 'after': round(began - queued_at, 3)}
+        if status:
+            fetch.update(status=None, error=f'injected {status}')
+        else:
+            try:
+                with urllib.request.urlopen(url, timeout=10) as response:
+                    fetch.update(status=response.status, bytes=len(response.read()))
+            except Exception as e:
+                fetch.update(status=getattr(e, 'code', None), error=str(e))
+        fetch['elapsed'] = round(time.monotonic() - began, 3)
+        with self.lock:
+            self.media_fetches.append(fetch)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up waiting, as it should on a hanging profile
+
+            def _body(self):
+                raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    return json.loads(raw or b'{}')
+                return parse_qs(raw.decode())
+
+            def _authorized(self):
+                header = self.headers.get('Authorization', '')
+                if not header.startswith('Basic '):
+                    return False
+                return ':' in base64.b64decode(header[6:]).decode(errors='replace')
+
+            def do_GET(self):
+                if self.path == '/__stub/stats':
+                    return self._reply(200, stub.stats())
+                match = re.match(r'^/__stub/mfa/([^/]+)$', self.path)
+                if match and match.group(1) in stub.mfa:
+                    return self._reply(200, {'code': stub.mfa[match.group(1)]['code']})
+                self._reply(404, {'message': 'Not found'})
+
+            def do_POST(self):
+                body = self._body()
+                if self.path == '/__stub/profile':
+                    body = dict(body)
+                    stub.set_profile(body.pop('profile', 'healthy'), body.pop('endpoint', None), **body)
+                    return self._reply(200, stub.stats()['profiles'])
+                if not self._authorized():
+                    return self._reply(401, {'message': 'Unauthorized'})
+                match = MESSAGES_PATH.match(self.path.split('?')[0])
+                if self.path == '/api/relay/rest/mfa/sms':
+                    endpoint = 'mfa'
+                elif MFA_VERIFY_PATH.match(self.path):
+                    endpoint = 'mfa'
+                elif match:
+                    endpoint = 'mms' if body.get('MediaUrl') else 'sms'
+                else:
+                    return self._reply(404, {'message': f'No stub for {self.path}'})
+
+                error = stub._delay(endpoint)
+                if error:
+                    return self._reply(error, {'code': error, 'message': 'Injected failure', 'status': error})
+                if self.path == '/api/relay/rest/mfa/sms':
+                    return self._reply(*stub._send_mfa(body))
+                if match:
+                    return self._reply(*stub._create_message(match.group(1), body))
+                return self._reply(*stub._verify_mfa(MFA_VERIFY_PATH.match(self.path).group(1), body))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='healthy', help='for every endpoint class')
+    for endpoint in ENDPOINTS:
+        parser.add_argument(f'--{endpoint}-profile', choices=sorted(PROFILES), help=f'override for {endpoint}')
+    parser.add_argument('--mfa-code', default='123456', help="code every MFA request 'sends' ('' for random codes)")
+    parser.add_argument('--media-delay', type=float, default=1.0, help='seconds before a MediaUrl is fetched')
+    args = parser.parse_args()
+
+    stub = StubSignalWire(args.host, args.port, args.profile, args.mfa_code or None, args.media_delay)
+    for endpoint in ENDPOINTS:
+        if getattr(args, f'{endpoint}_profile'):
+            stub.set_profile(getattr(args, f'{endpoint}_profile'), endpoint)
+    print(f'SignalWire stand-in on {stub.url} ({args.profile}); SIGNALWIRE_BASE_URL={stub.url}')
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
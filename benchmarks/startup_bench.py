@@ -0,0 +1,91 @@
+"""Cold-start profile of `import app` with a budget.
+
+Imports app.py in fresh interpreters and reports the median import time, the
+-X importtime breakdown of app's own body and each module it pulls in, and
+whether any dependency that should only load on first use (SignalWire/Twilio,
+requests, reportlab, PIL, numpy) was imported anyway. Exits non-zero when the
+median is over --budget-ms or a lazy dependency leaked into startup.
+
+    python benchmarks/startup_bench.py --runs 5 --budget-ms 500
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported inside the functions that use them; none may load with the app
+LAZY_MODULES = ('signalwire.rest', 'twilio', 'requests', 'reportlab', 'PIL', 'numpy')
+
+PROBE = '''
+import json, sys, time
+began = time.perf_counter()
+import app
+elapsed = time.perf_counter() - began
+print(json.dumps({'ms': elapsed * 1000, 'loaded': [m for m in %r if m in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def probe(importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE]
+    result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def breakdown(stderr, top):
+    """[(name, cumulative ms)] for app's own body and the modules app imports directly"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((len(match.group(3)), match.group(4), int(match.group(1)), int(match.group(2))))
+    app_entry = next(entry for entry in entries if entry[1] == 'app')
+    # importtime prints children before their parent, one level deeper
+    app_index = entries.index(app_entry)
+    children = []
+    for depth, name, _, cumulative in reversed(entries[:app_index]):
+        if depth <= app_entry[0]:
+            break
+        if depth == app_entry[0] + 2:
+            children.append((name, cumulative / 1000))
+    children.sort(key=lambda child: -child[1])
+    return [('app (own body)', app_entry[2] / 1000)] + children[:top], app_entry[3] / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=500, help='fail when the median import exceeds this')
+    parser.add_argument('--top', type=int, default=12, help='modules to list in the breakdown')
+    args = parser.parse_args()
+
+    probe()  # write bytecode caches so every measured run is a warm-disk cold start
+    runs = [probe()[0] for _ in range(args.runs)]
+    median = statistics.median(run['ms'] for run in runs)
+    loaded = sorted({module for run in runs for module in run['loaded']})
+
+    _, stderr = probe(importtime=True)
+    rows, total = breakdown(stderr, args.top)
+    print(f'import app: median {median:.0f} ms over {args.runs} runs (importtime total {total:.0f} ms)')
+    for name, ms in rows:
+        print(f'  {name:<32} {ms:8.1f} ms')
+
+    ok = True
+    if loaded:
+        print(f'FAIL: imported at startup but should load lazily: {", ".join(loaded)}')
+        ok = False
+    if median > args.budget_ms:
+        print(f'FAIL: over the {args.budget_ms:.0f} ms budget')
+        ok = False
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Size and build time of the SWAIG bill replies (swaig_response.py).
+
+Builds a practice where one caller has --bills bills, each with a diagnosis,
+long treatment notes and a few payments, then calls swaig_get_bills and
+swaig_verify_bill_reference the way the agent does and reports, per call and
+per response budget, the characters of text returned (and roughly how many
+LLM tokens that is), the size of the structured payload as JSON, and how long
+the whole call takes (the bill list comes from the query cache after the first
+call). Budget 0 is the unbudgeted reply listing everything.
+
+    python benchmarks/swaig_response_bench.py --bills 40 --budgets 0,1500,800
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from query_cache_bench import create_database  # noqa: E402
+from swaig_response import CHARS_PER_TOKEN  # noqa: E402
+
+NOTES = ('Patient presented with sensitivity on the lower left molars. Examined with bitewing radiographs; '
+         'recommended a composite restoration and reviewed brushing technique and flossing. Follow up in six '
+         'months or sooner if sensitivity persists after the restoration.')
+
+
+def add_heavy_caller(conn, patient, bills):
+    """Give one patient many detailed bills, as a long-standing orthodontic patient has"""
+    for n in range(bills):
+        reference = f'HEAVY-{n:04d}'
+        status = ('pending', 'partial', 'paid')[n % 3]
+        conn.execute('INSERT INTO treatment_history (patient_id, dentist_id, service_id, treatment_date, diagnosis, '
+                      "treatment_notes, reference_number) VALUES (?, 1, ?, '2024-03-01', ?, ?, ?)",
+                      (patient, n % 12 + 1, f'Diagnosis {n}: occlusal caries, tooth {n % 32 + 1}', NOTES, reference))
+        bill_id = conn.execute('INSERT INTO billing (patient_id, dentist_id, service_id, amount, insurance_coverage, '
+                               'patient_portion, status, due_date, reference_number, created_at) '
+                               "VALUES (?, 1, ?, 240, 60, 180, ?, date('2024-04-01', ?), ?, '2024-03-01')",
+                               (patient, n % 12 + 1, status, f'+{n} days', reference)).lastrowid
+        for payment in range(0 if status == 'pending' else 3):
+            conn.execute("INSERT INTO payments (billing_id, patient_id, amount, payment_date, payment_method_type, "
+                         "status, transaction_id) VALUES (?, ?, 30, ?, 'credit_card', 'completed', ?)",
+                         (bill_id, patient, f'2024-0{payment + 4}-01', f'TX-H{n}-{payment}'))
+    conn.execute("UPDATE billing SET bill_number = printf('%06d', 100000 + id) WHERE bill_number IS NULL")
+    conn.commit()
+
+
+def measure(app, function, arguments, repeats):
+    times = []
+    with app.app.test_request_context(), contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats + 1):
+            began = time.perf_counter()
+            text, payload = function(**arguments)
+            times.append(time.perf_counter() - began)
+            app.close_db(None)
+    return text, len(json.dumps(payload, default=str)), statistics.median(times[1:])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=50)
+    parser.add_argument('--bills', type=int, default=40, help="bills on the caller's account")
+    parser.add_argument('--budgets', default='0,1500,800', help='comma-separated SWAIG_RESPONSE_BUDGET values')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--show', action='store_true', help='print each reply at the last budget')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn, _, _ = create_database(os.path.join(tmp, 'dental_office.db'), args.patients)
+        add_heavy_caller(conn, 1, args.bills)
+        conn.close()
+        os.chdir(tmp)  # app opens dental_office.db and its cache files in the working directory
+        import app
+
+        token = 'bench-challenge-token'
+        app.store_challenge_token(token, {'patient_id': '1', 'id': 1, 'first_name': 'P', 'last_name': 'Bench1'})
+        functions = app.swaig.function_objects
+        calls = (
+            ('get_bills (all)', functions['swaig_get_bills'], {}),
+            ('get_bills (pending)', functions['swaig_get_bills'], {'status': 'pending'}),
+            ('verify_bill (service)', functions['swaig_verify_bill_reference'], {'service_name': 'Service 1'}),
+            ('verify_bill (one ref)', functions['swaig_verify_bill_reference'], {'reference_number': 'HEAVY-0007'}),
+            ('verify_bill (no match)', functions['swaig_verify_bill_reference'], {'reference_number': 'NOPE-9999'}),
+        )
+
+        print(f"caller with {args.bills} bills; ~tokens = chars / {CHARS_PER_TOKEN}")
+        print(f"{'call':<24} {'budget':>6} {'text chars':>10} {'~tokens':>8} {'payload':>9} {'call p50':>10}")
+        last = {}
+        for label, function, arguments in calls:
+            for budget in (int(b) for b in args.budgets.split(',')):
+                app.SWAIG_RESPONSE_BUDGET = budget
+                text, payload_bytes, elapsed = measure(app, function, dict(arguments, challenge_token=token), args.repeats)
+                last[label] = text
+                print(f'{label:<24} {budget or "none":>6} {len(text):10d} {len(text) // CHARS_PER_TOKEN:8d} '
+                      f'{payload_bytes:8d}B {elapsed * 1000:8.2f}ms')
+        if args.show:
+            for label, text in last.items():
+                print(f'\n--- {label} ---\n{text}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+# Bill numbers are 6 digits: 100000-999999
+BILL_NUMBER_MIN = 100000
+BILL_NUMBER_SPACE = 900000
+
+# Feistel network over 20 bits (2^20 = 1048576 >= BILL_NUMBER_SPACE)
+_HALF_BITS = 10
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+
+
+class BillNumberExhausted(Exception):
+    pass
+
+
+def _round(key, round_number, value):
+    digest = hashlib.blake2b(value.to_bytes(2, 'big'), digest_size=4,
+                             key=key, person=round_number.to_bytes(16, 'big')).digest()
+    return int.from_bytes(digest, 'big') & _HALF_MASK
+
+
+def _feistel(value, key):
+    left, right = value >> _HALF_BITS, value & _HALF_MASK
+    for round_number in range(_ROUNDS):
+        left, right = right, left ^ _round(key, round_number, right)
+    return (left << _HALF_BITS) | right
+
+
+def permute(index, key):
+    """Map a sequence index in [0, BILL_NUMBER_SPACE) to a unique, unguessable index in the same range.
+
+    The Feistel network is a bijection on 20-bit values; cycle-walking (re-applying
+    it until the result lands back in range) turns that into a bijection on
+    [0, BILL_NUMBER_SPACE), so distinct indexes never produce the same number.
+    """
+    value = _feistel(index, key)
+    while value >= BILL_NUMBER_SPACE:
+        value = _feistel(value, key)
+    return value
+
+
+def format_bill_number(index, key=None):
+    if not 0 <= index < BILL_NUMBER_SPACE:
+        raise BillNumberExhausted('All 6-digit bill numbers have been issued')
+    if key:
+        index = permute(index, key)
+    return str(BILL_NUMBER_MIN + index)
+
+
+class BillNumberAllocator:
+    """Hands out unique 6-digit bill numbers without probing for free ones.
+
+    Numbers come from a counter row in the sequences table. Each worker reserves
+    a block of counter values in one short transaction on its own connection and
+    then serves numbers from memory, so allocation is O(1) and never collides
+    with other workers. When the row has a permutation key, counter values are
+    run through a keyed permutation so consecutive bills don't get consecutive
+    numbers. Reserved but unused values are simply skipped.
+    """
+
+    def __init__(self, db_path, block_size=20, sequence='bill_number'):
+        self.db_path = db_path
+        self.block_size = block_size
+        self.sequence = sequence
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._key = None
+        self._pid = None
+
+    def _reserve_block(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT next_value, permutation_key FROM sequences WHERE name = ?',
+                                   (self.sequence,)).fetchone()
+                if row is None:
+                    raise RuntimeError(f"Sequence '{self.sequence}' is missing; run the database migrations")
+                start, key = row
+                if start >= BILL_NUMBER_SPACE:
+                    raise BillNumberExhausted('All 6-digit bill numbers have been issued')
+                end = min(start + self.block_size, BILL_NUMBER_SPACE)
+                conn.execute('UPDATE sequences SET next_value = ? WHERE name = ?', (end, self.sequence))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+        self._next, self._end = start, end
+        self._key = bytes.fromhex(key) if key else None
+        self._pid = os.getpid()
+        logging.info(f"[BILLING] Reserved bill number block {start}-{end - 1} for pid {self._pid}")
+
+    def _next_index(self):
+        with self._lock:
+            # A forked worker must not reuse the block its parent reserved
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._reserve_block()
+            index = self._next
+            self._next += 1
+            return index, self._key
+
+    def allocate(self, db=None):
+        """Return the next unused bill number.
+
+        Pass the request's connection to skip numbers already held by bills that
+        were numbered before the allocator existed (one indexed lookup each).
+        Reserve numbers before opening a write transaction on db, since a block
+        reservation needs the write lock briefly.
+        """
+        while True:
+            index, key = self._next_index()
+            bill_number = format_bill_number(index, key)
+            if db is None or db.execute('SELECT 1 FROM billing WHERE bill_number = ?', (bill_number,)).fetchone() is None:
+                return bill_number
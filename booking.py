@@ -0,0 +1,286 @@
+import logging
+from datetime import datetime, timedelta
+
+from working_hours import get_working_hours, minute_mask, MINUTES_PER_DAY
+
+# Every stored start_time/end_time uses this format so plain string comparison orders them
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Longest bookable appointment; bounds the index range the overlap check scans
+MAX_DURATION = timedelta(hours=12)
+
+# Length of an appointment booked into a morning/afternoon/evening window
+DEFAULT_DURATION = 60
+
+# Granularity of the start times offered as alternatives and tried inside windows
+SLOT_STEP = 30
+
+# How many days either side of a conflicting request alternatives are looked for
+ALTERNATIVE_SEARCH_DAYS = 14
+
+# The windows the voice agent and the reschedule form book into
+TIME_SLOT_WINDOWS = {
+    'morning': ('08:00', '11:00'),
+    'afternoon': ('14:00', '16:00'),
+    'evening': ('18:00', '20:00'),
+    'all_day': ('08:00', '20:00'),
+}
+
+
+class BookingError(Exception):
+    """A booking was rejected; status is the HTTP status the web API should return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class BookingConflict(BookingError):
+    """The dentist or the patient is already booked; alternatives are (start, end) datetimes"""
+
+    def __init__(self, message, alternatives=()):
+        super().__init__(message, 409)
+        self.alternatives = list(alternatives or ())
+
+
+def parse_time(value):
+    """datetime for an ISO timestamp ('2024-05-01T09:30', '2024-05-01 09:30:00', ...) or a datetime"""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    try:
+        return datetime.fromisoformat(str(value).strip()).replace(tzinfo=None)
+    except ValueError:
+        raise BookingError(f'Invalid date/time {value!r}')
+
+
+def format_time(value):
+    return value.strftime(TIME_FORMAT)
+
+
+def slot_window(date, time_slot):
+    """(start, end) datetimes of a named time slot on a YYYY-MM-DD date"""
+    if time_slot not in TIME_SLOT_WINDOWS:
+        raise BookingError(f'Invalid time slot {time_slot!r}')
+    start, end = TIME_SLOT_WINDOWS[time_slot]
+    return parse_time(f'{date}T{start}'), parse_time(f'{date}T{end}')
+
+
+def _overlap(db, column, value, start, end, exclude_id):
+    """First active appointment of a dentist or patient overlapping [start, end), or None.
+
+    Scans idx_appointments_<column>_interval from start - MAX_DURATION to end;
+    end_time is read from the index, not the table.
+    """
+    return db.execute(f'''
+        SELECT id, start_time, end_time FROM appointments
+        WHERE {column} = ? AND start_time > ? AND start_time < ? AND end_time > ?
+          AND status != 'cancelled' AND id != ?
+        LIMIT 1
+    ''', (value, format_time(start - MAX_DURATION), format_time(end), format_time(start), exclude_id or -1)).fetchone()
+
+
+def find_clash(db, dentist_id, patient_id, start, end, exclude_id=None):
+    """Why [start, end) can't be booked for this dentist and patient, or None when both are free.
+
+    Only trustworthy inside the write transaction that then books the slot.
+    """
+    for who, column, value in (('The dentist', 'dentist_id', dentist_id), ('The patient', 'patient_id', patient_id)):
+        clash = _overlap(db, column, value, start, end, exclude_id)
+        if clash is not None:
+            logging.info(f"[BOOKING] {who} is busy {format_time(start)} - {format_time(end)} (appointment {clash[0]})")
+            return f'{who} already has an appointment from {clash[1]} to {clash[2]}'
+    return None
+
+
+def validate_interval(start, end):
+    if end <= start:
+        raise BookingError('Appointment must end after it starts')
+    if end - start > MAX_DURATION:
+        raise BookingError(f'Appointments can be at most {int(MAX_DURATION.total_seconds() // 3600)} hours long')
+
+
+def within_working_hours(db, dentist_id, start, end):
+    """True when the dentist works all of [start, end); BookingError (404) for an unknown dentist"""
+    hours = get_working_hours(db, dentist_id)
+    if hours is None:
+        raise BookingError('Dentist not found', 404)
+    if start.date() != end.date() and end != datetime.combine(start.date() + timedelta(days=1), datetime.min.time()):
+        return False
+    end_minute = end.hour * 60 + end.minute if end.date() == start.date() else MINUTES_PER_DAY
+    return hours.is_working(start, start.hour * 60 + start.minute, end_minute)
+
+
+def book(db, patient_id, dentist_id, start, end, service_id=None, appointment_type='checkup', notes='',
+         sms_reminder=True, appointment_id=None, enforce_hours=True, suggest=True):
+    """Insert an appointment, or move appointment_id, if neither the dentist nor the patient is busy then.
+
+    The overlap checks and the write run in one BEGIN IMMEDIATE transaction, so
+    concurrent bookers are serialized and only one of them gets a contested
+    slot. On a clash BookingConflict carries the nearest free alternatives.
+    enforce_hours also rejects times outside the dentist's working hours;
+    suggest=False skips looking up alternatives. patient_id is patients.id.
+    Returns the appointment id.
+    """
+    start, end = parse_time(start), parse_time(end)
+    validate_interval(start, end)
+    if enforce_hours and not within_working_hours(db, dentist_id, start, end):
+        raise BookingConflict('The dentist is not working at that time',
+                              suggest and find_alternatives(db, dentist_id, patient_id, start, end,
+                                                            exclude_id=appointment_id))
+    if db.in_transaction:
+        # Don't fold whatever the caller had pending into the booking transaction
+        db.commit()
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        clash = find_clash(db, dentist_id, patient_id, start, end, appointment_id)
+        if clash is not None:
+            db.rollback()
+            raise BookingConflict(clash, suggest and find_alternatives(db, dentist_id, patient_id, start, end,
+                                                                      exclude_id=appointment_id))
+
+        if appointment_id is None:
+            cursor = db.execute('''
+                INSERT INTO appointments (patient_id, dentist_id, service_id, type, status, start_time, end_time,
+                                          notes, sms_reminder)
+                VALUES (?, ?, ?, ?, 'scheduled', ?, ?, ?, ?)
+            ''', (patient_id, dentist_id, service_id, appointment_type, format_time(start), format_time(end),
+                  notes or '', 1 if sms_reminder else 0))
+            appointment_id = cursor.lastrowid
+        else:
+            db.execute('UPDATE appointments SET start_time = ?, end_time = ?, notes = COALESCE(?, notes) WHERE id = ?',
+                       (format_time(start), format_time(end), notes, appointment_id))
+        db.commit()
+    except BookingError:
+        raise
+    except Exception:
+        db.rollback()
+        raise
+    logging.info(f"[BOOKING] Appointment {appointment_id}: dentist {dentist_id}, patient {patient_id}, "
+                 f"{format_time(start)} - {format_time(end)}")
+    return appointment_id
+
+
+def _busy_mask(db, day, dentist_id, patient_id, exclude_id):
+    """Minutes of day taken by the dentist's or the patient's active appointments"""
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    rows = db.execute('''
+        SELECT start_time, end_time FROM appointments
+        WHERE ((dentist_id = ? AND start_time > ? AND start_time < ?)
+            OR (patient_id = ? AND start_time > ? AND start_time < ?))
+          AND end_time > ? AND status != 'cancelled' AND id != ?
+    ''', (dentist_id, format_time(day_start - MAX_DURATION), format_time(day_end),
+          patient_id, format_time(day_start - MAX_DURATION), format_time(day_end),
+          format_time(day_start), exclude_id or -1)).fetchall()
+    busy = 0
+    for row in rows:
+        try:
+            start, end = parse_time(row[0]), parse_time(row[1])
+        except BookingError:
+            continue
+        first = max(0, int((start - day_start).total_seconds() // 60))
+        last = min(MINUTES_PER_DAY, int(-(-(end - day_start).total_seconds() // 60)))
+        busy |= minute_mask(first, last)
+    return busy
+
+
+def free_starts(db, dentist_id, patient_id, day, duration, exclude_id=None, hours=None):
+    """Start minutes on day, on the SLOT_STEP grid, where a duration-minute appointment fits"""
+    hours = hours or get_working_hours(db, dentist_id)
+    if hours is None or not hours.day_mask(day):
+        return []
+    return hours.free_slots(day, duration, _busy_mask(db, day, dentist_id, patient_id, exclude_id), step=SLOT_STEP)
+
+
+def find_alternatives(db, dentist_id, patient_id, start, end, limit=3, exclude_id=None, not_before=None):
+    """The limit free (start, end) slots of the same length nearest to start, soonest first on ties.
+
+    Looks on the requested day and then on days further away in both
+    directions, never before not_before (default: now).
+    """
+    start, end = parse_time(start), parse_time(end)
+    duration = int((end - start).total_seconds() // 60)
+    hours = get_working_hours(db, dentist_id)
+    if hours is None or duration <= 0:
+        return []
+    not_before = not_before or datetime.now()
+    candidates = []
+    for distance in range(ALTERNATIVE_SEARCH_DAYS + 1):
+        if len(candidates) >= limit:
+            # Anything on a day this far away is further than what we already have
+            worst = sorted(abs((c - start).total_seconds()) for c in candidates)[limit - 1]
+            if (distance - 1) * 86400 > worst:
+                break
+        for offset in ((0,) if distance == 0 else (distance, -distance)):
+            day = start.date() + timedelta(days=offset)
+            if day < not_before.date():
+                continue
+            day_start = datetime.combine(day, datetime.min.time())
+            for minute in free_starts(db, dentist_id, patient_id, day, duration, exclude_id, hours):
+                slot = day_start + timedelta(minutes=minute)
+                if slot >= not_before:
+                    candidates.append(slot)
+    candidates.sort(key=lambda c: (abs((c - start).total_seconds()), c))
+    return [(slot, slot + timedelta(minutes=duration)) for slot in candidates[:limit]]
+
+
+def next_free_slot(db, dentist_id, patient_id, after, duration, exclude_id=None, days=ALTERNATIVE_SEARCH_DAYS):
+    """Earliest free (start, end) of duration minutes starting at or after after, within days; None if there is none"""
+    hours = get_working_hours(db, dentist_id)
+    if hours is None:
+        return None
+    for offset in range(days + 1):
+        day = after.date() + timedelta(days=offset)
+        day_start = datetime.combine(day, datetime.min.time())
+        for minute in free_starts(db, dentist_id, patient_id, day, duration, exclude_id, hours):
+            slot = day_start + timedelta(minutes=minute)
+            if slot >= after:
+                return slot, slot + timedelta(minutes=duration)
+    return None
+
+
+def book_in_window(db, patient_id, dentist_id, window_start, window_end, duration=DEFAULT_DURATION, **kwargs):
+    """Book the earliest free duration-minute slot inside [window_start, window_end).
+
+    Candidates come from working hours and existing bookings; each is then
+    claimed with book(), so a slot taken by a concurrent booker is skipped.
+    Returns (appointment_id, start, end). Raises BookingConflict with the
+    nearest alternatives when the window is full.
+    """
+    window_start, window_end = parse_time(window_start), parse_time(window_end)
+    day_start = datetime.combine(window_start.date(), datetime.min.time())
+    exclude_id = kwargs.get('appointment_id')
+    for minute in free_starts(db, dentist_id, patient_id, window_start.date(), duration, exclude_id):
+        start = day_start + timedelta(minutes=minute)
+        end = start + timedelta(minutes=duration)
+        if start < window_start or end > window_end:
+            continue
+        try:
+            return book(db, patient_id, dentist_id, start, end, suggest=False, **kwargs), start, end
+        except BookingConflict:
+            continue
+    raise BookingConflict('No free time in the requested window',
+                          find_alternatives(db, dentist_id, patient_id, window_start,
+                                            window_start + timedelta(minutes=duration), exclude_id=exclude_id))
+
+
+def alternatives_json(alternatives):
+    return [{'start_time': format_time(start), 'end_time': format_time(end)} for start, end in alternatives]
+
+
+def describe_alternatives(alternatives):
+    """'Monday, May 6 at 09:30, ...' for reading alternatives out to a caller"""
+    return ', '.join(f"{start.strftime('%A, %B')} {start.day} at {start.strftime('%H:%M')}" for start, _ in alternatives)
+
+
+def window_duration(appointment, window_start, window_end):
+    """Minutes to book when moving appointment into a window: its current length if that fits, else the default"""
+    try:
+        minutes = int((parse_time(appointment['end_time']) - parse_time(appointment['start_time'])).total_seconds() // 60)
+    except (BookingError, TypeError):
+        return DEFAULT_DURATION
+    if 0 < minutes <= (window_end - window_start).total_seconds() // 60:
+        return minutes
+    return DEFAULT_DURATION
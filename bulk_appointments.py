@@ -0,0 +1,231 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from booking import (parse_time, format_time, find_clash, within_working_hours, next_free_slot, find_alternatives,
+                     alternatives_json, BookingError)
+
+ACTIONS = ('cancel', 'move', 'reassign')
+
+# Longest date range one bulk operation may cover
+MAX_BULK_DAYS = 31
+
+# How far past move_after a moved appointment may land
+MOVE_SEARCH_DAYS = 30
+
+
+class BulkResult:
+    """What happened to one appointment; as_dict() is its entry in the report"""
+
+    __slots__ = ('appointment', 'status', 'start', 'end', 'dentist_id', 'error', 'alternatives')
+
+    def __init__(self, appointment):
+        self.appointment = appointment
+        self.status = 'unchanged'
+        self.start = self.end = None
+        self.dentist_id = appointment['dentist_id']
+        self.error = None
+        self.alternatives = None
+
+    @property
+    def changed(self):
+        return self.status in ('cancelled', 'moved', 'reassigned')
+
+    def as_dict(self):
+        result = {
+            'appointment_id': self.appointment['id'],
+            'patient_id': self.appointment['patient_id'],
+            'status': self.status,
+            'old_start_time': self.appointment['start_time'],
+            'old_end_time': self.appointment['end_time'],
+            'dentist_id': self.dentist_id,
+        }
+        if self.start is not None:
+            result['start_time'] = format_time(self.start)
+            result['end_time'] = format_time(self.end)
+        if self.error:
+            result['error'] = self.error
+        if self.alternatives is not None:
+            result['alternatives'] = alternatives_json(self.alternatives)
+        return result
+
+
+def _cancel(db, appointment, result):
+    db.execute("UPDATE appointments SET status = 'cancelled' WHERE id = ?", (appointment['id'],))
+    result.status = 'cancelled'
+
+
+def _move(db, appointment, result, after):
+    start, end = parse_time(appointment['start_time']), parse_time(appointment['end_time'])
+    duration = int((end - start).total_seconds() // 60)
+    slot = next_free_slot(db, appointment['dentist_id'], appointment['patient_id'], after, duration,
+                          exclude_id=appointment['id'], days=MOVE_SEARCH_DAYS)
+    if slot is None:
+        result.status = 'failed'
+        result.error = f'No free {duration}-minute slot within {MOVE_SEARCH_DAYS} days of {format_time(after)}'
+        return
+    result.start, result.end = slot
+    db.execute('UPDATE appointments SET start_time = ?, end_time = ? WHERE id = ?',
+               (format_time(result.start), format_time(result.end), appointment['id']))
+    result.status = 'moved'
+
+
+def _reassign(db, appointment, result, target_dentist_id):
+    start, end = parse_time(appointment['start_time']), parse_time(appointment['end_time'])
+    if not within_working_hours(db, target_dentist_id, start, end):
+        problem = 'The new dentist is not working at that time'
+    else:
+        problem = find_clash(db, target_dentist_id, appointment['patient_id'], start, end, appointment['id'])
+    if problem:
+        result.status = 'failed'
+        result.error = problem
+        result.alternatives = find_alternatives(db, target_dentist_id, appointment['patient_id'], start, end,
+                                                exclude_id=appointment['id'])
+        return
+    db.execute('UPDATE appointments SET dentist_id = ? WHERE id = ?', (target_dentist_id, appointment['id']))
+    result.status = 'reassigned'
+    result.dentist_id = target_dentist_id
+    result.start, result.end = start, end
+
+
+def bulk_update(db, action, dentist_id, start_date, end_date, target_dentist_id=None, move_after=None,
+                atomic=False, dry_run=False):
+    """Cancel, move or reassign every scheduled appointment of a dentist between two dates (inclusive).
+
+    move puts each appointment, in order, into the dentist's first free slot
+    of the same length at or after move_after (default: the day after
+    end_date). reassign keeps the time and gives the appointment to
+    target_dentist_id, who must be working and free. All changes are made in
+    one BEGIN IMMEDIATE transaction, and every slot is planned against the
+    rows already changed in it. An appointment that can't be placed is
+    reported as failed and left alone, or with atomic the whole batch is
+    rolled back. dry_run plans everything and rolls back.
+
+    Returns (results, committed): a BulkResult per appointment, in start order.
+    """
+    if action not in ACTIONS:
+        raise BookingError(f"action must be one of {', '.join(ACTIONS)}")
+    if end_date < start_date:
+        raise BookingError('end_date must not be before start_date')
+    if (end_date - start_date).days >= MAX_BULK_DAYS:
+        raise BookingError(f'Bulk operations are limited to {MAX_BULK_DAYS} days')
+    if db.execute('SELECT 1 FROM dentists WHERE id = ?', (dentist_id,)).fetchone() is None:
+        raise BookingError('Dentist not found', 404)
+    if action == 'reassign':
+        if target_dentist_id is None or str(target_dentist_id) == str(dentist_id):
+            raise BookingError('reassign needs a different target_dentist_id')
+        if db.execute('SELECT 1 FROM dentists WHERE id = ?', (target_dentist_id,)).fetchone() is None:
+            raise BookingError('Target dentist not found', 404)
+    if action == 'move':
+        move_after = parse_time(move_after) if move_after else datetime.combine(end_date + timedelta(days=1),
+                                                                                 datetime.min.time())
+        move_after = max(move_after, datetime.now().replace(second=0, microsecond=0))
+
+    if db.in_transaction:
+        db.commit()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        appointments = db.execute('''
+            SELECT id, patient_id, dentist_id, service_id, start_time, end_time, sms_reminder
+            FROM appointments
+            WHERE dentist_id = ? AND start_time >= ? AND start_time < ? AND status = 'scheduled'
+            ORDER BY start_time
+        ''', (dentist_id, start_date.strftime('%Y-%m-%d'),
+              (end_date + timedelta(days=1)).strftime('%Y-%m-%d'))).fetchall()
+        results = []
+        for appointment in appointments:
+            result = BulkResult(appointment)
+            results.append(result)
+            try:
+                if action == 'cancel':
+                    _cancel(db, appointment, result)
+                elif action == 'move':
+                    _move(db, appointment, result, move_after)
+                else:
+                    _reassign(db, appointment, result, target_dentist_id)
+            except BookingError as e:
+                result.status = 'failed'
+                result.error = e.message
+
+        failed = sum(1 for result in results if result.status == 'failed')
+        committed = not dry_run and not (atomic and failed)
+        if committed:
+            db.commit()
+        else:
+            db.rollback()
+            if atomic and failed:
+                for result in results:
+                    if result.changed:
+                        result.status = 'rolled_back'
+    except Exception:
+        db.rollback()
+        raise
+    logging.info(f"[BULK] {action} dentist {dentist_id} {start_date:%Y-%m-%d}..{end_date:%Y-%m-%d}: "
+                 f"{len(results)} appointments, {failed} failed, {'committed' if committed else 'rolled back'}")
+    return results, committed
+
+
+def summarize(results):
+    summary = OrderedDict((status, 0) for status in ('cancelled', 'moved', 'reassigned', 'failed', 'rolled_back'))
+    for result in results:
+        summary[result.status] = summary.get(result.status, 0) + 1
+    return summary
+
+
+def _when(value):
+    value = parse_time(value)
+    return f"{value.strftime('%A, %B')} {value.day} at {value.strftime('%I:%M %p')}"
+
+
+def notification_messages(db, results, reason=''):
+    """One (phone, body) per patient covering all of their changed appointments that have SMS reminders on"""
+    changed = [result for result in results if result.changed and result.appointment['sms_reminder']]
+    if not changed:
+        return []
+    ids = [result.appointment['id'] for result in changed]
+    details = {row['id']: row for row in db.execute(f'''
+        SELECT a.id, p.phone, s.name AS service_name, d.first_name, d.last_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN dental_services s ON a.service_id = s.id
+        JOIN dentists d ON a.dentist_id = d.id
+        WHERE a.id IN ({', '.join('?' for _ in ids)})
+    ''', ids)}
+    lines_by_phone = OrderedDict()
+    for result in changed:
+        row = details.get(result.appointment['id'])
+        if row is None or not row['phone']:
+            continue
+        old = _when(result.appointment['start_time'])
+        if result.status == 'cancelled':
+            line = f"Your {row['service_name']} appointment on {old} has been cancelled."
+        elif result.status == 'moved':
+            line = f"Your {row['service_name']} appointment on {old} has been moved to {_when(result.start)}."
+        else:
+            line = (f"Your {row['service_name']} appointment on {old} will now be with "
+                    f"Dr. {row['first_name']} {row['last_name']}.")
+        lines_by_phone.setdefault(row['phone'], []).append(line)
+    suffix = f" Reason: {reason.strip().rstrip('.')}." if reason and reason.strip() else ''
+    return [(phone, ' '.join(lines) + suffix + ' Please call us if this time does not work for you.')
+            for phone, lines in lines_by_phone.items()]
+
+
+def dispatch_notifications(messages, send):
+    """Send (phone, body) messages with send(phone, body) on a background thread; failures are logged"""
+    if not messages:
+        return None
+
+    def worker():
+        sent = 0
+        for phone, body in messages:
+            try:
+                send(phone, body)
+                sent += 1
+            except Exception as e:
+                logging.error(f"[BULK] Failed to notify {phone}: {e}")
+        logging.info(f"[BULK] Sent {sent} of {len(messages)} notifications")
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    return thread
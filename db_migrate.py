@@ -0,0 +1,220 @@
+import importlib.util
+import logging
+import os
+import re
+import sqlite3
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Migration files are named NNNN_description.sql or NNNN_description.py
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_([a-z0-9_]+)\.(sql|py)$')
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Return (version, name, path) for every migration file, ordered by version"""
+    migrations = []
+    if not os.path.isdir(directory):
+        return migrations
+    seen = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in seen:
+            raise MigrationError(f"Duplicate migration version {version}: {seen[version]} and {filename}")
+        seen[version] = filename
+        migrations.append((version, match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+
+def get_schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def split_sql(script):
+    """Split a SQL script into complete statements.
+
+    executescript() commits any open transaction first, so migrations run their
+    statements one by one instead.
+    """
+    statements = []
+    buffer = ''
+    for line in script.splitlines(keepends=True):
+        if not buffer and line.strip().startswith('--'):
+            continue
+        buffer += line
+        if sqlite3.complete_statement(buffer):
+            statement = buffer.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            buffer = ''
+    if buffer.strip():
+        raise MigrationError(f"Incomplete SQL statement: {buffer.strip()[:80]}")
+    return statements
+
+
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+
+def index_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone() is not None
+
+
+def add_column(conn, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    if column_exists(conn, table, column):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+
+def backfill_in_chunks(conn, table, set_clause, where='1', params=(), chunk_size=500):
+    """Run an UPDATE over a large table in rowid ranges, committing after each chunk.
+
+    Each chunk holds the write lock only briefly, so readers (and other writers
+    with a busy timeout) keep making progress while a long backfill runs. Must
+    be called outside a transaction, i.e. from an ONLINE migration.
+    """
+    if conn.in_transaction:
+        raise MigrationError('backfill_in_chunks must run outside a transaction')
+    bounds = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {table}').fetchone()
+    if bounds[0] is None:
+        return 0
+    updated = 0
+    low, high = bounds
+    while low <= high:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(
+                f'UPDATE {table} SET {set_clause} WHERE rowid >= ? AND rowid < ? AND ({where})',
+                (low, low + chunk_size, *params)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        updated += cursor.rowcount
+        low += chunk_size
+    return updated
+
+
+def create_index_online(conn, name, table, columns, unique=False, where=None):
+    """Build an index in its own short transaction.
+
+    SQLite cannot build a single index incrementally, but in WAL mode readers are
+    never blocked by the writer, so the only thing paused for the duration of the
+    build is other writers. Keeping the build out of the migration transaction
+    means nothing else is held while it runs.
+    """
+    if conn.in_transaction:
+        raise MigrationError('create_index_online must run outside a transaction')
+    if index_exists(conn, name):
+        return False
+    sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+    if where:
+        sql += f' WHERE {where}'
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(sql)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return True
+
+
+def _load_python_migration(name, path):
+    spec = importlib.util.spec_from_file_location(f'migration_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'upgrade'):
+        raise MigrationError(f'{os.path.basename(path)} does not define upgrade(conn)')
+    return module
+
+
+def _apply(conn, version, name, path):
+    if path.endswith('.py'):
+        module = _load_python_migration(name, path)
+        online = getattr(module, 'ONLINE', False)
+    else:
+        module = None
+        online = False
+
+    if online:
+        # Online migrations manage their own (chunked) transactions
+        module.upgrade(conn)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if get_schema_version(conn) < version:
+                conn.execute(f'PRAGMA user_version = {version}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another worker may have applied it while we waited for the lock
+        if get_schema_version(conn) >= version:
+            conn.execute('ROLLBACK')
+            return False
+        if module is not None:
+            module.upgrade(conn)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                for statement in split_sql(f.read()):
+                    conn.execute(statement)
+        conn.execute(f'PRAGMA user_version = {version}')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return True
+
+
+def migrate(conn, directory=MIGRATIONS_DIR, target=None, enable_wal=True):
+    """Apply pending migrations in order and return the versions that were applied.
+
+    The schema version is tracked in PRAGMA user_version. Each migration runs in
+    its own BEGIN IMMEDIATE transaction together with the version bump, so a
+    failed migration leaves the database at the previous version.
+    """
+    if conn.in_transaction:
+        raise MigrationError('Commit or roll back the open transaction before migrating')
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None
+    applied = []
+    try:
+        if enable_wal:
+            conn.execute('PRAGMA journal_mode=WAL')
+        current = get_schema_version(conn)
+        for version, name, path in discover_migrations(directory):
+            if version <= current:
+                continue
+            if target is not None and version > target:
+                break
+            logging.info(f"[MIGRATE] Applying migration {version:04d}_{name}")
+            if _apply(conn, version, name, path):
+                applied.append(version)
+            current = version
+    finally:
+        conn.isolation_level = previous_isolation
+    return applied
+
+
+if __name__ == '__main__':
+    import sys
+    db_path = sys.argv[1] if len(sys.argv) > 1 else 'dental_office.db'
+    conn = sqlite3.connect(db_path)
+    applied = migrate(conn)
+    print(f"Applied migrations: {applied or 'none'}")
+    print(f"Schema version: {get_schema_version(conn)}")
+    conn.close()
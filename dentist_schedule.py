@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from working_hours import get_working_hours, format_minute
+
+# Longest range one schedule request may cover
+MAX_SCHEDULE_DAYS = 366
+
+_APPOINTMENT_QUERY = '''
+    SELECT a.*, p.first_name as patient_first_name, p.last_name as patient_last_name,
+           s.name as service_name
+    FROM appointments a
+    JOIN patients p ON a.patient_id = p.id
+    JOIN dental_services s ON a.service_id = s.id
+    WHERE a.dentist_id = ? AND a.start_time >= ? AND a.start_time < ?
+    ORDER BY a.start_time
+'''
+
+
+def _empty_days(hours, start_date, end_date):
+    """date string -> day entry for every working day in [start_date, end_date]"""
+    days = {}
+    day = start_date
+    while day <= end_date:
+        intervals = hours.intervals(day)
+        if intervals:
+            date_str = day.strftime('%Y-%m-%d')
+            days[date_str] = {
+                'date': date_str,
+                'working_hours': [{'start': format_minute(start), 'end': format_minute(end)} for start, end in intervals],
+                'appointments': [],
+            }
+        day += timedelta(days=1)
+    return days
+
+
+def dentist_schedule(db, dentist_id, start_date, end_date):
+    """Working days of one dentist between two dates (inclusive), each with its appointments.
+
+    Working hours come from the cached weekly template with exceptions and
+    holidays applied. Appointments come from one range scan over
+    idx_appointments_dentist_interval and are bucketed into days in a single pass;
+    appointments on non-working days are left out. None if there is no such dentist.
+    """
+    hours = get_working_hours(db, dentist_id)
+    if hours is None:
+        return None
+    days = _empty_days(hours, start_date, end_date)
+    if days:
+        upper = (end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+        for appointment in db.execute(_APPOINTMENT_QUERY, (dentist_id, start_date.strftime('%Y-%m-%d'), upper)):
+            day = days.get(str(appointment['start_time'])[:10])
+            if day is not None:
+                day['appointments'].append(dict(appointment))
+    return list(days.values())
+
+
+def multi_dentist_schedule(db, dentist_ids, start_date, end_date):
+    """Schedules of several dentists (all of them when dentist_ids is None) for the front desk"""
+    sql = 'SELECT id, first_name, last_name FROM dentists'
+    params = ()
+    if dentist_ids is not None:
+        sql += f" WHERE id IN ({', '.join('?' for _ in dentist_ids)})"
+        params = tuple(dentist_ids)
+    dentists = db.execute(sql + ' ORDER BY last_name, first_name', params).fetchall()
+    return [{
+        'dentist_id': dentist['id'],
+        'dentist_name': f"{dentist['first_name']} {dentist['last_name']}",
+        'schedule': dentist_schedule(db, dentist['id'], start_date, end_date),
+    } for dentist in dentists]
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+# Settings below may come from .env too; the shell environment wins
+load_dotenv()
+
+# Production server: gunicorn -c gunicorn.conf.py (start.sh does this with SERVER_MODE=production).
+# app.py's __main__ still runs the Werkzeug dev server for local development.
+wsgi_app = 'app:app'
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+# gthread workers: one process per core, each serving requests on a small thread pool.
+# Requests are mostly short SQLite queries plus blocking SignalWire HTTP calls, so
+# threads cover the I/O waits without a process per concurrent request.
+# SWAIG MFA sessions and fragment cache versions are kept in the shared cache
+# (shared_cache.py), so any worker can serve a caller's follow-up request.
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Import the app once in the master; workers fork with the code already loaded
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))  # PDF and image generation can take a while
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to cap memory growth; jitter keeps them from restarting together
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    """In the master, once per deployment: bring the database schema up to date before any worker starts"""
+    import app as dental_app
+    dental_app.setup_logging()
+    dental_app.init_db_if_needed()
+
+
+def post_fork(server, worker):
+    """In each new worker: per-process logging, state reset and background jobs"""
+    import app as dental_app
+    dental_app.setup_logging()
+    dental_app.init_worker()
+
+
+def worker_exit(server, worker):
+    import app as dental_app
+    dental_app.background_jobs.stop()
+
+
+def when_ready(server):
+    server.log.info(f"Serving with {workers} {worker_class} workers x {threads} threads on {bind}")
@@ -0,0 +1,73 @@
+from flask import g, session
+
+# Columns pages and handlers read from the signed-in user; never the password hash or salt
+USER_COLUMNS = {
+    'patient': ('id', 'first_name', 'last_name', 'email', 'phone', 'address', 'date_of_birth', 'patient_id'),
+    'dentist': ('id', 'first_name', 'last_name', 'email', 'phone', 'specialization', 'license_number', 'working_hours'),
+}
+USER_TABLES = {'patient': 'patients', 'dentist': 'dentists'}
+
+_FIELDS = tuple(dict.fromkeys(column for columns in USER_COLUMNS.values() for column in columns))
+
+
+class CurrentUser:
+    """The signed-in patient or dentist.
+
+    Supports both attribute access (templates) and the row-style user['phone'] /
+    user.keys() access the handlers used on sqlite3.Row. role is 'patient' or
+    'dentist'; columns the role doesn't have are None.
+    """
+
+    __slots__ = ('role',) + _FIELDS
+
+    def __init__(self, role, row):
+        self.role = role
+        for field in _FIELDS:
+            setattr(self, field, None)
+        for column, value in zip(USER_COLUMNS[role], row):
+            setattr(self, column, value)
+
+    def keys(self):
+        return ('role',) + USER_COLUMNS[self.role]
+
+    def __getitem__(self, key):
+        if key not in self.keys():
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.keys() else default
+
+    @property
+    def name(self):
+        return f'{self.first_name} {self.last_name}'
+
+    def __repr__(self):
+        return f'<CurrentUser {self.role} {self.id}>'
+
+
+def load_user(db, role, user_id):
+    """CurrentUser for a patients/dentists id, or None"""
+    columns = USER_COLUMNS.get(role)
+    if columns is None:
+        return None
+    row = db.execute(f"SELECT {', '.join(columns)} FROM {USER_TABLES[role]} WHERE id = ?", (user_id,)).fetchone()
+    return CurrentUser(role, row) if row else None
+
+
+def current_user(db):
+    """The signed-in user, loaded at most once per request and kept on flask.g"""
+    if 'user_id' not in session or 'user_type' not in session:
+        return None
+    key = (session['user_type'], session['user_id'])
+    cached = g.get('current_user')
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    user = load_user(db, *key)
+    g.current_user = (key, user)
+    return user
+
+
+def forget_current_user():
+    """Drop the request's cached user; call after writing to the user's row"""
+    g.pop('current_user', None)
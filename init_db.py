@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from db_migrate import migrate
 
 def init_db():
     if os.path.exists('dental_office.db'):
@@ -8,6 +9,7 @@ def init_db():
     conn = sqlite3.connect('dental_office.db')
     with open('schema.sql', 'r') as f:
         conn.executescript(f.read())
+    migrate(conn)
     conn.close()
 
 if __name__ == '__main__':
@@ -2,10 +2,13 @@ import sqlite3
 from datetime import datetime, timedelta
 import hashlib
 import secrets
-import random
 import os
 import json
 from werkzeug.security import generate_password_hash
+from db_migrate import migrate
+from bill_numbers import BillNumberAllocator
+from phone_lookup import sync_patient_phone_e164
+from working_hours import sync_dentist_working_hours
 
 def hash_password(password):
     """Hash password with salt for secure storage"""
@@ -13,9 +16,11 @@ def hash_password(password):
     hash_obj = hashlib.sha256((password + salt).encode())
     return hash_obj.hexdigest(), salt
 
+bill_number_allocator = BillNumberAllocator('dental_office.db')
+
 def generate_unique_bill_number():
-    """Generate a unique 6-digit bill number"""
-    return str(random.randint(100000, 999999))
+    """Allocate a unique 6-digit bill number from the shared bill number sequence"""
+    return bill_number_allocator.allocate()
 
 def init_test_data():
     """Initialize comprehensive test data for the SignalWire dental office system with single 7-digit patient IDs"""
@@ -43,22 +48,10 @@ def init_test_data():
         except sqlite3.Error as e:
             print(f"Note: Could not clear {table}: {e}")
 
-    # Apply bill_number migration if it exists
-    try:
-        # Check if bill_number column already exists
-        cursor.execute("PRAGMA table_info(billing)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'bill_number' not in columns:
-            print("Adding bill_number column to billing table...")
-            cursor.execute("ALTER TABLE billing ADD COLUMN bill_number TEXT")
-            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_billing_bill_number ON billing(bill_number)")
-            conn.commit()
-        else:
-            print("bill_number column already exists")
-    except sqlite3.Error as e:
-        print(f"Migration note: {e}")
-        pass  # Continue with data insertion
+    # Bring the schema up to date (adds billing.bill_number and later columns)
+    conn.commit()
+    applied = migrate(conn)
+    print(f"Applied migrations: {applied or 'none'}")
 
     # Insert comprehensive dental services
     services = [
@@ -145,6 +138,10 @@ def init_test_data():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', dentists)
 
+    # Normalized weekly templates for availability lookups
+    for (dentist_id,) in cursor.execute('SELECT id FROM dentists').fetchall():
+        sync_dentist_working_hours(conn, dentist_id)
+
     # Define 7-digit patient IDs as primary keys (no internal auto-increment IDs)
     patient_ids = {
         'jane': 8675309,   # Famous phone number for testing
@@ -187,6 +184,10 @@ def init_test_data():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', patients)
 
+    # Normalized phone numbers for caller-ID lookups
+    for patient in patients:
+        sync_patient_phone_e164(conn, patient[0])
+
     # Insert comprehensive payment methods using 7-digit patient IDs
     payment_methods = [
         # Jane Doe's payment methods (ID: 8675309)
@@ -366,6 +367,9 @@ def init_test_data():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', treatments)
 
+    # Bill number blocks are reserved on a separate connection, so release the write lock first
+    conn.commit()
+
     # Insert comprehensive billing records using 7-digit patient IDs and 6-digit bill numbers
     billing = [
         # Jane Doe's bills (ID: 8675309) - Only 1 deep cleaning bill for SWAIG testing
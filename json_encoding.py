@@ -0,0 +1,83 @@
+import dataclasses
+import datetime
+import decimal
+import json
+import sqlite3
+import uuid
+from functools import lru_cache
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same JSON, only slower
+    orjson = None
+
+
+def default(obj):
+    """Encode the non-JSON types our queries and views produce.
+
+    Dates and times become ISO 8601 and Decimals their exact string, matching
+    what orjson does natively so both encoders give the same output.
+    """
+    if isinstance(obj, sqlite3.Row):
+        return dict(zip(obj.keys(), obj))
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_stdlib(obj, **kwargs):
+    kwargs.setdefault('separators', (',', ':'))
+    return json.dumps(obj, default=default, ensure_ascii=False, **kwargs)
+
+
+def dumps(obj):
+    """Compact JSON for obj, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; the stdlib encoder handles those
+            pass
+    return dumps_stdlib(obj)
+
+
+@lru_cache(maxsize=256)
+def columns_for(description):
+    """Column names of a cursor.description, computed once per query shape"""
+    return tuple(column[0] for column in description)
+
+
+def row_dicts(cursor, rows):
+    """dicts for rows (plain tuples or sqlite3.Row) fetched from cursor"""
+    columns = columns_for(cursor.description)
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def dump_rows(cursor):
+    """Fetch all remaining rows of an executed cursor and encode them as a JSON array"""
+    return dumps(row_dicts(cursor, cursor.fetchall()))
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider using dumps() above, so jsonify accepts sqlite3.Row values directly.
+
+    Pretty-printed output (debug mode or compact=False) goes through the stdlib
+    encoder. Keys keep their column order instead of being sorted.
+    """
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs.get('indent'):
+            return dumps_stdlib(obj, indent=kwargs['indent'])
+        return dumps(obj)
@@ -1,10 +1,16 @@
 import logging
-import requests
 import re
-from signalwire.rest import Client as SignalWireClient
+
+from outbound import Outbound, OutboundUnavailable
+
+# requests and signalwire.rest (which pulls in the Twilio SDK) are imported on
+# first use so importing this module, and app.py with it, stays cheap
 
 class SignalWireMFA:
-    def __init__(self, project_id: str, token: str, space: str, from_number: str):
+    def __init__(self, project_id: str, token: str, space: str, from_number: str, outbound: Outbound = None,
+                 base_url: str = None):
+        # Deadlines and circuit breakers for every call this client makes (outbound.py)
+        self.outbound = outbound or Outbound()
         try:
             # Handle both full URL and subdomain formats for space parameter
             if space.startswith('https://') or space.startswith('http://'):
@@ -19,13 +25,20 @@ class SignalWireMFA:
                 space_subdomain = space
                 space_url = f"https://{space}.signalwire.com"
             
+            from signalwire.rest import Client as SignalWireClient
+
             # Initialize client with proper space URL format
-            self.client = SignalWireClient(project_id, token, signalwire_space_url=f"{space_subdomain}.signalwire.com")
+            self.client = SignalWireClient(project_id, token, signalwire_space_url=f"{space_subdomain}.signalwire.com",
+                                           http_client=self.outbound.signalwire_http_client())
             self.project_id = project_id
             self.token = token
             self.space = space_subdomain
             self.from_number = from_number
-            self.base_url = f"https://{space_subdomain}.signalwire.com/api/relay/rest"
+            # base_url sends every REST call somewhere other than the space, such as a local stand-in
+            api_url = base_url.rstrip('/') if base_url else f"https://{space_subdomain}.signalwire.com"
+            if base_url:
+                self.client.api.base_url = api_url
+            self.base_url = f"{api_url}/api/relay/rest"
             logging.debug(f"Initialized SignalWireMFA with from_number: {self.from_number}, space: {space_subdomain}")
         except Exception as e:
             logging.error(f"Failed to initialize SignalWire Client: {e}")
@@ -45,7 +58,7 @@ class SignalWireMFA:
             }
             headers = {"Content-Type": "application/json"}
             logging.debug(f"Sending MFA from {self.from_number} to {to_number}")
-            response = requests.post(url, json=payload, auth=(self.project_id, self.token), headers=headers)
+            response = self.outbound.post('mfa', url, json=payload, auth=(self.project_id, self.token), headers=headers)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -53,14 +66,18 @@ class SignalWireMFA:
             raise
 
     def verify_mfa(self, mfa_id: str, token: str) -> dict:
+        import requests
         try:
             verify_url = f"{self.base_url}/mfa/{mfa_id}/verify"
             payload = {"token": token}
             headers = {"Content-Type": "application/json"}
             logging.debug(f"Verifying MFA with ID {mfa_id} using token {token}")
-            response = requests.post(verify_url, json=payload, auth=(self.project_id, self.token), headers=headers)
+            response = self.outbound.post('mfa', verify_url, json=payload, auth=(self.project_id, self.token), headers=headers)
             response.raise_for_status()
             return response.json()
+        except OutboundUnavailable as e:
+            logging.warning(f"MFA verification not attempted: {e}")
+            return {"success": False, "unavailable": True, "message": "Verification service is temporarily unavailable. Please try again in a few minutes."}
         except requests.HTTPError as e:
             status_code = e.response.status_code
             if status_code == 401:
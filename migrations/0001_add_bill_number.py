@@ -0,0 +1,19 @@
+"""Add a unique 6-digit bill number to every bill.
+
+Replaces the loose migrate_add_bill_number.sql and the PRAGMA table_info check
+that init_test_data.py used to run before ALTER TABLE.
+"""
+from db_migrate import add_column
+
+
+def upgrade(conn):
+    add_column(conn, 'billing', 'bill_number', 'TEXT')
+
+    # Deterministic 6-digit numbers for bills created before the column existed
+    conn.execute('''
+        UPDATE billing
+        SET bill_number = CAST((100000 + (id * 13 + 37) % 900000) AS TEXT)
+        WHERE bill_number IS NULL
+    ''')
+
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_billing_bill_number ON billing(bill_number)')
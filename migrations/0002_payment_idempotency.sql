@@ -0,0 +1,6 @@
+-- Idempotency keys let clients retry a payment without charging twice
+ALTER TABLE payments ADD COLUMN idempotency_key TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_idempotency
+    ON payments(patient_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
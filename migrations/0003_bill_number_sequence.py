@@ -0,0 +1,18 @@
+"""Counter table for the bill number allocator (see bill_numbers.py).
+
+The bill_number row starts with a random permutation key so issued numbers are
+not sequential. Set permutation_key to NULL to issue plain sequential numbers.
+"""
+import secrets
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sequences (
+            name TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL DEFAULT 0,
+            permutation_key TEXT
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO sequences (name, next_value, permutation_key) VALUES (?, 0, ?)',
+                 ('bill_number', secrets.token_hex(16)))
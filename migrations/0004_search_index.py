@@ -0,0 +1,124 @@
+"""Full-text search index over patients, dentists, services and bills (see search.py).
+
+search_index is an FTS5 table for word and prefix matching plus phonetic codes;
+search_trigram uses the trigram tokenizer for substring matching. Both are kept
+in sync by triggers on the source tables. Phonetic codes are computed in Python,
+so the triggers only queue changed names in search_phonetic_queue.
+"""
+import sqlite3
+
+from db_migrate import MigrationError
+from search import ENTITY_CODES, ENTITY_STRIDE, PHONETIC_ENTITIES, phonetic_key
+
+# Per entity: source table, the columns whose changes re-index a row, and SQL
+# expressions ({r} is the row alias) for the owner and each indexed column
+SOURCES = {
+    'patient': {
+        'table': 'patients',
+        'watch': 'first_name, last_name, email, phone, patient_id',
+        'owner': '{r}.id',
+        'first_name': '{r}.first_name',
+        'last_name': '{r}.last_name',
+        'label': "{r}.first_name || ' ' || {r}.last_name",
+        'terms': "{r}.patient_id || ' ' || {r}.email || ' ' || {r}.phone",
+        'trigram': "{r}.first_name || ' ' || {r}.last_name || ' ' || {r}.patient_id",
+    },
+    'dentist': {
+        'table': 'dentists',
+        'watch': 'first_name, last_name, email, specialization',
+        'owner': 'NULL',
+        'first_name': '{r}.first_name',
+        'last_name': '{r}.last_name',
+        'label': "{r}.first_name || ' ' || {r}.last_name",
+        'terms': "'dr doctor ' || {r}.email || ' ' || COALESCE({r}.specialization, '')",
+        'trigram': "{r}.first_name || ' ' || {r}.last_name",
+    },
+    'service': {
+        'table': 'dental_services',
+        'watch': 'name, type, description',
+        'owner': 'NULL',
+        'first_name': "''",
+        'last_name': "''",
+        'label': '{r}.name',
+        'terms': "REPLACE({r}.type, '_', ' ') || ' ' || COALESCE({r}.description, '')",
+        'trigram': '{r}.name',
+    },
+    'bill': {
+        'table': 'billing',
+        'watch': 'reference_number, bill_number, patient_id',
+        'owner': '{r}.patient_id',
+        'first_name': "''",
+        'last_name': "''",
+        'label': "COALESCE({r}.reference_number, '')",
+        'terms': "COALESCE({r}.bill_number, '')",
+        'trigram': ("COALESCE({r}.reference_number, '') || ' ' || "
+                    "REPLACE(REPLACE(REPLACE(COALESCE({r}.reference_number, ''), '_', ''), '-', ''), ' ', '') || ' ' || "
+                    "COALESCE({r}.bill_number, '')"),
+    },
+}
+
+
+def _insert_sql(entity, alias, from_clause=''):
+    source = SOURCES[entity]
+    rowid = f'{alias}.id * {ENTITY_STRIDE} + {ENTITY_CODES[entity]}'
+
+    def expr(key):
+        return source[key].format(r=alias)
+
+    index = (f"INSERT INTO search_index (rowid, entity, entity_id, owner_id, first_name, last_name, label, terms) "
+             f"SELECT {rowid}, '{entity}', {alias}.id, {expr('owner')}, {expr('first_name')}, {expr('last_name')}, "
+             f"{expr('label')}, {expr('terms')}{from_clause};")
+    trigram = (f"INSERT INTO search_trigram (rowid, entity, entity_id, owner_id, label, text) "
+               f"SELECT {rowid}, '{entity}', {alias}.id, {expr('owner')}, {expr('label')}, {expr('trigram')}{from_clause};")
+    statements = [index, trigram]
+    if entity in PHONETIC_ENTITIES:
+        statements.append(f"INSERT OR IGNORE INTO search_phonetic_queue (doc_rowid) SELECT {rowid}{from_clause};")
+    return statements
+
+
+def _delete_sql(entity, alias):
+    rowid = f'{alias}.id * {ENTITY_STRIDE} + {ENTITY_CODES[entity]}'
+    return [f'DELETE FROM search_index WHERE rowid = {rowid};',
+            f'DELETE FROM search_trigram WHERE rowid = {rowid};']
+
+
+def upgrade(conn):
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+                entity UNINDEXED, entity_id UNINDEXED, owner_id UNINDEXED,
+                first_name, last_name, label, terms, phonetic,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '1 2 3'
+            )
+        ''')
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS search_trigram USING fts5(
+                entity UNINDEXED, entity_id UNINDEXED, owner_id UNINDEXED, label UNINDEXED, text,
+                tokenize = 'trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        raise MigrationError(f'SQLite {sqlite3.sqlite_version} lacks FTS5 with the trigram tokenizer (3.34+): {e}')
+    conn.execute('CREATE TABLE IF NOT EXISTS search_phonetic_queue (doc_rowid INTEGER PRIMARY KEY)')
+
+    for entity, source in SOURCES.items():
+        table = source['table']
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+                     + ' '.join(_insert_sql(entity, 'NEW')) + ' END')
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {source['watch']} ON {table} BEGIN "
+                     + ' '.join(_delete_sql(entity, 'OLD') + _insert_sql(entity, 'NEW')) + ' END')
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+                     + ' '.join(_delete_sql(entity, 'OLD')) + ' END')
+
+        # Index the rows that already exist
+        for statement in _insert_sql(entity, table, f' FROM {table}'):
+            conn.execute(statement)
+
+    # Phonetic codes for existing names; later changes are drained by search.refresh_phonetic
+    queued = conn.execute(
+        'SELECT rowid, first_name, last_name FROM search_index WHERE rowid IN (SELECT doc_rowid FROM search_phonetic_queue)'
+    ).fetchall()
+    for rowid, first_name, last_name in queued:
+        conn.execute('UPDATE search_index SET phonetic = ? WHERE rowid = ?', (phonetic_key(f'{first_name} {last_name}'), rowid))
+    conn.execute('DELETE FROM search_phonetic_queue')
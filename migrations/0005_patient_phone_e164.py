@@ -0,0 +1,50 @@
+"""Normalized E.164 phone column for caller-ID lookups (see phone_lookup.py).
+
+Runs online: the column and its partial unique index are added in one short
+transaction, then existing rows are backfilled in small chunks. Patients
+sharing a number keep phone_e164 NULL after the first one, since caller ID can
+only identify one of them.
+"""
+import logging
+
+from db_migrate import add_column
+from phone_lookup import claimable_phone_e164
+
+ONLINE = True
+
+CHUNK_SIZE = 500
+
+
+def upgrade(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        add_column(conn, 'patients', 'phone_e164', 'TEXT')
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_patients_phone_e164 ON patients(phone_e164) '
+                     'WHERE phone_e164 IS NOT NULL')
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    # Patient ids are sparse 7-digit numbers, so page by key rather than by id range
+    last_id = -1
+    filled = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute('SELECT id, phone FROM patients WHERE id > ? ORDER BY id LIMIT ?',
+                                (last_id, CHUNK_SIZE)).fetchall()
+            for patient_id, phone in rows:
+                e164 = claimable_phone_e164(conn, phone, patient_id)
+                if e164:
+                    conn.execute('UPDATE patients SET phone_e164 = ? WHERE id = ? AND phone_e164 IS NULL',
+                                 (e164, patient_id))
+                    filled += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if len(rows) < CHUNK_SIZE:
+            break
+        last_id = rows[-1][0]
+    logging.info(f"[MIGRATE] Normalized {filled} patient phone numbers")
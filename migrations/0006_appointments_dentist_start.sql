@@ -0,0 +1,5 @@
+-- Schedules read one dentist's appointments over a time range; this index
+-- serves that as a single range scan and makes the dentist_id-only index redundant
+CREATE INDEX IF NOT EXISTS idx_appointments_dentist_start ON appointments(dentist_id, start_time);
+
+DROP INDEX IF EXISTS idx_appointments_dentist;
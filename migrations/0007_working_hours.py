@@ -0,0 +1,47 @@
+"""Normalized working hours (see working_hours.py).
+
+dentist_working_hours holds each dentist's weekly template as minute ranges,
+parsed from whichever format dentists.working_hours is in ({start, end} from the
+schema default or the profile page's morning/afternoon/evening flags).
+schedule_exceptions holds days off, partial closures, extra hours and clinic-wide
+holidays (dentist_id NULL). dentists.hours_version is bumped on every change so
+per-process caches know when to reload.
+"""
+import logging
+
+from db_migrate import add_column
+from working_hours import parse_weekly_hours, save_weekly_hours
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dentist_working_hours (
+            dentist_id INTEGER NOT NULL REFERENCES dentists(id),
+            weekday INTEGER NOT NULL CHECK(weekday BETWEEN 0 AND 6),  -- 0 = Monday
+            start_minute INTEGER NOT NULL,
+            end_minute INTEGER NOT NULL,
+            CHECK(start_minute >= 0 AND start_minute < end_minute AND end_minute <= 1440),
+            PRIMARY KEY (dentist_id, weekday, start_minute)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schedule_exceptions (
+            id INTEGER PRIMARY KEY,
+            dentist_id INTEGER REFERENCES dentists(id),  -- NULL: the whole clinic
+            date TEXT NOT NULL,  -- YYYY-MM-DD
+            start_minute INTEGER,  -- NULL start and end: the whole day
+            end_minute INTEGER,
+            available INTEGER NOT NULL DEFAULT 0,  -- 0: closed, 1: extra working hours
+            reason TEXT NOT NULL DEFAULT ''
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_schedule_exceptions_dentist_date ON schedule_exceptions(dentist_id, date)')
+    add_column(conn, 'dentists', 'hours_version', 'INTEGER NOT NULL DEFAULT 0')
+
+    for dentist_id, raw in conn.execute('SELECT id, working_hours FROM dentists').fetchall():
+        try:
+            weekly = parse_weekly_hours(raw)
+        except ValueError as e:
+            logging.warning(f"[MIGRATE] Dentist {dentist_id} has unusable working_hours ({e}); no working days set")
+            weekly = (0,) * 7
+        save_weekly_hours(conn, dentist_id, weekly)
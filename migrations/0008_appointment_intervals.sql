@@ -0,0 +1,15 @@
+-- Bookings check for overlaps with a range scan on (owner, start_time) that also
+-- reads end_time from the index. Both indexes extend the ones they replace.
+-- Times are stored as 'YYYY-MM-DD HH:MM:SS' so they compare as strings; the web
+-- forms used to store 'YYYY-MM-DDTHH:MM', which sorts after same-day rows.
+UPDATE appointments SET start_time = datetime(start_time)
+WHERE datetime(start_time) IS NOT NULL AND start_time != datetime(start_time);
+
+UPDATE appointments SET end_time = datetime(end_time)
+WHERE datetime(end_time) IS NOT NULL AND end_time != datetime(end_time);
+
+CREATE INDEX IF NOT EXISTS idx_appointments_dentist_interval ON appointments(dentist_id, start_time, end_time);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient_interval ON appointments(patient_id, start_time, end_time);
+
+DROP INDEX IF EXISTS idx_appointments_dentist_start;
+DROP INDEX IF EXISTS idx_appointments_patient;
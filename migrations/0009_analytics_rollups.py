@@ -0,0 +1,113 @@
+"""Daily billing and payment rollups for reports (see analytics.py).
+
+billing_daily and payment_daily hold counts and sums per day, dentist (0 when
+the bill has none), service and status. Triggers apply every insert, update and
+delete on billing and payments as a delta, so the rollups never need a batch
+job; a bill's dentist or service changing moves its payments along with it.
+Rows whose count drops to zero are removed.
+"""
+from analytics import BILLING_ROLLUP_SQL, PAYMENT_ROLLUP_SQL
+
+ROLLUP_KEY = ('day', 'dentist_id', 'service_id', 'status')
+BILLING_SUMS = ('bills', 'billed', 'insurance', 'outstanding')
+PAYMENT_SUMS = ('payments', 'amount')
+
+
+def _upsert(table, sums):
+    key = ', '.join(ROLLUP_KEY)
+    columns = ', '.join(ROLLUP_KEY + sums)
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in sums)
+    return f'INSERT INTO {table} ({columns}) {{source}} ON CONFLICT ({key}) DO UPDATE SET {updates};'
+
+
+def _billing_delta(r, sign):
+    return _upsert('billing_daily', BILLING_SUMS).format(source=(
+        f"VALUES ({_billing_day(r)}, COALESCE({r}.dentist_id, 0), {r}.service_id, {r}.status, "
+        f"{sign}1, {sign}{r}.amount, {sign}COALESCE({r}.insurance_coverage, 0), {sign}{r}.patient_portion)"
+    ))
+
+
+def _payment_delta(r, sign):
+    return _upsert('payment_daily', PAYMENT_SUMS).format(source=(
+        f"SELECT {_payment_day(r)}, COALESCE(b.dentist_id, 0), b.service_id, {r}.status, "
+        f"{sign}1, {sign}{r}.amount FROM billing b WHERE b.id = {r}.billing_id"
+    ))
+
+
+def _bill_payments_delta(r, sign):
+    """Move all of a bill's payments to or from the bill's (dentist, service) key"""
+    return _upsert('payment_daily', PAYMENT_SUMS).format(source=(
+        f"SELECT {_payment_day('p')}, COALESCE({r}.dentist_id, 0), {r}.service_id, p.status, "
+        f"{sign}COUNT(*), {sign}SUM(p.amount) FROM payments p WHERE p.billing_id = {r}.id GROUP BY 1, 4"
+    ))
+
+
+def _prune(table, count, days):
+    """Drop emptied rows; days limits the delete to the affected days (a prefix of the primary key)"""
+    return f'DELETE FROM {table} WHERE day IN ({days}) AND {count} = 0;'
+
+
+def _billing_day(r):
+    return f"COALESCE(date({r}.due_date), '')"
+
+
+def _payment_day(r):
+    return f"COALESCE(date({r}.payment_date), '')"
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS billing_daily (
+            day TEXT NOT NULL,  -- date(due_date)
+            dentist_id INTEGER NOT NULL,  -- 0: no dentist
+            service_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            bills INTEGER NOT NULL DEFAULT 0,
+            billed REAL NOT NULL DEFAULT 0,  -- SUM(amount)
+            insurance REAL NOT NULL DEFAULT 0,  -- SUM(insurance_coverage)
+            outstanding REAL NOT NULL DEFAULT 0,  -- SUM(patient_portion)
+            PRIMARY KEY (day, dentist_id, service_id, status)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payment_daily (
+            day TEXT NOT NULL,  -- date(payment_date)
+            dentist_id INTEGER NOT NULL,  -- the bill's dentist, 0: none
+            service_id INTEGER NOT NULL,  -- the bill's service
+            status TEXT NOT NULL,  -- the payment's status
+            payments INTEGER NOT NULL DEFAULT 0,
+            amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, dentist_id, service_id, status)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_billing_daily_dentist ON billing_daily(dentist_id, day)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_payment_daily_dentist ON payment_daily(dentist_id, day)')
+
+    conn.execute('CREATE TRIGGER IF NOT EXISTS billing_rollup_insert AFTER INSERT ON billing BEGIN '
+                 + _billing_delta('NEW', '') + ' END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS billing_rollup_update AFTER UPDATE OF '
+                 'due_date, dentist_id, service_id, status, amount, insurance_coverage, patient_portion ON billing BEGIN '
+                 + _billing_delta('OLD', '-') + ' ' + _billing_delta('NEW', '') + ' '
+                 + _prune('billing_daily', 'bills', _billing_day('OLD')) + ' END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS billing_rollup_delete AFTER DELETE ON billing BEGIN '
+                 + _billing_delta('OLD', '-') + ' ' + _prune('billing_daily', 'bills', _billing_day('OLD')) + ' END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS billing_rollup_move_payments AFTER UPDATE OF dentist_id, service_id ON billing '
+                 'WHEN OLD.dentist_id IS NOT NEW.dentist_id OR OLD.service_id IS NOT NEW.service_id BEGIN '
+                 + _bill_payments_delta('OLD', '-') + ' ' + _bill_payments_delta('NEW', '') + ' '
+                 + _prune('payment_daily', 'payments',
+                          "SELECT COALESCE(date(payment_date), '') FROM payments WHERE billing_id = OLD.id") + ' END')
+
+    conn.execute('CREATE TRIGGER IF NOT EXISTS payments_rollup_insert AFTER INSERT ON payments BEGIN '
+                 + _payment_delta('NEW', '') + ' END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS payments_rollup_update AFTER UPDATE OF '
+                 'payment_date, billing_id, status, amount ON payments BEGIN '
+                 + _payment_delta('OLD', '-') + ' ' + _payment_delta('NEW', '') + ' '
+                 + _prune('payment_daily', 'payments', _payment_day('OLD')) + ' END')
+    conn.execute('CREATE TRIGGER IF NOT EXISTS payments_rollup_delete AFTER DELETE ON payments BEGIN '
+                 + _payment_delta('OLD', '-') + ' ' + _prune('payment_daily', 'payments', _payment_day('OLD')) + ' END')
+
+    # Roll up the rows that already exist
+    conn.execute('DELETE FROM billing_daily')
+    conn.execute('DELETE FROM payment_daily')
+    conn.execute(BILLING_ROLLUP_SQL)
+    conn.execute(PAYMENT_ROLLUP_SQL)
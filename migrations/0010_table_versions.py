@@ -0,0 +1,39 @@
+"""Per-table write counters for the query-result cache (see query_cache.py).
+
+table_versions holds one row per table; triggers bump it on every insert,
+update and delete, so every write path invalidates cached reads of the table
+without having to know about the cache. A counter only moves when the write
+commits, since the bump is part of the same transaction.
+"""
+
+VERSIONED_TABLES = (
+    'patients',
+    'dentists',
+    'dental_services',
+    'appointments',
+    'billing',
+    'payments',
+    'payment_methods',
+    'insurance_claims',
+    'treatment_history',
+    'dentist_working_hours',
+    'schedule_exceptions',
+)
+
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    for table in VERSIONED_TABLES:
+        conn.execute('INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)', (table,))
+        for event in ('insert', 'update', 'delete'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS {table}_version_{event} AFTER {event.upper()} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                END
+            ''')
@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+
+# Outbound calls are grouped by what they do; each group has its own breaker
+ENDPOINT_CLASSES = ('mfa', 'sms', 'mms')
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_REQUEST_BUDGET = 25
+# Left for the rest of the request after an outbound call times out
+RESPONSE_RESERVE = 1.0
+# Below this much time there is no point starting a call
+MIN_TIMEOUT = 0.5
+CONNECT_TIMEOUT = 3.05
+
+
+class OutboundUnavailable(Exception):
+    """An outbound call was not attempted; callers fall back instead of waiting"""
+
+    def __init__(self, endpoint, reason):
+        super().__init__(f"{endpoint} is unavailable: {reason}")
+        self.endpoint = endpoint
+
+
+class CircuitOpenError(OutboundUnavailable):
+    pass
+
+
+class DeadlineExceeded(OutboundUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures; after
+    reset_timeout one probe call is let through (half-open), which closes the
+    breaker on success or reopens it on failure."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'successes': 0, 'failures': 0, 'timeouts': 0,
+                         'rejected': 0, 'deadline_skips': 0, 'opened': 0}
+
+    def available(self):
+        """Whether a call would be let through now (without claiming a half-open probe)"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            return not self._probing and time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                logging.info(f"[OUTBOUND] {self.name} circuit half-open; probing")
+            if self.state == 'half_open':
+                if self._probing:
+                    self.counters['rejected'] += 1
+                    return False
+                self._probing = True
+            elif self.state == 'open':
+                self.counters['rejected'] += 1
+                return False
+            self.counters['calls'] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.counters['successes'] += 1
+            self.consecutive_failures = 0
+            self._probing = False
+            if self.state != 'closed':
+                logging.info(f"[OUTBOUND] {self.name} circuit closed")
+                self.state = 'closed'
+
+    def record_failure(self, timed_out=False):
+        with self._lock:
+            self.counters['failures'] += 1
+            if timed_out:
+                self.counters['timeouts'] += 1
+            self.consecutive_failures += 1
+            self._probing = False
+            if self.state == 'half_open' or (self.state == 'closed' and self.consecutive_failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.counters['opened'] += 1
+                logging.warning(f"[OUTBOUND] {self.name} circuit open after {self.consecutive_failures} "
+                                f"consecutive failure(s); failing fast for {self.reset_timeout}s")
+
+    def stats(self):
+        with self._lock:
+            calls = self.counters['calls']
+            return dict(self.counters, state=self.state, consecutive_failures=self.consecutive_failures,
+                        timeout_rate=round(self.counters['timeouts'] / calls, 4) if calls else None)
+
+
+class Outbound:
+    """Deadlines and circuit breakers for calls to SignalWire.
+
+    Every call gets a timeout of at most the endpoint class's timeout and never
+    more than what is left of the inbound request's budget (start_request() at
+    the start of each request, end_request() at the end), so a slow carrier
+    can't hold a worker thread past the point where the client has given up.
+    Calls made outside a request (background jobs) only get the class timeout.
+    Network errors, timeouts, 429 and 5xx count against the class's breaker;
+    while it is open calls raise CircuitOpenError at once. Breakers are per
+    process.
+    """
+
+    def __init__(self, timeouts=None, request_budget=DEFAULT_REQUEST_BUDGET, failure_threshold=5, reset_timeout=30):
+        self.timeouts = dict({endpoint: DEFAULT_TIMEOUT for endpoint in ENDPOINT_CLASSES}, **(timeouts or {}))
+        self.request_budget = request_budget
+        self.breakers = {endpoint: CircuitBreaker(endpoint, failure_threshold, reset_timeout) for endpoint in self.timeouts}
+        self._local = threading.local()
+
+    def start_request(self, budget=None):
+        self._local.deadline = time.monotonic() + (self.request_budget if budget is None else budget)
+
+    def end_request(self):
+        self._local.deadline = None
+
+    def remaining(self):
+        """Seconds left of the current request's budget, or None outside a request"""
+        deadline = getattr(self._local, 'deadline', None)
+        return None if deadline is None else deadline - time.monotonic()
+
+    def timeout_for(self, endpoint):
+        timeout = self.timeouts[endpoint]
+        remaining = self.remaining()
+        if remaining is not None:
+            timeout = min(timeout, remaining - RESPONSE_RESERVE)
+        if timeout < MIN_TIMEOUT:
+            self.breakers[endpoint].counters['deadline_skips'] += 1
+            raise DeadlineExceeded(endpoint, 'request deadline reached')
+        return timeout
+
+    def available(self, endpoint):
+        return self.breakers[endpoint].available()
+
+    def call(self, endpoint, fn, failed=None):
+        """fn(timeout) through the endpoint's breaker; failed(result) marks a returned response as a failure"""
+        breaker = self.breakers[endpoint]
+        timeout = self.timeout_for(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(endpoint, 'circuit open after repeated failures')
+        try:
+            result = fn(timeout)
+        except Exception as e:
+            import requests
+            breaker.record_failure(timed_out=isinstance(e, requests.Timeout))
+            raise
+        if failed is not None and failed(result):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return result
+
+    def post(self, endpoint, url, **kwargs):
+        """requests.post with the endpoint's deadline and breaker"""
+        import requests
+        return self.call(endpoint, lambda timeout: requests.post(url, timeout=(min(CONNECT_TIMEOUT, timeout), timeout), **kwargs),
+                         failed=lambda response: _server_failure(response.status_code))
+
+    def signalwire_http_client(self):
+        """An HTTP client for signalwire.rest.Client that sends its requests through this layer"""
+        from twilio.http.http_client import TwilioHttpClient
+        outbound = self
+
+        class DeadlineHttpClient(TwilioHttpClient):
+            def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None,
+                        allow_redirects=False):
+                endpoint = 'mms' if data and data.get('MediaUrl') else 'sms'
+                send = super().request
+                return outbound.call(
+                    endpoint,
+                    lambda timeout: send(method, url, params, data, headers, auth, timeout, allow_redirects),
+                    failed=lambda response: _server_failure(response.status_code),
+                )
+
+        return DeadlineHttpClient(timeout=max(self.timeouts.values()))
+
+    def stats(self):
+        return {
+            'timeouts': self.timeouts,
+            'request_budget': self.request_budget,
+            'endpoints': {endpoint: breaker.stats() for endpoint, breaker in self.breakers.items()},
+        }
+
+
+def _server_failure(status_code):
+    return status_code == 429 or status_code >= 500
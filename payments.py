@@ -0,0 +1,133 @@
+import logging
+import secrets
+import sqlite3
+
+# Bills in these states can no longer take payments
+CLOSED_BILL_STATUSES = ('paid', 'cancelled')
+
+
+class PaymentError(Exception):
+    """A payment was rejected; status is the HTTP status the web API should return"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def to_cents(amount):
+    """Convert a dollar amount (number or numeric string) to integer cents"""
+    try:
+        return int(round(float(amount) * 100))
+    except (TypeError, ValueError):
+        raise PaymentError('Invalid payment amount')
+
+
+def _result(payment, bill, replayed):
+    return {
+        'payment_id': payment['id'],
+        'transaction_id': payment['transaction_id'],
+        'billing_id': bill['id'],
+        'patient_id': bill['patient_id'],
+        'amount': payment['amount'],
+        'remaining_balance': bill['patient_portion'],
+        'bill_status': bill['status'],
+        'reference_number': bill['reference_number'],
+        'bill_number': bill['bill_number'],
+        'replayed': replayed,
+    }
+
+
+def post_payment(db, patient_id, billing_id, payment_method_id, amount, idempotency_key=None,
+                 notes='', min_amount=None, transaction_prefix='', _retried=False):
+    """Post a payment against a bill atomically and return the posted payment.
+
+    The ownership checks, balance read, payment insert and billing update all run
+    inside one BEGIN IMMEDIATE transaction, so two payers hitting the same bill
+    are serialized and the second one sees the first one's balance. When an
+    idempotency key is given, a retry with the same key returns the original
+    payment (with replayed=True) instead of charging again.
+
+    patient_id is patients.id (the integer key billing and payments reference).
+    """
+    amount_cents = to_cents(amount)
+    if amount_cents <= 0:
+        raise PaymentError('Payment amount must be greater than zero')
+    if min_amount is not None and amount_cents < to_cents(min_amount):
+        raise PaymentError(f'The minimum payment amount is ${float(min_amount):.2f}')
+    if db.in_transaction:
+        # Don't fold whatever the caller had pending into the payment transaction
+        db.commit()
+
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        if idempotency_key:
+            existing = db.execute(
+                'SELECT * FROM payments WHERE patient_id = ? AND idempotency_key = ?',
+                (patient_id, idempotency_key)
+            ).fetchone()
+            if existing:
+                if int(existing['billing_id']) != int(billing_id) or to_cents(existing['amount']) != amount_cents:
+                    raise PaymentError('Idempotency key was already used for a different payment', 409)
+                bill = db.execute('SELECT * FROM billing WHERE id = ?', (existing['billing_id'],)).fetchone()
+                db.rollback()
+                logging.info(f"[PAYMENT] Replayed payment {existing['id']} for idempotency key {idempotency_key}")
+                return _result(existing, bill, replayed=True)
+
+        bill = db.execute(
+            'SELECT * FROM billing WHERE id = ? AND patient_id = ?', (billing_id, patient_id)
+        ).fetchone()
+        if not bill:
+            raise PaymentError('Bill not found', 404)
+        if bill['status'] in CLOSED_BILL_STATUSES:
+            raise PaymentError(f"This bill is already {bill['status']}", 409)
+
+        method = db.execute(
+            'SELECT method_type FROM payment_methods WHERE id = ? AND patient_id = ?',
+            (payment_method_id, patient_id)
+        ).fetchone()
+        if not method:
+            raise PaymentError('Invalid payment method or payment method does not belong to your account')
+
+        balance_cents = to_cents(bill['patient_portion'])
+        if amount_cents > balance_cents:
+            raise PaymentError(
+                f'Payment amount ${amount_cents / 100:.2f} exceeds the remaining balance of ${balance_cents / 100:.2f}', 409
+            )
+
+        remaining_cents = balance_cents - amount_cents
+        new_status = 'partial' if remaining_cents > 0 else 'paid'
+        transaction_id = f'{transaction_prefix}{secrets.token_hex(8).upper()}'
+
+        cursor = db.execute('''
+            INSERT INTO payments (billing_id, patient_id, amount, payment_date, payment_method_id, payment_method_type,
+                                  status, transaction_id, notes, idempotency_key)
+            VALUES (?, ?, ?, datetime('now'), ?, ?, 'completed', ?, ?, ?)
+        ''', (bill['id'], patient_id, amount_cents / 100, payment_method_id, method['method_type'],
+              transaction_id, notes, idempotency_key))
+        payment_id = cursor.lastrowid
+
+        db.execute('UPDATE billing SET patient_portion = ?, status = ?, payment_id = ? WHERE id = ?',
+                   (remaining_cents / 100, new_status, payment_id, bill['id']))
+
+        payment = db.execute('SELECT * FROM payments WHERE id = ?', (payment_id,)).fetchone()
+        bill = db.execute('SELECT * FROM billing WHERE id = ?', (bill['id'],)).fetchone()
+        db.commit()
+    except PaymentError:
+        db.rollback()
+        raise
+    except sqlite3.IntegrityError:
+        # A concurrent request with the same idempotency key won the race
+        db.rollback()
+        if idempotency_key and not _retried:
+            return post_payment(db, patient_id, billing_id, payment_method_id, amount,
+                                idempotency_key=idempotency_key, notes=notes, min_amount=min_amount,
+                                transaction_prefix=transaction_prefix, _retried=True)
+        raise
+    except Exception:
+        db.rollback()
+        raise
+
+    logging.info(f"[PAYMENT] Posted payment {payment_id} of ${amount_cents / 100:.2f} to bill {bill['id']}, "
+                 f"remaining ${remaining_cents / 100:.2f}")
+    return _result(payment, bill, replayed=False)
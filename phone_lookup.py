@@ -0,0 +1,139 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+def validate_phone(phone):
+    """Validate phone number is in E.164 format: +[country code][number]"""
+    if not phone:
+        return False
+    # E.164 format: + followed by 1-3 digit country code, then 4-14 digits
+    # Total length should be 8-18 characters (+ plus 7-17 digits)
+    pattern = r'^\+[1-9]\d{6,14}$'
+    return bool(re.match(pattern, str(phone).strip()))
+
+
+def format_to_e164(phone, default_country_code='1'):
+    """Format phone number to E.164 format"""
+    if not phone:
+        return None
+
+    # Clean the phone number - remove all non-digit characters except +
+    cleaned = ''.join(char for char in str(phone) if char.isdigit() or char == '+')
+
+    # If already starts with +, validate and return if valid
+    if cleaned.startswith('+'):
+        if validate_phone(cleaned):
+            return cleaned
+        else:
+            return None
+
+    # If it's a 10-digit number (US format), add +1
+    if len(cleaned) == 10 and cleaned.isdigit():
+        formatted = f'+{default_country_code}{cleaned}'
+        return formatted if validate_phone(formatted) else None
+
+    # If it's an 11-digit number starting with 1 (US format with country code)
+    if len(cleaned) == 11 and cleaned.startswith('1'):
+        formatted = f'+{cleaned}'
+        return formatted if validate_phone(formatted) else None
+
+    # If it's just digits and reasonable length, try adding default country code
+    if cleaned.isdigit() and 7 <= len(cleaned) <= 14:
+        formatted = f'+{default_country_code}{cleaned}'
+        return formatted if validate_phone(formatted) else None
+
+    return None
+
+
+class CallerIdCache:
+    """Per-process LRU of E.164 number -> patients.id (None for unknown callers).
+
+    Hits are re-checked against the row they point to, so an entry made stale by
+    another worker's profile write costs one extra probe rather than a wrong
+    answer. Unknown numbers are remembered for a shorter time so a newly added
+    phone number is picked up quickly.
+    """
+
+    def __init__(self, max_size=10000, ttl=300, negative_ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, phone):
+        """Return (found, patient_id)"""
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(phone, None)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(phone)
+            self.hits += 1
+            return True, entry[0]
+
+    def set(self, phone, patient_id):
+        ttl = self.ttl if patient_id is not None else self.negative_ttl
+        with self._lock:
+            self._entries[phone] = (patient_id, time.monotonic() + ttl)
+            self._entries.move_to_end(phone)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, phone):
+        if phone:
+            with self._lock:
+                self._entries.pop(phone, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+caller_id_cache = CallerIdCache()
+
+
+def lookup_patient_by_phone(db, phone):
+    """Return the patient whose normalized phone equals phone (any format), or None"""
+    e164 = format_to_e164(phone)
+    if not e164:
+        return None
+    found, patient_id = caller_id_cache.get(e164)
+    if found:
+        if patient_id is None:
+            return None
+        patient = db.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
+        if patient and patient['phone_e164'] == e164:
+            return patient
+    patient = db.execute('SELECT * FROM patients WHERE phone_e164 = ?', (e164,)).fetchone()
+    caller_id_cache.set(e164, patient['id'] if patient else None)
+    return patient
+
+
+def claimable_phone_e164(db, phone, patient_id):
+    """E.164 form of phone, or None if it is invalid or another patient already has it"""
+    e164 = format_to_e164(phone)
+    if e164 and db.execute('SELECT 1 FROM patients WHERE phone_e164 = ? AND id != ?', (e164, patient_id)).fetchone():
+        logging.warning(f"[CALLER-ID] {e164} already belongs to another patient; not used for caller ID of patient {patient_id}")
+        return None
+    return e164
+
+
+def sync_patient_phone_e164(db, patient_id):
+    """Recompute patients.phone_e164 for one patient; call after any write to patients.phone"""
+    row = db.execute('SELECT phone, phone_e164 FROM patients WHERE id = ?', (patient_id,)).fetchone()
+    if row is None:
+        return None
+    phone, old_e164 = row[0], row[1]
+    e164 = claimable_phone_e164(db, phone, patient_id)
+    if e164 != old_e164:
+        db.execute('UPDATE patients SET phone_e164 = ? WHERE id = ?', (e164, patient_id))
+        caller_id_cache.invalidate(old_e164)
+        caller_id_cache.invalidate(e164)
+    return e164
@@ -0,0 +1,174 @@
+import functools
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def parse_ttls(text):
+    """'dentist_dashboard=10,swaig_bills=60' -> {'dentist_dashboard': 10, 'swaig_bills': 60}"""
+    ttls = {}
+    for item in (text or '').split(','):
+        name, _, seconds = item.partition('=')
+        if name.strip() and seconds.strip():
+            ttls[name.strip()] = int(seconds)
+    return ttls
+
+
+def _size(value):
+    """Rough in-memory size of a query result, for the byte bound"""
+    if isinstance(value, (list, tuple, sqlite3.Row)):
+        return sys.getsizeof(value) + sum(_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_size(k) + _size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+def table_versions(db, tables):
+    """The current write versions of tables, in order (see migration 0010)"""
+    placeholders = ', '.join('?' for _ in tables)
+    rows = db.execute(f'SELECT name, version FROM table_versions WHERE name IN ({placeholders})', tables).fetchall()
+    found = dict(tuple(row) for row in rows)
+    missing = set(tables) - found.keys()
+    if missing:
+        # A table without triggers would never invalidate; fail loudly instead of serving stale rows
+        raise LookupError(f"No version for table(s) {', '.join(sorted(missing))}; add them to migration 0010")
+    return tuple(found[table] for table in tables)
+
+
+class QueryCache:
+    """Per-process read-through cache of named query results.
+
+    cached(name, tables) wraps a function fn(db, *args) that only reads the
+    given tables. Its result is stored under (name, args) together with the
+    tables' versions from table_versions, which triggers bump on every write
+    (migration 0010). A lookup re-reads the versions and serves the entry only
+    while none has moved, so a write in any worker process invalidates every
+    process's copy on its next read. Entries also expire after the query's TTL
+    (ttls overrides the decorator's, ttl=0 never expires), which bounds how
+    stale anything not covered by a version can get, such as date('now').
+
+    Results are shared between callers and must be treated as read-only;
+    return rows or tuples rather than dicts the caller might change. Calls made
+    while the connection has a write transaction open bypass the cache, since
+    they may see uncommitted rows and versions.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, default_ttl=DEFAULT_TTL, ttls=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._declared_ttls = {}
+
+    def cached(self, name, tables, ttl=None):
+        tables = tuple(sorted(tables))
+        self._queries[name] = self._new_counters(tables)
+        self._declared_ttls[name] = ttl
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(db, *args):
+                return self._call(name, tables, ttl, fn, db, args)
+            wrapper.uncached = fn
+            wrapper.query_name = name
+            return wrapper
+        return decorator
+
+    def _new_counters(self, tables):
+        return {'tables': list(tables), 'hits': 0, 'misses': 0, 'stale': 0, 'expired': 0,
+                'bypassed': 0, 'evictions': 0, 'entries': 0, 'bytes': 0}
+
+    def _ttl(self, name, ttl):
+        if name in self.ttls:
+            return self.ttls[name]
+        return self.default_ttl if ttl is None else ttl
+
+    def _call(self, name, tables, ttl, fn, db, args):
+        counters = self._queries[name]
+        if db.in_transaction or not self.max_entries:
+            counters['bypassed'] += 1
+            return fn(db, *args)
+        key = (name, args)
+        versions = table_versions(db, tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, entry_versions, expires_at, _ = entry
+                if entry_versions != versions:
+                    counters['stale'] += 1
+                    self._drop(key)
+                elif expires_at is not None and expires_at < time.monotonic():
+                    counters['expired'] += 1
+                    self._drop(key)
+                else:
+                    self._entries.move_to_end(key)
+                    counters['hits'] += 1
+                    return value
+            counters['misses'] += 1
+        # The versions were read before the query, so a write landing in between
+        # leaves the entry tagged older than its rows: a spurious miss, never a stale hit
+        value = fn(db, *args)
+        ttl = self._ttl(name, ttl)
+        self._store(key, (value, versions, time.monotonic() + ttl if ttl else None, _size(value)))
+        return value
+
+
+    def _store(self, key, entry):
+        size = entry[3]
+        if size > self.max_bytes:
+            logging.info(f"[CACHE] {key[0]} result of ~{size} bytes is over the cache's byte limit; not cached")
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            counters = self._queries[key[0]]
+            counters['entries'] += 1
+            counters['bytes'] += size
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._queries[oldest[0]]['evictions'] += 1
+                self._drop(oldest)
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            counters = self._queries[key[0]]
+            counters['entries'] -= 1
+            counters['bytes'] -= entry[3]
+            self.bytes -= entry[3]
+
+    def invalidate(self, name=None):
+        """Drop every entry of one named query, or all of them"""
+        with self._lock:
+            for key in [key for key in self._entries if name is None or key[0] == name]:
+                self._drop(key)
+
+    def clear(self):
+        self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            queries = {}
+            for name, counters in self._queries.items():
+                lookups = counters['hits'] + counters['misses']
+                queries[name] = dict(counters, ttl=self._ttl(name, self._declared_ttls[name]),
+                                     hit_rate=round(counters['hits'] / lookups, 4) if lookups else None)
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'queries': queries,
+            }
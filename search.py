@@ -0,0 +1,160 @@
+import logging
+import re
+import sqlite3
+
+# Every indexed row gets a stable FTS rowid: <source id> * ENTITY_STRIDE + <entity code>
+ENTITY_CODES = {'patient': 0, 'dentist': 1, 'service': 2, 'bill': 3}
+ENTITY_STRIDE = 4
+
+# Entities whose names get phonetic codes ("Jon Smyth" finds "John Smith")
+PHONETIC_ENTITIES = ('patient', 'dentist')
+
+_TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+
+_SOUNDEX_CODES = {}
+for _letters, _digit in (('bfpv', '1'), ('cgjkqsxz', '2'), ('dt', '3'), ('l', '4'), ('mn', '5'), ('r', '6')):
+    for _letter in _letters:
+        _SOUNDEX_CODES[_letter] = _digit
+
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall((text or '').lower())
+
+
+def soundex(word):
+    """American Soundex code for a single word (e.g. 'Robert' -> 'R163')"""
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        # h and w don't separate letters with the same code; vowels do
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def phonetic_key(text):
+    return ' '.join(code for code in (soundex(word) for word in tokenize(text)) if code)
+
+
+def refresh_phonetic(db, batch_size=500):
+    """Fill in phonetic codes for documents the triggers queued since the last search.
+
+    Codes are computed here rather than in the triggers so writes from any SQLite
+    client (not only connections with a custom function registered) keep working.
+    Skipped when the caller already has a transaction open.
+    """
+    if db.in_transaction:
+        return 0
+    rowids = [row[0] for row in db.execute('SELECT doc_rowid FROM search_phonetic_queue LIMIT ?', (batch_size,))]
+    if not rowids:
+        return 0
+    try:
+        for rowid in rowids:
+            doc = db.execute('SELECT first_name, last_name FROM search_index WHERE rowid = ?', (rowid,)).fetchone()
+            if doc:
+                db.execute('UPDATE search_index SET phonetic = ? WHERE rowid = ?',
+                           (phonetic_key(f'{doc[0]} {doc[1]}'), rowid))
+            db.execute('DELETE FROM search_phonetic_queue WHERE doc_rowid = ?', (rowid,))
+        db.commit()
+    except sqlite3.OperationalError as e:
+        # Another writer holds the lock; the queue will be drained by a later search
+        db.rollback()
+        logging.warning(f"[SEARCH] Could not refresh phonetic codes: {e}")
+        return 0
+    return len(rowids)
+
+
+def _quote(token):
+    return '"' + token.replace('"', '""') + '"'
+
+
+def _run(db, table, match, entities, owner_id, limit, kind, results, seen):
+    sql = f'''
+        SELECT rowid, entity, entity_id, owner_id, label
+        FROM {table}
+        WHERE {table} MATCH ? AND entity IN ({', '.join('?' for _ in entities)})
+    '''
+    params = [match, *entities]
+    if owner_id is not None:
+        sql += ' AND owner_id = ?'
+        params.append(owner_id)
+    sql += ' ORDER BY rank LIMIT ?'
+    params.append(limit)
+    for row in db.execute(sql, params):
+        if row[0] in seen:
+            continue
+        seen.add(row[0])
+        results.append({'entity': row[1], 'id': row[2], 'owner_id': row[3], 'label': row[4], 'match': kind})
+
+
+def search(db, query, entities=None, owner_id=None, limit=10, fuzzy=True):
+    """Search patients, dentists, services and bills and return the best matches first.
+
+    Matching runs in stages until there are enough results: word prefix
+    matches ("jo sm" -> "John Smith"), then trigram substring matches for longer
+    fragments ("7488" -> "REF-1748809864233-356"), and only when nothing matched
+    so far, phonetic matches on patient and dentist names ("Jon Smyth" -> "John
+    Smith"). owner_id restricts results to one patient's rows.
+
+    Each result is a dict with entity, id, owner_id, label and match (prefix,
+    substring or phonetic).
+    """
+    entities = tuple(entities or ENTITY_CODES)
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    refresh_phonetic(db)
+
+    results = []
+    seen = set()
+    prefix_match = '{first_name last_name label terms} : (' + ' AND '.join(f'{_quote(t)}*' for t in tokens) + ')'
+    _run(db, 'search_index', prefix_match, entities, owner_id, limit, 'prefix', results, seen)
+
+    if fuzzy and len(results) < limit:
+        # Trigram queries need at least three characters per fragment
+        fragments = [t for t in tokens if len(t) >= 3]
+        if fragments:
+            substring_match = ' AND '.join(_quote(f) for f in fragments)
+            _run(db, 'search_trigram', substring_match, entities, owner_id, limit - len(results),
+                 'substring', results, seen)
+
+    phonetic_entities = tuple(e for e in entities if e in PHONETIC_ENTITIES)
+    if fuzzy and phonetic_entities and not results:
+        codes = [soundex(t) for t in tokens if t.isalpha()]
+        if codes:
+            phonetic_match = 'phonetic : (' + ' AND '.join(_quote(c.lower()) for c in codes) + ')'
+            _run(db, 'search_index', phonetic_match, phonetic_entities, owner_id, limit - len(results),
+                 'phonetic', results, seen)
+
+    return results
+
+
+def find_patients_by_name(db, first_name, last_name):
+    """Patients whose first and last name equal the given ones, ignoring case and surrounding spaces"""
+    first_tokens, last_tokens = tokenize(first_name), tokenize(last_name)
+    if not first_tokens or not last_tokens:
+        return []
+    match = ('first_name : (' + ' AND '.join(_quote(t) for t in first_tokens) + ') AND '
+             'last_name : (' + ' AND '.join(_quote(t) for t in last_tokens) + ')')
+    ids = [row[0] for row in db.execute(
+        "SELECT entity_id FROM search_index WHERE search_index MATCH ? AND entity = 'patient'", (match,)
+    )]
+    if not ids:
+        return []
+    # The index matches words; keep only rows whose full names are equal
+    rows = db.execute(f"SELECT * FROM patients WHERE id IN ({', '.join('?' for _ in ids)})", ids).fetchall()
+    first, last = first_name.strip().lower(), last_name.strip().lower()
+    return [row for row in rows if row['first_name'].strip().lower() == first and row['last_name'].strip().lower() == last]
+
+
+def find_bill_ids(db, reference, patient_id, limit=20):
+    """Ids of a patient's bills whose reference or bill number matches, best match first"""
+    return [result['id'] for result in search(db, reference, entities=('bill',), owner_id=patient_id, limit=limit)]
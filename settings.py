@@ -0,0 +1,86 @@
+import os
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuration read once from the environment (after .env is loaded); see environment_variables.txt"""
+
+    signalwire_project_id: str = None
+    signalwire_token: str = None
+    signalwire_space: str = None  # subdomain as configured; space_url is the full URL
+    signalwire_base_url: str = None  # REST calls go here instead of space_url (e.g. benchmarks/signalwire_stub.py)
+    from_number: str = None
+    project_url: str = 'http://localhost:8080'
+    http_username: str = None
+    http_password: str = None
+    c2c_api_key: str = None
+    c2c_address: str = None
+    secret_key: str = 'dev'
+    enable_csrf: bool = False
+    background_jobs_lock: str = 'background_jobs.lock'
+    jinja_cache_dir: str = None
+    cache_backend: str = 'sqlite'  # sqlite: shared by all workers; memory: per process
+    cache_path: str = 'cache.db'
+    swaig_session_ttl: int = 3600  # seconds a SWAIG verification and its challenge token stay valid
+    swaig_response_budget: int = 1500  # characters of text a SWAIG function returns to the agent; 0 for no limit
+    query_cache_ttl: int = 30  # default seconds a cached query result lives (see query_cache.py)
+    query_cache_ttls: str = ''  # per-query overrides, e.g. 'dentist_dashboard=10,swaig_bills=60'
+    query_cache_max_entries: int = 2000  # 0 turns the query cache off
+    query_cache_max_mb: int = 32
+    request_budget: float = 25  # seconds an inbound request may spend; outbound calls never outlive it
+    outbound_timeout: float = 10  # cap on any single SignalWire call (see outbound.py)
+    circuit_failures: int = 5  # consecutive failures that open an endpoint's circuit
+    circuit_reset: int = 30  # seconds an open circuit fails fast before probing again
+
+    @property
+    def space_url(self):
+        """https://<space>.signalwire.com, or None when no space is configured"""
+        if not self.signalwire_space:
+            return None
+        if self.signalwire_space.startswith(('https://', 'http://')):
+            return self.signalwire_space
+        return f"https://{self.signalwire_space}.signalwire.com"
+
+    @property
+    def api_base_url(self):
+        """Where MFA and Messages REST calls are sent: SIGNALWIRE_BASE_URL, else the space"""
+        return (self.signalwire_base_url or '').rstrip('/') or self.space_url
+
+    @property
+    def signalwire_configured(self):
+        return bool(self.signalwire_project_id and self.signalwire_token and self.signalwire_space)
+
+
+def load_settings(environ=None):
+    """Parse the environment into a Settings; unset values keep their defaults"""
+    env = os.environ if environ is None else environ
+    defaults = Settings()
+    return Settings(
+        signalwire_project_id=env.get('SIGNALWIRE_PROJECT_ID'),
+        signalwire_token=env.get('SIGNALWIRE_TOKEN'),
+        signalwire_space=env.get('SIGNALWIRE_SPACE'),
+        signalwire_base_url=env.get('SIGNALWIRE_BASE_URL'),
+        from_number=env.get('FROM_NUMBER'),
+        project_url=env.get('PROJECT_URL', defaults.project_url),
+        http_username=env.get('HTTP_USERNAME'),
+        http_password=env.get('HTTP_PASSWORD'),
+        c2c_api_key=env.get('C2C_API_KEY'),
+        c2c_address=env.get('C2C_ADDRESS'),
+        secret_key=env.get('SECRET_KEY', defaults.secret_key),
+        enable_csrf=env.get('ENABLE_CSRF', 'false').lower() == 'true',
+        background_jobs_lock=env.get('BACKGROUND_JOBS_LOCK', defaults.background_jobs_lock),
+        jinja_cache_dir=env.get('JINJA_CACHE_DIR'),
+        cache_backend=env.get('CACHE_BACKEND', defaults.cache_backend).lower(),
+        cache_path=env.get('CACHE_PATH', defaults.cache_path),
+        swaig_session_ttl=int(env.get('SWAIG_SESSION_TTL', defaults.swaig_session_ttl)),
+        swaig_response_budget=int(env.get('SWAIG_RESPONSE_BUDGET', defaults.swaig_response_budget)),
+        query_cache_ttl=int(env.get('QUERY_CACHE_TTL', defaults.query_cache_ttl)),
+        query_cache_ttls=env.get('QUERY_CACHE_TTLS', defaults.query_cache_ttls),
+        query_cache_max_entries=int(env.get('QUERY_CACHE_MAX_ENTRIES', defaults.query_cache_max_entries)),
+        query_cache_max_mb=int(env.get('QUERY_CACHE_MAX_MB', defaults.query_cache_max_mb)),
+        request_budget=float(env.get('REQUEST_BUDGET', defaults.request_budget)),
+        outbound_timeout=float(env.get('OUTBOUND_TIMEOUT', defaults.outbound_timeout)),
+        circuit_failures=int(env.get('CIRCUIT_FAILURES', defaults.circuit_failures)),
+        circuit_reset=int(env.get('CIRCUIT_RESET', defaults.circuit_reset)),
+    )
@@ -0,0 +1,401 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Returned by backends for a missing or expired entry, so None can be cached
+_MISSING = object()
+
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_TTL = 300
+
+# A hit only rewrites accessed_at when the stored value is older than this, so
+# reads rarely write; LRU order is accurate to this many seconds
+TOUCH_INTERVAL = 5
+
+# The SQLite backend checks its size every this many writes per process
+EVICT_EVERY = 100
+
+
+def _key(key):
+    return key if isinstance(key, str) else repr(key)
+
+
+class Cache:
+    """Namespaced key/value cache with TTL and LRU eviction.
+
+    Backends implement _get, set, add, delete, pop, incr, invalidate, clear
+    and stats. ttl=None uses the cache's default_ttl; ttl=0 never expires.
+    Every entry lives in a namespace so one kind of data can be dropped at
+    once with invalidate(namespace); namespace() returns a bound view.
+
+    Namespaces holding state rather than cached copies (sessions, version
+    counters) are opened with pinned=True: their entries only go when they
+    expire or are deleted, never to LRU eviction. max_entries still counts
+    them, but when the cache is over it only unpinned entries are evicted, so
+    pinned namespaces are bounded by their own TTL and key count.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.pinned = set()  # names of namespaces exempt from LRU eviction
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expires_at(self, ttl, now):
+        ttl = self.default_ttl if ttl is None else ttl
+        return now + ttl if ttl else None
+
+    def get(self, namespace, key, default=None):
+        value = self._get(namespace, _key(key))
+        return default if value is _MISSING else value
+
+    def get_or_set(self, namespace, key, factory, ttl=None):
+        """The cached value, or factory()'s result stored atomically.
+
+        factory may run in more than one process at once on a cold key; the
+        first value stored wins and every caller gets that one.
+        """
+        key = _key(key)
+        value = self._get(namespace, key)
+        if value is not _MISSING:
+            return value
+        value = factory()
+        if self.add(namespace, key, value, ttl):
+            return value
+        stored = self._get(namespace, key)
+        return value if stored is _MISSING else stored
+
+    def namespace(self, name, ttl=None, pinned=False):
+        """A view bound to one namespace; every process sharing the cache must pin the same names"""
+        if pinned:
+            self.pinned.add(name)
+        return CacheNamespace(self, name, ttl)
+
+    def _counters(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / (self.hits + self.misses), 4) if self.hits + self.misses else None,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class CacheNamespace:
+    """A cache bound to one namespace and default TTL"""
+
+    def __init__(self, cache, name, ttl=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        return self.cache.get(self.name, key, default)
+
+    def set(self, key, value, ttl=None):
+        self.cache.set(self.name, key, value, self.ttl if ttl is None else ttl)
+
+    def add(self, key, value, ttl=None):
+        return self.cache.add(self.name, key, value, self.ttl if ttl is None else ttl)
+
+    def get_or_set(self, key, factory, ttl=None):
+        return self.cache.get_or_set(self.name, key, factory, self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        return self.cache.delete(self.name, key)
+
+    def pop(self, key, default=None):
+        return self.cache.pop(self.name, key, default)
+
+    def incr(self, key, delta=1, ttl=None):
+        return self.cache.incr(self.name, key, delta, self.ttl if ttl is None else ttl)
+
+    def __contains__(self, key):
+        return self.cache._get(self.name, _key(key)) is not _MISSING
+
+    def invalidate(self):
+        return self.cache.invalidate(self.name)
+
+
+class MemoryCache(Cache):
+    """Per-process backend: an OrderedDict LRU. Fine for one process; each worker gets its own copy"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        super().__init__(max_entries, default_ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _live(self, full_key, now):
+        entry = self._entries.get(full_key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._entries[full_key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def _get(self, namespace, key):
+        with self._lock:
+            entry = self._live((namespace, key), time.time())
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+            return entry[0]
+
+    def _store(self, full_key, value, ttl, now):
+        self._entries[full_key] = (value, self._expires_at(ttl, now))
+        self._entries.move_to_end(full_key)
+        self.sets += 1
+        if len(self._entries) > self.max_entries:
+            excess = len(self._entries) - self.max_entries
+            victims = []
+            for candidate in self._entries:
+                if candidate[0] not in self.pinned:
+                    victims.append(candidate)
+                    if len(victims) == excess:
+                        break
+            for candidate in victims:
+                del self._entries[candidate]
+            self.evictions += len(victims)
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._store((namespace, _key(key)), value, ttl, time.time())
+
+    def add(self, namespace, key, value, ttl=None):
+        full_key = (namespace, _key(key))
+        now = time.time()
+        with self._lock:
+            if self._live(full_key, now) is not None:
+                return False
+            self._store(full_key, value, ttl, now)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            return self._entries.pop((namespace, _key(key)), None) is not None
+
+    def pop(self, namespace, key, default=None):
+        full_key = (namespace, _key(key))
+        with self._lock:
+            entry = self._live(full_key, time.time())
+            if entry is None:
+                return default
+            del self._entries[full_key]
+            return entry[0]
+
+    def incr(self, namespace, key, delta=1, ttl=None):
+        full_key = (namespace, _key(key))
+        now = time.time()
+        with self._lock:
+            entry = self._live(full_key, now)
+            value = (entry[0] if entry else 0) + delta
+            self._store(full_key, value, ttl, now)
+            return value
+
+    def invalidate(self, namespace):
+        with self._lock:
+            keys = [full_key for full_key in self._entries if full_key[0] == namespace]
+            for full_key in keys:
+                del self._entries[full_key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+        return {'backend': 'memory', 'entries': entries, **self._counters()}
+
+
+class SQLiteCache(Cache):
+    """Backend shared by every process on the host: a separate SQLite file in WAL mode.
+
+    Reads run concurrently with one writer and never wait on the main
+    database. Each thread of each process opens its own connection (checked
+    against the pid, so forked workers never reuse the parent's). Values are
+    pickled. Expired entries are misses and are swept together with the LRU
+    eviction, which runs every EVICT_EVERY writes of a process and trims the
+    file back to max_entries by last access, taking only unpinned entries.
+    Hit/miss/eviction counters are per process; stats() adds the shared entry
+    count.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        super().__init__(max_entries, default_ttl)
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        # Nothing connects until first use, so a preloading gunicorn master hands no handle to its workers
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL,  -- NULL: never expires
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed ON cache_entries(accessed_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_entries_expires ON cache_entries(expires_at)')
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _get(self, namespace, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute('SELECT value, expires_at, accessed_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                           (namespace, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            with self._lock:
+                self.misses += 1
+            return _MISSING
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute('UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?',
+                         (now, namespace, key))
+        with self._lock:
+            self.hits += 1
+        return pickle.loads(row[0])
+
+    def _wrote(self, count=1):
+        with self._lock:
+            self.sets += count
+            self._writes += count
+            due = self._writes >= EVICT_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def set(self, namespace, key, value, ttl=None):
+        now = time.time()
+        self._connect().execute('''
+            INSERT INTO cache_entries (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, key) DO UPDATE SET
+                value = excluded.value, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+        ''', (namespace, _key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires_at(ttl, now), now))
+        self._wrote()
+
+    def add(self, namespace, key, value, ttl=None):
+        """Store only when there is no live entry; returns whether this call stored it"""
+        now = time.time()
+        cursor = self._connect().execute('''
+            INSERT INTO cache_entries (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, key) DO UPDATE SET
+                value = excluded.value, expires_at = excluded.expires_at, accessed_at = excluded.accessed_at
+            WHERE cache_entries.expires_at IS NOT NULL AND cache_entries.expires_at <= ?
+        ''', (namespace, _key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires_at(ttl, now), now, now))
+        stored = cursor.rowcount == 1
+        if stored:
+            self._wrote()
+        return stored
+
+    def delete(self, namespace, key):
+        cursor = self._connect().execute('DELETE FROM cache_entries WHERE namespace = ? AND key = ?',
+                                         (namespace, _key(key)))
+        return cursor.rowcount > 0
+
+    def pop(self, namespace, key, default=None):
+        """Remove and return an entry; of several processes popping the same key only one gets it"""
+        row = self._connect().execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key = ? RETURNING value, expires_at',
+            (namespace, _key(key))).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def incr(self, namespace, key, delta=1, ttl=None):
+        """Atomically add delta to an integer entry (a missing or expired one counts as 0)"""
+        conn = self._connect()
+        key = _key(key)
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                               (namespace, key)).fetchone()
+            live = row is not None and (row[1] is None or row[1] > now)
+            value = (pickle.loads(row[0]) if live else 0) + delta
+            conn.execute('''
+                INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (namespace, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._expires_at(ttl, now), now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._wrote()
+        return value
+
+    def invalidate(self, namespace):
+        """Drop every entry in a namespace (a primary-key range); returns how many"""
+        count = self._connect().execute('DELETE FROM cache_entries WHERE namespace = ?', (namespace,)).rowcount
+        logging.info(f"[CACHE] Invalidated {count} entries in {namespace}")
+        return count
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entries')
+
+    def evict(self):
+        """Sweep expired entries, then the least recently used unpinned ones beyond max_entries"""
+        conn = self._connect()
+        now = time.time()
+        pinned = sorted(self.pinned)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            expired = conn.execute('DELETE FROM cache_entries WHERE expires_at <= ?', (now,)).rowcount
+            excess = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0] - self.max_entries
+            evicted = 0
+            if excess > 0:
+                evicted = conn.execute(f'''
+                    DELETE FROM cache_entries WHERE (namespace, key) IN (
+                        SELECT namespace, key FROM cache_entries
+                        WHERE namespace NOT IN ({', '.join('?' for _ in pinned)})
+                        ORDER BY accessed_at LIMIT ?
+                    )
+                ''', (*pinned, excess)).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self.expirations += expired
+            self.evictions += evicted
+        if evicted:
+            logging.info(f"[CACHE] Evicted {evicted} least recently used entries")
+        return expired, evicted
+
+    def stats(self):
+        entries = self._connect().execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        return {'backend': 'sqlite', 'path': self.path, 'entries': entries, **self._counters()}
+
+
+def open_cache(backend='sqlite', path='cache.db', max_entries=DEFAULT_MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+    """The configured cache: 'sqlite' (shared by all workers) or 'memory' (this process only)"""
+    if backend == 'memory':
+        return MemoryCache(max_entries, default_ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, max_entries, default_ttl)
+    raise ValueError(f"Unknown cache backend '{backend}'; use 'sqlite' or 'memory'")
@@ -0,0 +1,80 @@
+import logging
+import threading
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls in this process into one.
+
+    do(name, key, fn) runs fn() unless a call with the same name and key is
+    already running, in which case it waits for that call and returns its
+    result (or raises its exception). Nothing is kept once the call finishes;
+    pair it with a cache when later callers should reuse the result too. Keys
+    must identify everything the result depends on, including the user it is
+    computed for. A waiter that has waited wait_timeout seconds stops waiting
+    and runs fn() itself, so one stuck call can't hold up every later request.
+    """
+
+    def __init__(self, wait_timeout=30):
+        self.wait_timeout = wait_timeout
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _counter(self, name):
+        counters = self._counters.get(name)
+        if counters is None:
+            counters = self._counters[name] = {'calls': 0, 'coalesced': 0, 'errors': 0, 'timeouts': 0, 'max_waiters': 0}
+        return counters
+
+    def do(self, name, key, fn):
+        flight_key = (name, key)
+        with self._lock:
+            counters = self._counter(name)
+            flight = self._flights.get(flight_key)
+            if flight is None:
+                flight = self._flights[flight_key] = _Flight()
+                counters['calls'] += 1
+                leader = True
+            else:
+                flight.waiters += 1
+                counters['coalesced'] += 1
+                counters['max_waiters'] = max(counters['max_waiters'], flight.waiters)
+                leader = False
+
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                with self._lock:
+                    counters['timeouts'] += 1
+                logging.warning(f"[FLIGHT] {name} {key!r} still running after {self.wait_timeout}s; computing separately")
+                return fn()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._flights[flight_key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'flights': {name: dict(counters) for name, counters in self._counters.items()},
+            }
@@ -26,6 +26,10 @@ REM Install requirements if needed
 echo 📋 Checking dependencies...
 pip install -r requirements.txt --quiet
 
+REM Build fingerprinted, pre-compressed static assets
+echo 🎨 Building static assets...
+python assets.py > nul
+
 REM Start the application
 echo 🚀 Starting SignalWire Dental Office Management System...
 echo.
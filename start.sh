@@ -19,7 +19,19 @@ source venv/bin/activate
 echo "📋 Checking dependencies..."
 pip install -r requirements.txt --quiet
 
-# Initialize database
+# Build fingerprinted, pre-compressed static assets
+echo "🎨 Building static assets..."
+python3 assets.py > /dev/null
+
+# SERVER_MODE=production serves with gunicorn (see gunicorn.conf.py) instead of the dev server.
+# It keeps the existing database: gunicorn creates or migrates the schema at startup, and the
+# reset and demo-data steps below are skipped.
+if [ "$SERVER_MODE" = "production" ]; then
+    echo "🚀 Starting SignalWire Dental Office Management System with gunicorn..."
+    exec gunicorn -c gunicorn.conf.py
+fi
+
+# Initialize database (recreates dental_office.db)
 echo "🗄️  Initializing database..."
 python3 init_db.py
 
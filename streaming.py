@@ -0,0 +1,64 @@
+import logging
+
+from flask import Response, request, stream_with_context
+
+from json_encoding import columns_for, dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Rows fetched from the cursor (and written to the client) per step
+DEFAULT_BATCH_SIZE = 200
+
+
+def wants_ndjson():
+    """True when the client asked for newline-delimited JSON (?format=ndjson or the Accept header)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def iter_records(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of up to batch_size dicts from an executed cursor"""
+    columns = columns_for(cursor.description)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [dict(zip(columns, row)) for row in rows]
+
+
+def stream_json(cursor, transform=None, ndjson=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the rows of an executed cursor as a JSON array (or NDJSON) response.
+
+    Rows are read with fetchmany and encoded one batch at a time, so memory use
+    doesn't grow with the result size and the first rows go out before the
+    query finishes. transform, if given, maps each row dict to the dict to send.
+    ndjson defaults to what the client asked for (see wants_ndjson).
+    """
+    if ndjson is None:
+        ndjson = wants_ndjson()
+
+    def generate():
+        count = 0
+        try:
+            if not ndjson:
+                yield '['
+            for batch in iter_records(cursor, batch_size):
+                if transform:
+                    batch = [transform(record) for record in batch]
+                if ndjson:
+                    yield ''.join(dumps(record) + '\n' for record in batch)
+                else:
+                    # One encoder call per batch; drop the batch's own brackets
+                    yield (',' if count else '') + dumps(batch)[1:-1]
+                count += len(batch)
+            if not ndjson:
+                yield ']'
+        except Exception as e:
+            # Headers are already sent; abort the connection so the client sees a truncated body
+            logging.error(f"[STREAM] Failed after {count} rows: {e}", exc_info=True)
+            raise
+        finally:
+            cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE if ndjson else 'application/json')
@@ -0,0 +1,102 @@
+# Budgets are in characters; English prose runs about 4 characters per LLM token
+CHARS_PER_TOKEN = 4
+DEFAULT_BUDGET = 1500
+DETAIL_INDENT = '   '
+
+
+class VoiceResponse:
+    """Builds the text a SWAIG function hands back to the AI agent, within a size budget.
+
+    The text is the summary lines (always kept: counts, amounts due), then one
+    entry per item, then closing notes. An item is a headline plus detail
+    lines. Headlines get the budget first, so a long list comes back as one
+    line per item rather than the first few items in full; what is left then
+    expands details in item order. Items that don't fit at all become one
+    "... and N more <noun>." line, as do those past max_items. A budget of 0
+    keeps everything.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, noun='items', max_items=None):
+        self.budget = budget
+        self.noun = noun
+        self.max_items = max_items
+        self._summary = []
+        self._items = []
+        self._notes = []
+        self.omitted = 0  # set by build(): items left out entirely
+        self.collapsed = 0  # items whose details were left out
+
+    def summary(self, line):
+        self._summary.append(line)
+
+    def item(self, headline, details=()):
+        """details may contain None/'' entries, which are skipped"""
+        self._items.append((headline, [line for line in details if line]))
+
+    def note(self, line):
+        self._notes.append(line)
+
+    def build(self):
+        budget = self.budget or float('inf')
+        used = sum(len(line) + 1 for line in self._summary)
+
+        def more_marker(count):
+            return f"... and {count} more {self.noun}." if count else ''
+
+        # Headlines: as many as fit while leaving room for the marker
+        kept = 0
+        for headline, _ in self._items[:self.max_items]:
+            marker = more_marker(len(self._items) - kept - 1)
+            if used + len(headline) + 1 + (len(marker) + 1 if marker else 0) > budget:
+                break
+            used += len(headline) + 1
+            kept += 1
+        self.omitted = len(self._items) - kept
+        marker = more_marker(self.omitted)
+        used += len(marker) + 1 if marker else 0
+
+        # Details: in item order until the first one that doesn't fit
+        expanded = []
+        full = True
+        self.collapsed = 0
+        for headline, details in self._items[:kept]:
+            shown = []
+            for line in details if full else ():
+                cost = len(DETAIL_INDENT) + len(line) + 1
+                if used + cost > budget:
+                    full = False
+                    break
+                used += cost
+                shown.append(DETAIL_INDENT + line)
+            self.collapsed += len(shown) < len(details)
+            expanded.append((headline, shown))
+
+        lines = list(self._summary)
+        for headline, shown in expanded:
+            lines.append(headline)
+            lines.extend(shown)
+        if marker:
+            lines.append(marker)
+        for note in self._notes:
+            if used + len(note) + 1 <= budget:
+                used += len(note) + 1
+                lines.append(note)
+        return '\n'.join(lines)
+
+
+def clip(text, limit=160):
+    """text shortened to limit characters at a word boundary, for free-text fields"""
+    if not text or len(text) <= limit:
+        return text
+    return text[:limit].rsplit(' ', 1)[0].rstrip(',.;:') + '...'
+
+
+def compact(row, fields):
+    """The named fields of a row as a dict, without empty values and with money rounded"""
+    result = {}
+    for field in fields:
+        value = row[field]
+        if value is None or value == '':
+            continue
+        result[field] = round(value, 2) if isinstance(value, float) else value
+    return result
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    """Per-process LRU of rendered template fragments.
+
+    Entries are keyed by fragment name, the fragment's version and the values
+    the template passes to the cache tag. bump(name) makes every cached copy of
+    a fragment stale at once. With versions set to a shared cache namespace
+    (shared_cache.CacheNamespace) the version counters are shared, so a bump in
+    one worker process invalidates the fragment in all of them; otherwise
+    entries also expire after ttl seconds, so a change made through another
+    worker shows up within that time.
+    """
+
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.versions = None
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, name):
+        if self.versions is not None:
+            return self.versions.get(name, 0)
+        return self._versions.get(name, 0)
+
+    def bump(self, *names):
+        if self.versions is not None:
+            for name in names:
+                self.versions.incr(name)
+            return
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """Adds {% cache 'name', vary... %}...{% endcache %} to templates.
+
+    The body is rendered once per distinct combination of name and vary values
+    and served from environment.fragment_cache afterwards. Everything the body
+    reads that can differ between requests (endpoint, user type, ...) must be
+    passed as a vary value. environment.fragment_cache_version, when set, is
+    called on every lookup and its result is part of every key (e.g. the asset
+    manifest version, since fragments embed static URLs).
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache(), fragment_cache_version=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        cache = self.environment.fragment_cache
+        name = parts[0]
+        version = self.environment.fragment_cache_version
+        key = (name, cache.version(name), version() if version else None, *parts[1:])
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.set(key, fragment)
+        return fragment
@@ -0,0 +1,276 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+MINUTES_PER_DAY = 24 * 60
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# What the profile page's morning/afternoon/evening checkboxes mean in clock time
+LEGACY_PERIODS = {
+    'morning': (8 * 60, 12 * 60),
+    'afternoon': (12 * 60, 17 * 60),
+    'evening': (17 * 60, 20 * 60),
+}
+
+
+def parse_hhmm(value):
+    """Minutes since midnight for 'HH:MM' ('24:00' is the end of the day)"""
+    hours, _, minutes = str(value).strip().partition(':')
+    minute = int(hours) * 60 + int(minutes or 0)
+    if not 0 <= minute <= MINUTES_PER_DAY or not 0 <= int(minutes or 0) < 60:
+        raise ValueError(f'Invalid time {value!r}')
+    return minute
+
+
+def format_minute(minute):
+    return f'{minute // 60:02d}:{minute % 60:02d}'
+
+
+def minute_mask(start, end):
+    """Bitset with one bit per minute in [start, end)"""
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+def mask_intervals(bits):
+    """[(start, end), ...] runs of set minutes in a day bitset, in order"""
+    intervals = []
+    while bits:
+        start = (bits & -bits).bit_length() - 1
+        shifted = bits >> start
+        length = (~shifted & (shifted + 1)).bit_length() - 1
+        intervals.append((start, start + length))
+        bits &= ~minute_mask(start, start + length)
+    return intervals
+
+
+def _day_intervals(value):
+    if not value:
+        return []
+    if isinstance(value, dict):
+        if 'start' in value or 'end' in value:
+            return [(parse_hhmm(value['start']), parse_hhmm(value['end']))]
+        unknown = set(value) - set(LEGACY_PERIODS)
+        if unknown:
+            raise ValueError(f'Unknown working hours periods: {sorted(unknown)}')
+        return [LEGACY_PERIODS[period] for period, enabled in value.items() if enabled]
+    if isinstance(value, list):
+        intervals = []
+        for item in value:
+            if isinstance(item, dict):
+                intervals.append((parse_hhmm(item['start']), parse_hhmm(item['end'])))
+            else:
+                start, end = item
+                intervals.append((parse_hhmm(start), parse_hhmm(end)))
+        return intervals
+    raise ValueError(f'Unsupported working hours value {value!r}')
+
+
+def parse_weekly_hours(raw):
+    """Parse dentists.working_hours into seven day bitsets (Monday first).
+
+    Accepts every format the column has held: {"monday": {"start": "09:00",
+    "end": "17:00"}}, the profile page's {"monday": {"morning": true, ...}} and
+    lists of {"start", "end"} intervals. Raises ValueError for anything else.
+    """
+    try:
+        data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+    except ValueError as e:
+        raise ValueError(f'working_hours is not valid JSON: {e}')
+    if not data:
+        return (0,) * 7
+    if not isinstance(data, dict):
+        raise ValueError('working_hours must be an object keyed by weekday')
+    weekly = [0] * 7
+    for name, value in data.items():
+        day = str(name).strip().lower()
+        if day not in WEEKDAYS:
+            raise ValueError(f'Unknown weekday {name!r}')
+        try:
+            intervals = _day_intervals(value)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid working hours for {day}: {e}')
+        for start, end in intervals:
+            if start >= end:
+                raise ValueError(f'Working hours for {day} end before they start')
+            weekly[WEEKDAYS.index(day)] |= minute_mask(start, end)
+    return tuple(weekly)
+
+
+class WorkingHours:
+    """A dentist's weekly template as minute bitsets plus dated exceptions.
+
+    exceptions maps 'YYYY-MM-DD' to (closed, opened) bitsets: closures (the
+    dentist's own days off and clinic holidays) are removed from the template
+    first, then extra hours are added.
+    """
+
+    __slots__ = ('dentist_id', 'weekly', 'exceptions')
+
+    def __init__(self, dentist_id, weekly, exceptions=None):
+        self.dentist_id = dentist_id
+        self.weekly = weekly
+        self.exceptions = exceptions or {}
+
+    def day_mask(self, day):
+        """Working minutes on a date (a date/datetime) as a bitset"""
+        bits = self.weekly[day.weekday()]
+        exception = self.exceptions.get(day.strftime('%Y-%m-%d'))
+        if exception:
+            closed, opened = exception
+            bits = (bits & ~closed) | opened
+        return bits
+
+    def intervals(self, day):
+        return mask_intervals(self.day_mask(day))
+
+    def is_working(self, day, start_minute, end_minute):
+        """True when the dentist works every minute of [start_minute, end_minute) on day"""
+        wanted = minute_mask(start_minute, end_minute)
+        return bool(wanted) and self.day_mask(day) & wanted == wanted
+
+    def free_slots(self, day, duration=30, busy=0, step=None):
+        """Start minutes of slots inside each working interval that don't touch busy minutes.
+
+        Slots start every step minutes from the start of each interval;
+        back-to-back (step = duration) by default.
+        """
+        step = step or duration
+        slots = []
+        for start, end in self.intervals(day):
+            minute = start
+            while minute + duration <= end:
+                if not busy & minute_mask(minute, minute + duration):
+                    slots.append(minute)
+                minute += step
+        return slots
+
+
+class WorkingHoursCache:
+    """Per-process LRU of dentist id -> (hours_version, WorkingHours).
+
+    Every save bumps dentists.hours_version, so a cached entry is checked with a
+    primary-key lookup and rebuilt only after a change from any process.
+    """
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dentist_id, version):
+        with self._lock:
+            entry = self._entries.get(dentist_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(dentist_id)
+            return entry[1]
+
+    def set(self, dentist_id, version, hours):
+        with self._lock:
+            self._entries[dentist_id] = (version, hours)
+            self._entries.move_to_end(dentist_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+working_hours_cache = WorkingHoursCache()
+
+
+def _load(db, dentist_id):
+    weekly = [0] * 7
+    for weekday, start, end in db.execute(
+        'SELECT weekday, start_minute, end_minute FROM dentist_working_hours WHERE dentist_id = ?', (dentist_id,)
+    ):
+        weekly[weekday] |= minute_mask(start, end)
+    exceptions = {}
+    for day, start, end, available in db.execute(
+        'SELECT date, start_minute, end_minute, available FROM schedule_exceptions '
+        'WHERE dentist_id = ? OR dentist_id IS NULL', (dentist_id,)
+    ):
+        bits = minute_mask(start if start is not None else 0, end if end is not None else MINUTES_PER_DAY)
+        closed, opened = exceptions.get(day, (0, 0))
+        exceptions[day] = (closed, opened | bits) if available else (closed | bits, opened)
+    return WorkingHours(dentist_id, tuple(weekly), exceptions)
+
+
+def get_working_hours(db, dentist_id):
+    """The dentist's WorkingHours (cached per process), or None if there is no such dentist"""
+    row = db.execute('SELECT id, hours_version FROM dentists WHERE id = ?', (dentist_id,)).fetchone()
+    if row is None:
+        return None
+    dentist_id, version = row[0], row[1]
+    hours = working_hours_cache.get(dentist_id, version)
+    if hours is None:
+        hours = _load(db, dentist_id)
+        working_hours_cache.set(dentist_id, version, hours)
+    return hours
+
+
+def save_weekly_hours(db, dentist_id, weekly):
+    """Replace a dentist's normalized weekly template (seven day bitsets); the caller commits"""
+    db.execute('DELETE FROM dentist_working_hours WHERE dentist_id = ?', (dentist_id,))
+    db.executemany(
+        'INSERT INTO dentist_working_hours (dentist_id, weekday, start_minute, end_minute) VALUES (?, ?, ?, ?)',
+        [(dentist_id, weekday, start, end) for weekday, bits in enumerate(weekly) for start, end in mask_intervals(bits)]
+    )
+    db.execute('UPDATE dentists SET hours_version = hours_version + 1 WHERE id = ?', (dentist_id,))
+
+
+def sync_dentist_working_hours(db, dentist_id):
+    """Rebuild the normalized template from dentists.working_hours; call after any write to that column.
+
+    Invalid JSON leaves the dentist without working hours (and logs a warning)
+    rather than failing the write that triggered the sync.
+    """
+    row = db.execute('SELECT working_hours FROM dentists WHERE id = ?', (dentist_id,)).fetchone()
+    if row is None:
+        return None
+    try:
+        weekly = parse_weekly_hours(row[0])
+    except ValueError as e:
+        logging.warning(f"[HOURS] Dentist {dentist_id} has unusable working_hours ({e}); no working days set")
+        weekly = (0,) * 7
+    save_weekly_hours(db, dentist_id, weekly)
+    return weekly
+
+
+def add_schedule_exception(db, day, dentist_id=None, start_minute=None, end_minute=None, available=False, reason=''):
+    """Record a day off, partial closure or extra hours; dentist_id None makes it a clinic-wide holiday.
+
+    The caller commits. Returns the new exception id.
+    """
+    if (start_minute is None) != (end_minute is None):
+        raise ValueError('Give both start and end, or neither for the whole day')
+    if start_minute is not None and not 0 <= start_minute < end_minute <= MINUTES_PER_DAY:
+        raise ValueError('Exception must end after it starts, within the day')
+    if available and start_minute is None:
+        raise ValueError('Extra working hours need a start and end time')
+    cursor = db.execute(
+        'INSERT INTO schedule_exceptions (dentist_id, date, start_minute, end_minute, available, reason) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (dentist_id, day, start_minute, end_minute, 1 if available else 0, reason or '')
+    )
+    _bump_versions(db, dentist_id)
+    return cursor.lastrowid
+
+
+def delete_schedule_exception(db, exception_id):
+    """Remove an exception; returns its row (None if it didn't exist). The caller commits."""
+    row = db.execute('SELECT id, dentist_id, date, start_minute, end_minute, available, reason '
+                     'FROM schedule_exceptions WHERE id = ?', (exception_id,)).fetchone()
+    if row is not None:
+        db.execute('DELETE FROM schedule_exceptions WHERE id = ?', (exception_id,))
+        _bump_versions(db, row[1])
+    return row
+
+
+def _bump_versions(db, dentist_id):
+    if dentist_id is None:
+        db.execute('UPDATE dentists SET hours_version = hours_version + 1')
+    else:
+        db.execute('UPDATE dentists SET hours_version = hours_version + 1 WHERE id = ?', (dentist_id,))